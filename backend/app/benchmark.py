@@ -0,0 +1,113 @@
+"""
+Benchmark offline de los caminos de ingesta y rastreo.
+
+Reproduce respuestas grabadas (ver `app/providers/fixtures.py`) en lugar de
+consultar BlockCypher, así que se puede medir el rendimiento sin red:
+
+    CHAIN_RECORD_DIR=fixtures uvicorn app.main:app      # 1) grabar usando la app
+    python -m app.benchmark --fixtures fixtures --latencia-ms 150 <direccion> ...
+
+Usa la base configurada en MONGO_DETAILS; conviene apuntarla a una base
+descartable porque la ingesta escribe en ella.
+
+Cada repetición se mide dos veces y se informa por separado:
+- en frío: sin reutilizar rastreos guardados, con el TTL de frescura de las
+  direcciones en 0 (todas se refrescan contra el proveedor) y con los
+  caches en memoria de bloques y direcciones vaciados antes de cada llamada;
+- en caliente: con los caches y TTL configurados, como en la app.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from app.providers.fixtures import ProveedorFixtures
+from app.providers.registro import set_proveedor
+from app.singleflight import singleflight_upstream
+
+
+async def _medir(etiqueta: str, fn, *args, **kwargs) -> float:
+    inicio = time.perf_counter()
+    try:
+        await fn(*args, **kwargs)
+    except Exception as e:
+        print(f"⚠️ {etiqueta} falló: {e}")
+    return time.perf_counter() - inicio
+
+
+def _resumir(nombre: str, tiempos: list) -> None:
+    if not tiempos:
+        return
+    print(
+        f"⏱️ {nombre}: n={len(tiempos)} "
+        f"p50={statistics.median(tiempos):.3f}s "
+        f"max={max(tiempos):.3f}s total={sum(tiempos):.3f}s"
+    )
+
+
+def _caches_en_frio(frio: bool, originales: dict, caches) -> None:
+    """Desactiva (o restaura) la reutilización de rastreos y la frescura de las direcciones."""
+    for (modulo, nombre), valor in originales.items():
+        setattr(modulo, nombre, 0 if frio else valor)
+    if frio:
+        for cache in caches:
+            cache.clear()
+
+
+async def _fase(nombre: str, args, operaciones, antes=None) -> None:
+    tiempos = {etiqueta: [] for etiqueta, _ in operaciones}
+    inicio = time.perf_counter()
+    for _ in range(args.repeticiones):
+        for direccion in args.direcciones:
+            for etiqueta, fn in operaciones:
+                if antes:
+                    antes()
+                tiempos[etiqueta].append(await _medir(etiqueta, fn, direccion))
+    total = time.perf_counter() - inicio
+
+    print(f"\n🧪 Fase {nombre}")
+    for etiqueta, valores in tiempos.items():
+        _resumir(etiqueta, valores)
+    cantidad = sum(len(v) for v in tiempos.values())
+    print(f"📈 {cantidad} operaciones en {total:.2f}s ({cantidad / total:.2f} op/s)")
+
+
+async def main(args) -> None:
+    # Importar después de fijar el proveedor para que los servicios lo usen
+    set_proveedor(ProveedorFixtures(args.fixtures, args.latencia_ms))
+    from app.services import direccion, rastreo
+    from app.services.bloque import bloques_confirmados
+    from app.services.trazabilidad import obtener_trazas_por_direccion
+
+    operaciones = [
+        ("rastrear_origen", lambda d: rastreo.rastrear_origen(d, args.profundidad)),
+        ("obtener_trazas_por_direccion", obtener_trazas_por_direccion),
+    ]
+    originales = {
+        (modulo, nombre): getattr(modulo, nombre)
+        for modulo, nombre in (
+            (rastreo, "RASTREO_CACHE_TTL_SEGUNDOS"),
+            (direccion, "DIRECCION_TTL_SEGUNDOS"),
+            (direccion, "DIRECCION_TTL_INACTIVA_SEGUNDOS"),
+        )
+    }
+
+    caches = (bloques_confirmados, rastreo.direcciones_por_id)
+    try:
+        await _fase("en frío", args, operaciones, antes=lambda: _caches_en_frio(True, originales, caches))
+    finally:
+        _caches_en_frio(False, originales, caches)
+    await _fase("en caliente", args, operaciones)
+
+    print(f"\n🔁 Coalescencia: {singleflight_upstream.resumen()}")
+    print(f"🧱 Cache de bloques: {bloques_confirmados.resumen()}")
+    print(f"🗂️ Cache de direcciones: {rastreo.direcciones_por_id.resumen()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("direcciones", nargs="+")
+    parser.add_argument("--fixtures", default="fixtures", help="directorio con las respuestas grabadas")
+    parser.add_argument("--latencia-ms", type=float, default=0, help="latencia simulada por consulta")
+    parser.add_argument("--profundidad", type=int, default=3)
+    parser.add_argument("--repeticiones", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,25 @@
+import os
+from app.rate_limit import LimitadorPorToken
+
+# -----------------------------
+# Configuración de BlockCypher
+# -----------------------------
+
+BLOCKCYPHER_API = os.getenv("BLOCKCYPHER_API", "https://api.blockcypher.com/v1/btc/main")
+
+# Rotación de tokens para repartir la cuota
+BLOCKCYPHER_TOKENS = [
+    "d210a6ac92274d61b1f15e2c3652bf57",
+    "0da27d786bd94dbb89c7ca6d0274fc03",
+]
+
+# Cuota por token (plan gratuito: 3 req/s y 200 req/h)
+BLOCKCYPHER_RPS = float(os.getenv("BLOCKCYPHER_RPS", "3"))
+BLOCKCYPHER_RPH = float(os.getenv("BLOCKCYPHER_RPH", "200"))
+
+# Limitador compartido por todo el proceso: las consultas salen de
+# inmediato mientras quede cuota y solo se encolan al agotarla.
+limitador_blockcypher = LimitadorPorToken(
+    BLOCKCYPHER_TOKENS,
+    [(BLOCKCYPHER_RPS, 1.0), (BLOCKCYPHER_RPH, 3600.0)],
+)
@@ -0,0 +1,52 @@
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+# -----------------------------
+# Cache LRU en memoria del proceso
+# -----------------------------
+
+
+class LRUCache:
+    """Diccionario acotado que descarta la entrada usada hace más tiempo."""
+
+    def __init__(self, max_items: int):
+        self.max_items = max_items
+        self._datos: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def get(self, clave: Hashable) -> Optional[Any]:
+        if clave in self._datos:
+            self._datos.move_to_end(clave)
+            self.aciertos += 1
+            return self._datos[clave]
+        self.fallos += 1
+        return None
+
+    def set(self, clave: Hashable, valor: Any) -> None:
+        if self.max_items <= 0:
+            return
+        self._datos[clave] = valor
+        self._datos.move_to_end(clave)
+        while len(self._datos) > self.max_items:
+            self._datos.popitem(last=False)
+
+    def pop(self, clave: Hashable) -> None:
+        self._datos.pop(clave, None)
+
+    def clear(self) -> None:
+        self._datos.clear()
+
+    def __contains__(self, clave: Hashable) -> bool:
+        return clave in self._datos
+
+    def __len__(self) -> int:
+        return len(self._datos)
+
+    def resumen(self) -> dict:
+        return {
+            "entradas": len(self._datos),
+            "max": self.max_items,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+        }
@@ -29,6 +29,72 @@ perfil_collection = db["perfiles"]
 rastreo_collection = db["rastreo"]
 patrones_temporales_collection = db["patrones_temporales"]
 reporte_programado_collection = db["reportes_programados"]
+jobs_collection = db["jobs"]
+
+
+# -----------------------------
+# Índices
+# -----------------------------
+# (colección, claves, opciones) de cada índice que usan las consultas
+# calientes. Los `unique` protegen además contra duplicados de la ingesta.
+INDICES = [
+    (direccion_collection, [("direccion", 1)], {"unique": True}),
+    (transaccion_collection, [("hash", 1)], {"unique": True}),
+    # Consultas por dirección del rastreo, incluidas las acotadas por fecha
+    (transaccion_collection, [("outputs", 1), ("fecha", 1)], {}),
+    (transaccion_collection, [("inputs", 1), ("fecha", 1)], {}),
+    # Orden de los listados paginados por cursor (las de _id ya tienen índice)
+    (transaccion_collection, [("fecha", -1), ("_id", -1)], {}),
+    (bloque_collection, [("hash", 1)], {"unique": True}),
+    (reporte_collection, [("id_direccion", 1)], {}),
+    (cluster_collection, [("direccion", 1)], {}),
+    (analisis_collection, [("cluster.direccion", 1)], {}),
+    # Relaciones por par origen/destino (y por destino para el $or inverso)
+    (relaciones_collection, [("direccion_origen", 1), ("direccion_destino", 1)], {}),
+    (relaciones_collection, [("direccion_destino", 1)], {}),
+    (usuario_collection, [("username", 1)], {"unique": True}),
+    # Caché de rastreos: búsqueda por clave e invalidación por nodos
+    (rastreo_collection, [("direccion_inicial", 1), ("tipo", 1), ("fecha_analisis", -1)], {}),
+    (rastreo_collection, [("nodos", 1)], {}),
+    (rastreo_collection, [("fecha_analisis", -1), ("_id", -1)], {}),
+    (db["alertas"], [("direccion", 1), ("nivel_riesgo", 1)], {}),
+    # Jobs pendientes a retomar al arrancar y listado por fecha
+    (jobs_collection, [("estado", 1), ("creado", 1)], {}),
+    (jobs_collection, [("creado", -1), ("_id", -1)], {}),
+]
+
+
+async def crear_indices() -> None:
+    """
+    Crea los índices de `INDICES` que todavía no existen (es idempotente).
+    Un índice que no se puede crear no frena al resto: si un `unique` choca
+    con duplicados ya guardados se crea sin unicidad.
+    """
+    creados = 0
+    existentes: dict = {}
+    for coleccion, claves, opciones in INDICES:
+        if coleccion.name not in existentes:
+            informacion = await coleccion.index_information()
+            existentes[coleccion.name] = {tuple(tuple(c) for c in i["key"]) for i in informacion.values()}
+        if tuple(claves) in existentes[coleccion.name]:
+            # Ya existe (quizás sin unicidad por duplicados previos): no reintentar
+            creados += 1
+            continue
+        try:
+            await coleccion.create_index(claves, **opciones)
+            creados += 1
+        except Exception as e:
+            nombre = f"{coleccion.name}.{'_'.join(c for c, _ in claves)}"
+            if not opciones.get("unique"):
+                print(f"⚠️ No se pudo crear el índice {nombre}: {e}")
+                continue
+            print(f"⚠️ Índice único {nombre} no creado (¿duplicados?): {e}. Se crea sin unicidad.")
+            try:
+                await coleccion.create_index(claves)
+                creados += 1
+            except Exception as e:
+                print(f"⚠️ No se pudo crear el índice {nombre}: {e}")
+    print(f"🗂️ Índices verificados: {creados}/{len(INDICES)}")
 
 # -----------------------------
 # Clase para usar ObjectId en Pydantic
@@ -0,0 +1,132 @@
+import os
+from typing import List, Optional
+from app.database import (
+    INDICES,
+    db,
+    direccion_collection,
+    transaccion_collection,
+    reporte_collection,
+    cluster_collection,
+    relaciones_collection,
+    rastreo_collection,
+)
+
+# -----------------------------
+# Diagnóstico de la base de datos
+# -----------------------------
+# Tamaño de cada colección, uso de sus índices ($indexStats) y el plan que
+# Mongo elige para las formas de consulta calientes (explain). Una consulta
+# con COLLSCAN o con muchos más documentos examinados que devueltos indica
+# un índice faltante. Si el profiler de Mongo está activo también se listan
+# las últimas operaciones lentas que registró.
+
+# Umbral (ms) para las operaciones lentas leídas de system.profile
+DIAGNOSTICO_LENTA_MS = int(os.getenv("DIAGNOSTICO_LENTA_MS", "100"))
+
+# Valor de muestra: el plan elegido no depende del valor buscado
+_MUESTRA = "__diagnostico__"
+
+# (nombre, colección, filtro) de las consultas que más ejecutan los servicios
+CONSULTAS_CALIENTES = [
+    ("direccion_por_valor", direccion_collection, {"direccion": _MUESTRA}),
+    ("transaccion_por_hash", transaccion_collection, {"hash": _MUESTRA}),
+    ("transacciones_recibidas", transaccion_collection, {"outputs": _MUESTRA}),
+    ("transacciones_enviadas", transaccion_collection, {"inputs": _MUESTRA}),
+    ("reportes_por_direccion", reporte_collection, {"id_direccion": _MUESTRA}),
+    ("cluster_por_direccion", cluster_collection, {"direccion": {"$in": [_MUESTRA]}}),
+    ("relaciones_por_direccion", relaciones_collection, {
+        "$or": [{"direccion_origen": _MUESTRA}, {"direccion_destino": _MUESTRA}],
+    }),
+    ("rastreos_por_nodo", rastreo_collection, {"vigente": True, "nodos": {"$in": [_MUESTRA]}}),
+]
+
+
+def _etapas(plan: dict) -> List[dict]:
+    """Aplana el árbol del plan ganador en [{stage, indexName}]."""
+    etapas = [{"etapa": plan.get("stage"), "indice": plan.get("indexName")}]
+    for hijo in [plan.get("inputStage")] + (plan.get("inputStages") or []):
+        if hijo:
+            etapas.extend(_etapas(hijo))
+    return etapas
+
+
+async def _explicar(nombre: str, coleccion, filtro: dict) -> dict:
+    try:
+        plan = await coleccion.find(filtro).explain()
+    except Exception as e:
+        return {"consulta": nombre, "coleccion": coleccion.name, "error": str(e)}
+    ganador = (plan.get("queryPlanner") or {}).get("winningPlan") or {}
+    # Con SBE el plan clásico viene dentro de queryPlan
+    etapas = _etapas(ganador.get("queryPlan", ganador))
+    estadisticas = plan.get("executionStats") or {}
+    return {
+        "consulta": nombre,
+        "coleccion": coleccion.name,
+        "etapas": [e["etapa"] for e in etapas if e["etapa"]],
+        "indices": sorted({e["indice"] for e in etapas if e["indice"]}),
+        "collscan": any(e["etapa"] == "COLLSCAN" for e in etapas),
+        "docs_examinados": estadisticas.get("totalDocsExamined"),
+        "claves_examinadas": estadisticas.get("totalKeysExamined"),
+        "devueltos": estadisticas.get("nReturned"),
+        "ms": estadisticas.get("executionTimeMillis"),
+    }
+
+
+async def _coleccion(nombre: str) -> dict:
+    coleccion = db[nombre]
+    resumen = {"coleccion": nombre}
+    try:
+        stats = await db.command("collStats", nombre)
+        resumen.update({
+            "documentos": stats.get("count"),
+            "bytes": stats.get("size"),
+            "bytes_indices": stats.get("totalIndexSize"),
+        })
+    except Exception:
+        resumen["documentos"] = await coleccion.estimated_document_count()
+    try:
+        uso = await coleccion.aggregate([{"$indexStats": {}}]).to_list(None)
+        resumen["indices"] = [
+            {
+                "nombre": i.get("name"),
+                "claves": i.get("key"),
+                "usos": (i.get("accesses") or {}).get("ops"),
+                "desde": (i.get("accesses") or {}).get("since"),
+            }
+            for i in uso
+        ]
+    except Exception:
+        resumen["indices"] = [
+            {"nombre": nombre_indice, "claves": info.get("key")}
+            for nombre_indice, info in (await coleccion.index_information()).items()
+        ]
+    return resumen
+
+
+async def _operaciones_lentas(limite: int = 20) -> Optional[List[dict]]:
+    """Últimas operaciones lentas del profiler (None si no está activo)."""
+    try:
+        nivel = await db.command("profile", -1)
+        if not nivel.get("was"):
+            return None
+        docs = await db["system.profile"].find(
+            {"millis": {"$gte": DIAGNOSTICO_LENTA_MS}},
+            {"ns": 1, "op": 1, "millis": 1, "planSummary": 1, "docsExamined": 1, "nreturned": 1, "ts": 1},
+        ).sort("ts", -1).limit(limite).to_list(limite)
+    except Exception:
+        return None
+    for d in docs:
+        d.pop("_id", None)
+    return docs
+
+
+async def diagnostico_db() -> dict:
+    nombres = sorted({coleccion.name for coleccion, _, _ in INDICES} | set(await db.list_collection_names()))
+    nombres = [n for n in nombres if not n.startswith("system.")]
+    consultas = [await _explicar(*c) for c in CONSULTAS_CALIENTES]
+    return {
+        "colecciones": [await _coleccion(n) for n in nombres],
+        "consultas": consultas,
+        "consultas_sin_indice": [c["consulta"] for c in consultas if c.get("collscan")],
+        "operaciones_lentas": await _operaciones_lentas(),
+    }
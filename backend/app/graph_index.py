@@ -0,0 +1,336 @@
+import asyncio
+import math
+import os
+import time
+from array import array
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Hashable, Iterable, List, Optional, Set
+from app.database import transaccion_collection
+
+# -----------------------------
+# Índice del grafo de transacciones en memoria
+# -----------------------------
+# Cada dirección (ObjectId) se mapea a un nodo entero y cada transacción a
+# un entero. Los datos viven en arreglos paralelos compactos:
+#
+#   tx_monto[t], tx_fecha[t]            monto y fecha (epoch UTC) de la TX t
+#   tx_in_off / tx_in / tx_in_val       CSR TX → nodos de entrada (y su valor)
+#   tx_out_off / tx_out / tx_out_val    CSR TX → nodos de salida (y su valor)
+#   _gasta_off / _gasta                 CSR nodo → TX donde es input (envía)
+#   _recibe_off / _recibe               CSR nodo → TX donde es output (recibe)
+#
+# Las TX se agregan al final (la ingesta llama a `agregar`), así que los CSR
+# por TX crecen sin reconstruirse; los CSR por nodo se complementan con un
+# delta en listas que se compacta cuando crece demasiado. La compactación
+# trabaja sobre una copia en un hilo (`asyncio.to_thread`) para no frenar
+# el event loop; las TX que llegan mientras tanto quedan en el delta.
+#
+# Las TX modificadas o borradas no se quitan de los arreglos: se marcan en
+# `_borradas` (y una modificación se agrega de nuevo al final) hasta la
+# próxima carga completa; las consultas las saltean y las compactaciones
+# las dejan fuera de los CSR por nodo.
+
+GRAFO_INDICE = os.getenv("GRAFO_INDICE", "0") == "1"
+# Tamaño relativo del delta (sobre las aristas compactadas) que dispara la compactación
+GRAFO_DELTA_MAX = float(os.getenv("GRAFO_DELTA_MAX", "0.1"))
+
+
+def _ceros(n: int) -> array:
+    return array("q", bytes(8 * n))
+
+
+def _a_epoch(fecha) -> float:
+    if not isinstance(fecha, datetime):
+        return math.nan
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return fecha.timestamp()
+
+
+def _valores(valores, n: int) -> List[float]:
+    """Valores paralelos a `n` ids, o NaN si faltan o no coinciden."""
+    if valores and len(valores) == n:
+        return [float(v) for v in valores]
+    return [math.nan] * n
+
+
+def _transponer(off: array, destinos: array, n_nodos: int, excluir: frozenset = frozenset()):
+    """CSR TX → nodos a CSR nodo → TX (counting sort, una TX por nodo aunque se repita)."""
+    n_tx = len(off) - 1
+    vivas = [t for t in range(n_tx) if t not in excluir]
+    cuenta = _ceros(n_nodos + 1)
+    for t in vivas:
+        for v in set(destinos[off[t]:off[t + 1]]):
+            cuenta[v + 1] += 1
+    for v in range(n_nodos):
+        cuenta[v + 1] += cuenta[v]
+
+    posicion = array("q", cuenta[:-1])
+    resultado = _ceros(cuenta[-1])
+    for t in vivas:
+        for v in set(destinos[off[t]:off[t + 1]]):
+            resultado[posicion[v]] = t
+            posicion[v] += 1
+    return cuenta, resultado
+
+
+class IndiceGrafo:
+    def __init__(self, activo: bool = GRAFO_INDICE):
+        self.activo = activo
+        self.listo = False
+        self._carga: Optional[asyncio.Task] = None
+        self._compactando = False
+        self._generacion = 0
+        self.segundos_carga = 0.0
+        self._reiniciar()
+
+    def _reiniciar(self) -> None:
+        self._generacion += 1  # descarta compactaciones en curso sobre el índice anterior
+        self._nodo_por_clave: Dict[Hashable, int] = {}
+        self._claves: List[Hashable] = []
+        self._tx_por_hash: Dict[str, int] = {}
+        self._tx_por_id: Dict[Hashable, int] = {}
+        self._borradas: Set[int] = set()
+        self.tx_ids: List[Hashable] = []
+        self.tx_hash: List[str] = []
+        self.tx_estado: List[str] = []
+        self.tx_monto = array("d")
+        self.tx_fecha = array("d")
+        self.tx_in_off, self.tx_in = array("q", [0]), array("q")
+        self.tx_out_off, self.tx_out = array("q", [0]), array("q")
+        # Valor de cada input/output (NaN en TX guardadas antes de tener valores)
+        self.tx_in_val, self.tx_out_val = array("d"), array("d")
+        self._gasta_off, self._gasta = array("q", [0]), array("q")
+        self._recibe_off, self._recibe = array("q", [0]), array("q")
+        self._compactadas = 0  # TX incluidas en los CSR por nodo
+        self._delta_gasta: Dict[int, List[int]] = defaultdict(list)
+        self._delta_recibe: Dict[int, List[int]] = defaultdict(list)
+        self._tam_delta = 0
+
+    # ---------------- construcción ----------------
+    def _nodo(self, clave: Hashable) -> int:
+        nodo = self._nodo_por_clave.get(clave)
+        if nodo is None:
+            nodo = len(self._claves)
+            self._nodo_por_clave[clave] = nodo
+            self._claves.append(clave)
+        return nodo
+
+    def _agregar_tx(self, doc: dict) -> None:
+        tx_hash = doc.get("hash")
+        if not tx_hash or tx_hash in self._tx_por_hash:
+            return
+        t = len(self.tx_hash)
+        self._tx_por_hash[tx_hash] = t
+        self._tx_por_id[doc.get("_id")] = t
+        self.tx_ids.append(doc.get("_id"))
+        self.tx_hash.append(tx_hash)
+        self.tx_estado.append(doc.get("estado") or "desconocido")
+        self.tx_monto.append(float(doc.get("monto_total") or 0))
+        self.tx_fecha.append(_a_epoch(doc.get("fecha")))
+
+        entradas = [self._nodo(c) for c in doc.get("inputs") or []]
+        salidas = [self._nodo(c) for c in doc.get("outputs") or []]
+        self.tx_in.extend(entradas)
+        self.tx_in_off.append(len(self.tx_in))
+        self.tx_in_val.extend(_valores(doc.get("inputs_valores"), len(entradas)))
+        self.tx_out.extend(salidas)
+        self.tx_out_off.append(len(self.tx_out))
+        self.tx_out_val.extend(_valores(doc.get("outputs_valores"), len(salidas)))
+
+        if self.listo:
+            self._registrar_delta(t)
+
+    def _registrar_delta(self, t: int) -> None:
+        entradas = self.tx_in[self.tx_in_off[t]:self.tx_in_off[t + 1]]
+        salidas = self.tx_out[self.tx_out_off[t]:self.tx_out_off[t + 1]]
+        for v in set(entradas):
+            self._delta_gasta[v].append(t)
+        for v in set(salidas):
+            self._delta_recibe[v].append(t)
+        self._tam_delta += len(entradas) + len(salidas)
+
+    def _quitar_tx(self, tx_id) -> None:
+        t = self._tx_por_id.pop(tx_id, None)
+        if t is None:
+            return
+        self._tx_por_hash.pop(self.tx_hash[t], None)
+        self._borradas.add(t)
+
+    async def _compactar(self) -> None:
+        """Reconstruye los CSR por nodo en un hilo, sobre una copia de las TX actuales."""
+        generacion = self._generacion
+        n = len(self.tx_hash)
+        n_nodos = len(self._claves)
+        borradas = frozenset(self._borradas)
+        in_off, out_off = self.tx_in_off[:n + 1], self.tx_out_off[:n + 1]
+        entradas, salidas = self.tx_in[:in_off[-1]], self.tx_out[:out_off[-1]]
+
+        def transponer():
+            return (
+                _transponer(in_off, entradas, n_nodos, borradas),
+                _transponer(out_off, salidas, n_nodos, borradas),
+            )
+
+        (gasta_off, gasta), (recibe_off, recibe) = await asyncio.to_thread(transponer)
+        if generacion != self._generacion:
+            return  # el índice se reinició mientras tanto
+        self._gasta_off, self._gasta = gasta_off, gasta
+        self._recibe_off, self._recibe = recibe_off, recibe
+        self._compactadas = n
+        # Lo que llegó durante la compactación vuelve al delta
+        self._delta_gasta.clear()
+        self._delta_recibe.clear()
+        self._tam_delta = 0
+        for t in range(n, len(self.tx_hash)):
+            if t not in self._borradas:
+                self._registrar_delta(t)
+
+    async def _compactar_en_segundo_plano(self) -> None:
+        try:
+            await self._compactar()
+        except Exception as e:
+            print(f"⚠️ Error compactando el índice del grafo: {e}")
+        finally:
+            self._compactando = False
+
+    async def cargar(self) -> None:
+        """Construye el índice leyendo todas las transacciones de Mongo."""
+        inicio = time.perf_counter()
+        self.listo = False
+        self._reiniciar()
+        proyeccion = {
+            "hash": 1, "inputs": 1, "outputs": 1, "inputs_valores": 1, "outputs_valores": 1,
+            "monto_total": 1, "fecha": 1, "estado": 1,
+        }
+        async for doc in transaccion_collection.find({}, proyeccion).batch_size(5000):
+            self._agregar_tx(doc)
+        await self._compactar()
+        self.listo = True
+        self.segundos_carga = time.perf_counter() - inicio
+        print(
+            f"🕸️ Índice del grafo cargado: {len(self.tx_hash)} TX, {len(self._claves)} direcciones "
+            f"en {self.segundos_carga:.2f}s"
+        )
+
+    def iniciar_carga(self) -> None:
+        """Lanza (o relanza) la carga en segundo plano; mientras tanto se usa Mongo."""
+        if not self.activo:
+            return
+        if self._carga is not None and not self._carga.done():
+            self._carga.cancel()
+        self._carga = asyncio.create_task(self.cargar())
+
+    def agregar(self, docs: Iterable[dict]) -> None:
+        """Incorpora transacciones recién guardadas (llamado desde la ingesta)."""
+        if not self.activo:
+            return
+        for doc in docs:
+            self._agregar_tx(doc)
+        if (
+            self.listo and not self._compactando
+            and self._tam_delta > max(10_000, GRAFO_DELTA_MAX * (len(self._gasta) + len(self._recibe)))
+        ):
+            self._compactando = True
+            asyncio.create_task(self._compactar_en_segundo_plano())
+
+    def actualizar(self, doc: dict) -> None:
+        """Reemplaza una TX modificada (se marca la versión anterior y se agrega la nueva)."""
+        if not self.activo:
+            return
+        self._quitar_tx(doc.get("_id"))
+        self._agregar_tx(doc)
+
+    def eliminar(self, tx_id) -> None:
+        """Quita una TX borrada de las consultas."""
+        if not self.activo:
+            return
+        self._quitar_tx(tx_id)
+
+    def invalidar(self) -> None:
+        """Reconstruir el índice completo desde Mongo."""
+        self.listo = False
+        self.iniciar_carga()
+
+    # ---------------- consultas ----------------
+    def _adyacentes(self, off: array, destinos: array, delta: Dict[int, List[int]], clave) -> List[int]:
+        nodo = self._nodo_por_clave.get(clave)
+        if nodo is None:
+            return []
+        txs = []
+        if nodo < len(off) - 1:
+            txs.extend(destinos[off[nodo]:off[nodo + 1]])
+        txs.extend(delta.get(nodo, ()))
+        if self._borradas:
+            txs = [t for t in txs if t not in self._borradas]
+        return txs
+
+    def recibidas(self, clave, limite: Optional[int] = None) -> List[int]:
+        """TX (enteros) donde la dirección aparece en OUTPUTS."""
+        txs = self._adyacentes(self._recibe_off, self._recibe, self._delta_recibe, clave)
+        return txs[:limite] if limite else txs
+
+    def enviadas(self, clave, limite: Optional[int] = None) -> List[int]:
+        """TX (enteros) donde la dirección aparece en INPUTS."""
+        txs = self._adyacentes(self._gasta_off, self._gasta, self._delta_gasta, clave)
+        return txs[:limite] if limite else txs
+
+    def entradas(self, t: int) -> List[Hashable]:
+        return [self._claves[v] for v in self.tx_in[self.tx_in_off[t]:self.tx_in_off[t + 1]]]
+
+    def salidas(self, t: int) -> List[Hashable]:
+        return [self._claves[v] for v in self.tx_out[self.tx_out_off[t]:self.tx_out_off[t + 1]]]
+
+    def valores_entradas(self, t: int) -> List[float]:
+        valores = self.tx_in_val[self.tx_in_off[t]:self.tx_in_off[t + 1]]
+        return [] if any(math.isnan(v) for v in valores) else list(valores)
+
+    def valores_salidas(self, t: int) -> List[float]:
+        valores = self.tx_out_val[self.tx_out_off[t]:self.tx_out_off[t + 1]]
+        return [] if any(math.isnan(v) for v in valores) else list(valores)
+
+    def fecha(self, t: int) -> Optional[datetime]:
+        ts = self.tx_fecha[t]
+        if math.isnan(ts):
+            return None
+        # Naive en UTC, igual que los datetimes que devuelve Mongo
+        return datetime.fromtimestamp(ts, timezone.utc).replace(tzinfo=None)
+
+    def doc(self, t: int) -> dict:
+        """Documento con la forma de `transaccion_collection` para la TX `t`."""
+        return {
+            "_id": self.tx_ids[t],
+            "hash": self.tx_hash[t],
+            "fecha": self.fecha(t),
+            "inputs": self.entradas(t),
+            "outputs": self.salidas(t),
+            "inputs_valores": self.valores_entradas(t),
+            "outputs_valores": self.valores_salidas(t),
+            "monto_total": self.tx_monto[t],
+            "estado": self.tx_estado[t],
+        }
+
+    def vecinos(self, clave) -> Set[Hashable]:
+        """Direcciones que compartieron alguna TX (como input u output) con `clave`."""
+        relacionadas = set()
+        for t in self.recibidas(clave) + self.enviadas(clave):
+            relacionadas.update(self.entradas(t))
+            relacionadas.update(self.salidas(t))
+        return relacionadas
+
+    def resumen(self) -> dict:
+        return {
+            "activo": self.activo,
+            "listo": self.listo,
+            "transacciones": len(self.tx_hash),
+            "direcciones": len(self._claves),
+            "aristas": len(self.tx_in) + len(self.tx_out),
+            "delta": self._tam_delta,
+            "borradas": len(self._borradas),
+            "segundos_carga": round(self.segundos_carga, 3),
+        }
+
+
+# Instancia compartida por el proceso (solo se llena con GRAFO_INDICE=1)
+indice_grafo = IndiceGrafo()
@@ -0,0 +1,71 @@
+import os
+from typing import Optional
+import httpx
+
+# -----------------------------
+# Cliente HTTP compartido (pool de conexiones)
+# -----------------------------
+# Un único httpx.AsyncClient por proceso: reutiliza conexiones keep-alive
+# hacia BlockCypher, ChainAbuse y WalletExplorer en lugar de abrir un
+# handshake TCP+TLS nuevo en cada consulta.
+
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "20"))
+UPSTREAM_MAX_KEEPALIVE = int(os.getenv("UPSTREAM_MAX_KEEPALIVE", "10"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "30"))
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "1") == "1"
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_disponible() -> bool:
+    """HTTP/2 requiere el paquete opcional `h2` (httpx[http2])."""
+    if not UPSTREAM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _crear_cliente() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=UPSTREAM_MAX_CONNECTIONS,
+        max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+        keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+    )
+    http2 = _http2_disponible()
+    print(f"🔌 Cliente HTTP compartido | max_conexiones={UPSTREAM_MAX_CONNECTIONS}, http2={http2}")
+    return httpx.AsyncClient(
+        timeout=UPSTREAM_TIMEOUT,
+        limits=limits,
+        http2=http2,
+        follow_redirects=True,
+    )
+
+
+async def iniciar_cliente_http() -> None:
+    """Crea el cliente compartido (evento startup de FastAPI)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _crear_cliente()
+
+
+async def cerrar_cliente_http() -> None:
+    """Cierra el pool de conexiones (evento shutdown de FastAPI)."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Devuelve el cliente compartido. Si se usa fuera de la app (scripts),
+    lo crea de forma perezosa.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _crear_cliente()
+    return _client
@@ -0,0 +1,300 @@
+import asyncio
+import os
+import socket
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pymongo import ReturnDocument
+from app.database import jobs_collection
+
+# -----------------------------
+# Jobs en segundo plano
+# -----------------------------
+# Las operaciones largas (análisis de riesgo masivo, detección de
+# relaciones, rastreos, reportes) pueden correr como jobs: el endpoint
+# guarda un documento en `jobs` y responde enseguida con su id; un pool
+# acotado de workers lo ejecuta y deja en Mongo el estado, el progreso y el
+# resultado. El cliente consulta GET /jobs/{id} o sigue /jobs/{id}/eventos.
+#
+#   pendiente → en_curso → completado | error | cancelado
+#
+# Las tareas se registran por nombre con `@tarea("tipo")`, así un job
+# pendiente se puede retomar tras un reinicio. Cada proceso tiene su pool;
+# el job en curso lleva el proceso que lo tomó (`propietario`) y un lease
+# (`lease_hasta`) que ese proceso renueva mientras lo ejecuta. Un job en
+# curso con el lease vencido quedó huérfano (el proceso murió) y se marca
+# como interrumpido; los de otros procesos vivos no se tocan. Cancelar un
+# job que corre en otro proceso deja `cancelacion_solicitada` y su dueño
+# lo cancela en el siguiente latido.
+
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+# Jobs en cola a partir de los cuales se rechazan nuevos envíos (HTTP 503)
+JOBS_MAX_PENDIENTES = int(os.getenv("JOBS_MAX_PENDIENTES", "100"))
+# Intervalo con el que /jobs/{id}/eventos revisa el documento del job
+JOBS_SONDEO_SEGUNDOS = float(os.getenv("JOBS_SONDEO_SEGUNDOS", "1"))
+# Vigencia del lease de un job en curso; se renueva cada tercio de este tiempo
+JOBS_LEASE_SEGUNDOS = float(os.getenv("JOBS_LEASE_SEGUNDOS", "60"))
+
+ESTADOS_FINALES = ("completado", "error", "cancelado")
+
+_tareas: Dict[str, Callable[..., Awaitable]] = {}
+_job_actual: ContextVar[Optional[ObjectId]] = ContextVar("job_actual", default=None)
+
+
+def _ahora() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _serializable(valor):
+    """Resultado apto para Mongo y JSON (modelos, ObjectId y fechas incluidos)."""
+    return jsonable_encoder(valor, custom_encoder={ObjectId: str})
+
+
+def tarea(tipo: str):
+    """Registra la corrutina que ejecuta los jobs de `tipo` (recibe los parámetros como kwargs)."""
+    def registrar(fn):
+        _tareas[tipo] = fn
+        return fn
+    return registrar
+
+
+async def actualizar_progreso(**progreso) -> None:
+    """Guarda el progreso del job en curso; fuera de un job no hace nada."""
+    job_id = _job_actual.get()
+    if job_id is None:
+        return
+    await jobs_collection.update_one(
+        {"_id": job_id},
+        {"$set": {"progreso": _serializable(progreso), "actualizado": _ahora()}},
+    )
+
+
+def job_out(doc: dict) -> dict:
+    return {**doc, "_id": str(doc["_id"])}
+
+
+class PoolJobs:
+    def __init__(self, workers: int = JOBS_WORKERS, max_pendientes: int = JOBS_MAX_PENDIENTES):
+        self.workers = workers
+        self.max_pendientes = max_pendientes
+        self._cola: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._en_curso: Dict[ObjectId, asyncio.Task] = {}
+        # Jobs en curso cancelados a pedido (el resto de las cancelaciones es un apagado)
+        self._cancelados: Set[ObjectId] = set()
+        self._latido: Optional[asyncio.Task] = None
+        self.propietario = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.completados = 0
+        self.fallidos = 0
+
+    async def iniciar(self) -> None:
+        self._cola = asyncio.Queue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._latido = asyncio.create_task(self._renovar_leases())
+        # Los en curso con el lease vencido se perdieron, los pendientes se retoman
+        interrumpidos = await self._interrumpir_huerfanos()
+        async for doc in jobs_collection.find({"estado": "pendiente"}, {"_id": 1}).sort("creado", 1):
+            self._cola.put_nowait(doc["_id"])
+        print(
+            f"🧵 Pool de jobs ({self.propietario}): {self.workers} workers, "
+            f"{self._cola.qsize()} pendientes retomados, {interrumpidos} interrumpidos"
+        )
+
+    async def detener(self) -> None:
+        tareas = self._workers + list(self._en_curso.values()) + ([self._latido] if self._latido else [])
+        for t in tareas:
+            t.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+        self._workers = []
+        self._latido = None
+
+    def _lease(self) -> datetime:
+        return _ahora() + timedelta(seconds=JOBS_LEASE_SEGUNDOS)
+
+    async def _interrumpir_huerfanos(self) -> int:
+        """Marca como interrumpidos los jobs en curso cuyo lease venció (o que no tienen)."""
+        resultado = await jobs_collection.update_many(
+            {"estado": "en_curso", "$or": [{"lease_hasta": {"$lt": _ahora()}}, {"lease_hasta": None}]},
+            {"$set": {
+                "estado": "error",
+                "error": "Interrumpido: el proceso que lo ejecutaba dejó de responder",
+                "terminado": _ahora(),
+            }},
+        )
+        return resultado.modified_count
+
+    async def _renovar_leases(self) -> None:
+        """
+        Latido: renueva el lease de los jobs propios, cancela los que otro
+        proceso pidió cancelar y recoge los huérfanos de otros procesos.
+        """
+        while True:
+            await asyncio.sleep(JOBS_LEASE_SEGUNDOS / 3)
+            try:
+                if self._en_curso:
+                    propios = {"_id": {"$in": list(self._en_curso)}, "propietario": self.propietario}
+                    await jobs_collection.update_many(propios, {"$set": {"lease_hasta": self._lease()}})
+                    async for doc in jobs_collection.find({**propios, "cancelacion_solicitada": True}, {"_id": 1}):
+                        tarea_job = self._en_curso.get(doc["_id"])
+                        if tarea_job and doc["_id"] not in self._cancelados:
+                            self._cancelados.add(doc["_id"])
+                            tarea_job.cancel()
+                interrumpidos = await self._interrumpir_huerfanos()
+                if interrumpidos:
+                    print(f"⚠️ {interrumpidos} jobs huérfanos marcados como interrumpidos")
+            except Exception as e:
+                print(f"❌ Error renovando los leases de jobs: {e}")
+
+    async def enviar(self, tipo: str, parametros: dict) -> dict:
+        """Guarda el job como pendiente y lo encola; devuelve su documento."""
+        if tipo not in _tareas:
+            raise ValueError(f"Tipo de job desconocido: {tipo}")
+        if self._cola is None:
+            raise HTTPException(status_code=503, detail="El pool de jobs no está iniciado")
+        if self._cola.qsize() >= self.max_pendientes:
+            raise HTTPException(status_code=503, detail="Demasiados jobs pendientes, reintentá más tarde")
+        doc = {
+            "tipo": tipo,
+            "parametros": _serializable(parametros),
+            "estado": "pendiente",
+            "progreso": None,
+            "resultado": None,
+            "error": None,
+            "creado": _ahora(),
+            "iniciado": None,
+            "terminado": None,
+        }
+        doc["_id"] = (await jobs_collection.insert_one(doc)).inserted_id
+        self._cola.put_nowait(doc["_id"])
+        print(f"📥 Job {doc['_id']} ({tipo}) encolado")
+        return doc
+
+    async def cancelar(self, job_id: ObjectId) -> Optional[dict]:
+        """
+        Cancela un job pendiente o en curso; None si no existe. Si corre en
+        otro proceso solo se pide la cancelación (el job sigue en curso con
+        `cancelacion_solicitada` hasta el próximo latido de su dueño).
+        """
+        doc = await jobs_collection.find_one_and_update(
+            {"_id": job_id, "estado": "pendiente"},
+            {"$set": {"estado": "cancelado", "terminado": _ahora()}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc:
+            return doc
+        tarea_job = self._en_curso.get(job_id)
+        if tarea_job:
+            self._cancelados.add(job_id)
+            tarea_job.cancel()
+            await asyncio.wait({tarea_job})
+            return await jobs_collection.find_one({"_id": job_id})
+        return await jobs_collection.find_one_and_update(
+            {"_id": job_id, "estado": "en_curso"},
+            {"$set": {"cancelacion_solicitada": True}},
+            return_document=ReturnDocument.AFTER,
+        ) or await jobs_collection.find_one({"_id": job_id})
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._cola.get()
+            try:
+                # Tomar el job solo si sigue pendiente (pudo cancelarse en la cola)
+                doc = await jobs_collection.find_one_and_update(
+                    {"_id": job_id, "estado": "pendiente"},
+                    {"$set": {
+                        "estado": "en_curso",
+                        "iniciado": _ahora(),
+                        "propietario": self.propietario,
+                        "lease_hasta": self._lease(),
+                    }},
+                    return_document=ReturnDocument.AFTER,
+                )
+                if doc is None:
+                    continue
+                tarea_job = asyncio.create_task(self._ejecutar(doc))
+                self._en_curso[job_id] = tarea_job
+                await asyncio.wait({tarea_job})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Error en el worker de jobs ({job_id}): {e}")
+            finally:
+                self._en_curso.pop(job_id, None)
+                self._cola.task_done()
+
+    async def _terminar(self, job_id: ObjectId, cambios: dict) -> None:
+        cambios["terminado"] = _ahora()
+        await jobs_collection.update_one(
+            {"_id": job_id, "propietario": self.propietario}, {"$set": cambios}
+        )
+
+    async def _ejecutar(self, doc: dict) -> None:
+        _job_actual.set(doc["_id"])
+        try:
+            resultado = await _tareas[doc["tipo"]](**(doc.get("parametros") or {}))
+            cambios = {"estado": "completado", "resultado": _serializable(resultado)}
+            self.completados += 1
+            print(f"✅ Job {doc['_id']} ({doc['tipo']}) completado")
+        except asyncio.CancelledError:
+            if doc["_id"] in self._cancelados:
+                self._cancelados.discard(doc["_id"])
+                print(f"🛑 Job {doc['_id']} ({doc['tipo']}) cancelado")
+                await self._terminar(doc["_id"], {"estado": "cancelado"})
+            else:
+                # Apagado del proceso (deploy, reload): no es una cancelación del usuario
+                print(f"⚠️ Job {doc['_id']} ({doc['tipo']}) interrumpido por apagado")
+                await self._terminar(doc["_id"], {"estado": "error", "error": "Interrumpido: apagado del servidor"})
+            raise
+        except Exception as e:
+            cambios = {"estado": "error", "error": str(e)}
+            self.fallidos += 1
+            print(f"❌ Job {doc['_id']} ({doc['tipo']}) falló: {e}")
+        await self._terminar(doc["_id"], cambios)
+
+    def resumen(self) -> dict:
+        return {
+            "workers": len(self._workers),
+            "pendientes": self._cola.qsize() if self._cola else 0,
+            "en_curso": len(self._en_curso),
+            "propietario": self.propietario,
+            "completados": self.completados,
+            "fallidos": self.fallidos,
+        }
+
+
+# Instancia compartida por el proceso (se inicia en el startup de la app)
+pool_jobs = PoolJobs()
+
+
+async def responder_con_job(tipo: str, **parametros) -> JSONResponse:
+    """Encola el job y responde 202 con su documento (y Location para consultarlo)."""
+    doc = await pool_jobs.enviar(tipo, parametros)
+    return JSONResponse(
+        status_code=202,
+        content=jsonable_encoder(job_out(doc)),
+        headers={"Location": f"/jobs/{doc['_id']}"},
+    )
+
+
+async def eventos_job(job_id: ObjectId) -> AsyncIterator[Tuple[str, dict]]:
+    """("progreso", job) cada vez que cambia y ("fin", job) al terminar."""
+    ultimo = None
+    while True:
+        doc = await jobs_collection.find_one({"_id": job_id})
+        if doc is None:
+            yield "error", {"detail": "Job no encontrado"}
+            return
+        doc = jsonable_encoder(job_out(doc))
+        if doc["estado"] in ESTADOS_FINALES:
+            yield "fin", doc
+            return
+        estado = (doc["estado"], doc.get("progreso"))
+        if estado != ultimo:
+            ultimo = estado
+            yield "progreso", {k: doc.get(k) for k in ("_id", "tipo", "estado", "progreso")}
+        await asyncio.sleep(JOBS_SONDEO_SEGUNDOS)
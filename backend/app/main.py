@@ -1,7 +1,16 @@
 # app/main.py
 from fastapi import FastAPI
-from app.routers import direccion, bloque, transaccion, reporte, cluster, analisis, relacion, usuario, perfiles, modules, patrones, trazabilidad, rastreo, alerta, patrones_temporales, reporte_programado
+from app.routers import direccion, bloque, transaccion, reporte, cluster, analisis, relacion, usuario, perfiles, modules, patrones, trazabilidad, rastreo, alerta, patrones_temporales, reporte_programado, jobs, diagnostico
 from fastapi.middleware.cors import CORSMiddleware
+from app.http_client import iniciar_cliente_http, cerrar_cliente_http
+from app.blockcypher import limitador_blockcypher
+from app.singleflight import singleflight_upstream
+from app.providers.registro import get_proveedor
+from app.graph_index import indice_grafo
+from app.database import crear_indices
+from app.jobs import pool_jobs
+from app.services.bloque import bloques_confirmados
+from app.services.rastreo import direcciones_por_id
 
 app = FastAPI(title="Trazabilidad de Criptomonedas", version="1.0.0")
 
@@ -12,6 +21,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # cursor de paginación de los listados
 )
 
 
@@ -32,6 +42,28 @@ app.include_router(rastreo.router)
 app.include_router(alerta.router)
 app.include_router(patrones_temporales.router)
 app.include_router(reporte_programado.router)
+app.include_router(jobs.router)
+app.include_router(diagnostico.router)
+
+
+@app.on_event("startup")
+async def startup():
+    await iniciar_cliente_http()
+    try:
+        await crear_indices()
+    except Exception as e:
+        print(f"⚠️ No se pudieron crear los índices: {e}")
+    indice_grafo.iniciar_carga()
+    try:
+        await pool_jobs.iniciar()
+    except Exception as e:
+        print(f"⚠️ No se pudieron retomar los jobs pendientes: {e}")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await pool_jobs.detener()
+    await cerrar_cliente_http()
 
 
 @app.get("/")
@@ -40,4 +72,16 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "database": "connected"}
\ No newline at end of file
+    return {"status": "healthy", "database": "connected"}
+
+@app.get("/health/upstream")
+async def upstream_stats():
+    return {
+        "proveedor": get_proveedor().nombre,
+        "blockcypher": limitador_blockcypher.resumen(),
+        "coalescencia": singleflight_upstream.resumen(),
+        "cache_bloques": bloques_confirmados.resumen(),
+        "cache_direcciones": direcciones_por_id.resumen(),
+        "indice_grafo": indice_grafo.resumen(),
+        "jobs": pool_jobs.resumen(),
+    }
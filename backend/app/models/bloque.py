@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from app.database import PyObjectId
 from datetime import datetime
+from typing import Optional
 
 class BloqueModel(BaseModel):
     id: PyObjectId = Field(default_factory=PyObjectId, alias="_id")
@@ -9,6 +10,7 @@ class BloqueModel(BaseModel):
     fecha: datetime
     recompensa_total: float
     volumen_total: float
+    confirmaciones: Optional[int] = None
 
     class Config:
         arbitrary_types_allowed = True
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 
 class Conexion(BaseModel):
@@ -11,6 +11,13 @@ class Conexion(BaseModel):
     estado: str
     fecha: Optional[str] = None  # fecha de la transacción
 
+class NodoTerminal(BaseModel):
+    direccion: str
+    nivel: int
+    motivo: str                  # servicio | tx_con_muchas_entradas | limite_txs
+    grado: int                   # n_tx de la dirección o inputs de la TX
+    hash: Optional[str] = None   # TX que se dejó de expandir (si aplica)
+
 class RastreoModel(BaseModel):
     id: Optional[str] = Field(default=None, alias="_id")
     direccion_inicial: str
@@ -19,6 +26,11 @@ class RastreoModel(BaseModel):
     total_conexiones: int
     fecha_analisis: datetime
     direcciones_analizadas: Optional[int] = 0
+    profundidad: Optional[int] = None
+    dias: Optional[str] = None                    # período del rastreo de destino
+    parametros: Optional[Dict[str, Any]] = None   # otros límites que cambian el resultado
+    vigente: bool = True                          # False cuando la ingesta tocó alguno de sus nodos
+    nodos_terminales: List[NodoTerminal] = []     # dónde y por qué se cortó el rastreo
 
     class Config:
         populate_by_name = True
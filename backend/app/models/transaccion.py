@@ -9,6 +9,8 @@ class TransaccionModel(BaseModel):
     fecha: datetime
     inputs: List[Union[str, PyObjectId]] = Field(default_factory=list)
     outputs: List[Union[str, PyObjectId]] = Field(default_factory=list)
+    inputs_valores: List[float] = Field(default_factory=list)   # BTC de cada input (paralelo a inputs)
+    outputs_valores: List[float] = Field(default_factory=list)  # BTC de cada output (paralelo a outputs)
     monto_total: float
     estado: str
     patrones_sospechosos: List[str] = Field(default_factory=list)
@@ -0,0 +1,128 @@
+import base64
+import json
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple, Type
+from bson import ObjectId
+from fastapi import HTTPException, Response
+from pydantic import BaseModel
+
+# -----------------------------
+# Paginación por cursor (keyset)
+# -----------------------------
+# Los listados se recorren por rango sobre la clave de orden en lugar de
+# skip/offset: el cursor guarda la clave del último documento entregado
+# ((campo, _id) o solo _id) y la página siguiente pide lo que viene después.
+# Así cada página cuesta lo mismo sin importar cuán adelante esté, y con un
+# índice sobre la clave de orden Mongo no ordena en memoria.
+#
+# El cuerpo de la respuesta sigue siendo la lista (el frontend la consume
+# así); el cursor de la página siguiente viaja en el header X-Next-Cursor,
+# ausente en la última página. Sin `limit` ni `cursor` cada listado
+# conserva su respuesta previa (completa, o con el tope que ya tenía) para
+# no recortar en silencio a los clientes que no leen el header.
+
+PAGINA_POR_DEFECTO = int(os.getenv("PAGINA_POR_DEFECTO", "100"))
+PAGINA_MAXIMA = int(os.getenv("PAGINA_MAXIMA", "1000"))
+HEADER_CURSOR = "X-Next-Cursor"
+
+# Documentación OpenAPI del header para los listados paginados
+RESPUESTA_PAGINADA = {
+    200: {
+        "headers": {
+            HEADER_CURSOR: {
+                "description": "Cursor de la página siguiente (pasarlo como `cursor`); ausente en la última página",
+                "schema": {"type": "string"},
+            }
+        }
+    }
+}
+
+
+def codificar_cursor(valor, obj_id: ObjectId) -> str:
+    """Cursor opaco (base64 url-safe) con la clave de orden del último documento."""
+    if isinstance(valor, datetime):
+        clave = {"f": valor.isoformat()}
+    elif isinstance(valor, ObjectId):
+        clave = {"o": str(valor)}
+    else:
+        clave = {"v": valor}
+    datos = json.dumps({**clave, "id": str(obj_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str):
+    """Devuelve (valor, _id) del cursor; HTTP 400 si no es válido."""
+    try:
+        relleno = "=" * (-len(cursor) % 4)
+        datos = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if "f" in datos:
+            valor = datetime.fromisoformat(datos["f"])
+        elif "o" in datos:
+            valor = ObjectId(datos["o"])
+        else:
+            valor = datos.get("v")
+        return valor, ObjectId(datos["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+
+def proyeccion_de(schema: Type[BaseModel], excluir: Tuple[str, ...] = ()) -> dict:
+    """Proyección de Mongo con solo los campos que declara el schema de respuesta."""
+    campos = {(campo.alias or nombre) for nombre, campo in schema.model_fields.items()}
+    return {campo: 1 for campo in campos if campo not in excluir}
+
+
+async def paginar(
+    coleccion,
+    filtro: Optional[dict] = None,
+    orden: str = "_id",
+    limite: Optional[int] = None,
+    cursor: Optional[str] = None,
+    proyeccion: Optional[dict] = None,
+    descendente: bool = True,
+    por_defecto: Optional[int] = PAGINA_POR_DEFECTO,
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Una página de `coleccion` ordenada por (`orden`, _id). Devuelve los
+    documentos y el cursor de la página siguiente (None si no hay más).
+    Pide un documento de más para saber si la página es la última.
+
+    `por_defecto` es el tamaño cuando no se pasa ni `limite` ni `cursor`;
+    None devuelve la colección completa (sin cursor).
+    """
+    if limite is None and cursor is None:
+        limite = por_defecto
+        if limite is None:
+            claves = [(orden, -1 if descendente else 1)]
+            return await coleccion.find(dict(filtro or {}), proyeccion).sort(claves).to_list(None), None
+    limite = max(1, min(limite or PAGINA_POR_DEFECTO, PAGINA_MAXIMA))
+    sentido = -1 if descendente else 1
+    operador = "$lt" if descendente else "$gt"
+    filtro = dict(filtro or {})
+
+    if cursor:
+        valor, ultimo_id = decodificar_cursor(cursor)
+        if orden == "_id":
+            filtro["_id"] = {operador: ultimo_id}
+        else:
+            filtro.setdefault("$and", []).append({"$or": [
+                {orden: {operador: valor}},
+                {orden: valor, "_id": {operador: ultimo_id}},
+            ]})
+
+    claves = [(orden, sentido)] if orden == "_id" else [(orden, sentido), ("_id", sentido)]
+    if proyeccion is not None:
+        proyeccion = {**proyeccion, orden: 1} if all(proyeccion.values()) else proyeccion
+
+    docs = await coleccion.find(filtro, proyeccion).sort(claves).limit(limite + 1).to_list(limite + 1)
+    if len(docs) <= limite:
+        return docs, None
+    docs = docs[:limite]
+    return docs, codificar_cursor(docs[-1].get(orden), docs[-1]["_id"])
+
+
+def publicar_cursor(response: Response, siguiente: Optional[str]) -> None:
+    """Expone el cursor de la página siguiente en los headers de la respuesta."""
+    if siguiente:
+        response.headers[HEADER_CURSOR] = siguiente
@@ -0,0 +1,44 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional
+
+# -----------------------------
+# Interfaz de proveedores de datos de la cadena
+# -----------------------------
+# Los servicios piden datos crudos con la forma de la API de BlockCypher
+# (`/addrs/{a}/full`, `/blocks/{hash}`) y los transforman ellos mismos, así
+# que cualquier proveedor (API real, fixtures grabados, otro explorador)
+# solo tiene que devolver JSON con esa forma.
+
+
+class ProveedorCadena(ABC):
+    nombre = "base"
+
+    @abstractmethod
+    async def obtener_direccion(self, address: str) -> dict:
+        """Resumen de la dirección con sus TX más recientes. Lanza excepción si no se obtiene."""
+
+    @abstractmethod
+    async def obtener_transacciones(
+        self,
+        address: str,
+        limit: int = 50,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+    ) -> dict:
+        """
+        Página {"txs": [...], "hasMore": bool} con las TX de `address` en
+        bloques anteriores a `before` y posteriores a `after`, de la más
+        reciente a la más antigua. Si falla devuelve una página vacía.
+        """
+
+    @abstractmethod
+    async def obtener_bloque(self, block_hash: str) -> dict:
+        """Datos del bloque. Lanza excepción si no se obtiene."""
+
+    @abstractmethod
+    async def obtener_ultima_actividad(self, address: str) -> Optional[datetime]:
+        """Fecha de la última TX de la dirección (None si no se conoce)."""
+
+    async def cerrar(self) -> None:
+        """Libera recursos propios del proveedor (por defecto ninguno)."""
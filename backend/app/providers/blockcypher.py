@@ -0,0 +1,126 @@
+import asyncio
+import json
+from datetime import datetime
+from typing import Optional
+import httpx
+from app.blockcypher import BLOCKCYPHER_API, limitador_blockcypher
+from app.http_client import get_http_client
+from app.providers.base import ProveedorCadena
+from app.utils import a_datetime_utc
+
+# -----------------------------
+# Proveedor BlockCypher (API real)
+# -----------------------------
+
+MAX_INTENTOS = 3
+BASE_DELAY = 5  # segundos
+
+# Headers realistas (SIN Accept-Encoding para evitar problemas GZIP)
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "application/json",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Connection": "keep-alive",
+}
+
+INDICADORES_CLOUDFLARE = ["Just a moment", "Cloudflare", "challenge-platform", "cf-chl-opt"]
+
+
+class ProveedorBlockCypher(ProveedorCadena):
+    nombre = "blockcypher"
+
+    async def _consultar(self, ruta: str, etiqueta: str, **params) -> dict:
+        """
+        GET a la API con protección contra Cloudflare y rate limits:
+        - token con cuota del limitador global (espera solo si todos están agotados)
+        - reintentos ante Cloudflare, respuestas no JSON, 429, 5xx y errores de red
+        - excepción inmediata ante errores no recuperables
+        """
+        query = "".join(f"&{k}={v}" for k, v in params.items() if v is not None)
+
+        for intento in range(MAX_INTENTOS):
+            token = await limitador_blockcypher.adquirir()
+            url = f"{BLOCKCYPHER_API}{ruta}?token={token}{query}"
+            print(f"🌐 [{etiqueta}] Intento {intento + 1}/{MAX_INTENTOS} con token {token[-8:]}")
+
+            try:
+                client = get_http_client()
+                response = await client.get(url, headers=HEADERS)
+            except httpx.RequestError as e:
+                print(f"🔌 Error de conexión en {etiqueta} ({type(e).__name__}). Reintentando...")
+                await asyncio.sleep(BASE_DELAY * (intento + 1))
+                continue
+
+            content_type = response.headers.get("Content-Type", "")
+            if any(indicador in response.text[:500] for indicador in INDICADORES_CLOUDFLARE):
+                print(f"🔒 Cloudflare detectado en {etiqueta}. Esperando {BASE_DELAY * (intento + 1)}s...")
+                await asyncio.sleep(BASE_DELAY * (intento + 1))
+                continue
+
+            if response.status_code == 429:
+                print(f"⏳ HTTP 429 en {etiqueta} (token {token[-8:]}). Rotando...")
+                limitador_blockcypher.agotar(token, BASE_DELAY * 3)
+                continue
+            if response.status_code >= 500:
+                print(f"❌ HTTP {response.status_code} en {etiqueta}. Reintentando...")
+                await asyncio.sleep(BASE_DELAY * 2)
+                continue
+
+            if "application/json" not in content_type:
+                print(f"⚠️ Respuesta no es JSON en {etiqueta}: {content_type}")
+                await asyncio.sleep(BASE_DELAY * (intento + 1))
+                continue
+
+            try:
+                data = response.json()
+            except json.JSONDecodeError as e:
+                print(f"❌ JSON inválido en {etiqueta}: {str(e)[:100]}")
+                await asyncio.sleep(BASE_DELAY * (intento + 1))
+                continue
+
+            if "error" in data:
+                error_msg = data["error"]
+                if "limit" in error_msg.lower():
+                    print(f"⏳ Rate limit en {etiqueta} (token {token[-8:]}). Rotando...")
+                    limitador_blockcypher.agotar(token, BASE_DELAY * 2)
+                    continue
+                raise Exception(f"Error de API en {etiqueta}: {error_msg}")
+
+            if response.is_error:
+                raise Exception(f"Error HTTP {response.status_code} en {etiqueta}: {response.text[:200]}")
+            return data
+
+        raise Exception(f"No se pudo consultar {etiqueta} después de {MAX_INTENTOS} intentos.")
+
+    async def obtener_direccion(self, address: str) -> dict:
+        return await self._consultar(f"/addrs/{address}/full", f"Dirección {address[:8]}")
+
+    async def obtener_transacciones(
+        self,
+        address: str,
+        limit: int = 50,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+    ) -> dict:
+        try:
+            data = await self._consultar(
+                f"/addrs/{address}/full",
+                f"Transacciones {address[:8]}",
+                limit=limit,
+                before=before,
+                after=after,
+            )
+        except Exception as e:
+            print(f"❌ {e}")
+            return {"txs": [], "hasMore": False}
+
+        txs = data.get("txs", [])
+        print(f"✅ Obtenidas {len(txs)} transacciones para {address[:8]}...")
+        return {"txs": txs, "hasMore": bool(data.get("hasMore"))}
+
+    async def obtener_bloque(self, block_hash: str) -> dict:
+        return await self._consultar(f"/blocks/{block_hash}", f"Bloque {block_hash[:8]}")
+
+    async def obtener_ultima_actividad(self, address: str) -> Optional[datetime]:
+        data = await self._consultar(f"/addrs/{address}", f"Actividad {address[:8]}")
+        return a_datetime_utc(data.get("final_tx_time"))
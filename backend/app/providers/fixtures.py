@@ -0,0 +1,162 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import List, Optional
+from app.cache import LRUCache
+from app.providers.base import ProveedorCadena
+from app.utils import a_datetime_utc
+
+# -----------------------------
+# Proveedor offline: reproduce JSON grabado
+# -----------------------------
+# Estructura del directorio (la misma que escribe `ProveedorGrabador`):
+#
+#   {FIXTURES_DIR}/direcciones/{address}.json    respuesta de /addrs/{a}/full
+#   {FIXTURES_DIR}/transacciones/{address}.json  lista con todas las TX conocidas
+#   {FIXTURES_DIR}/bloques/{hash}.json           respuesta de /blocks/{hash}
+#
+# Las páginas de transacciones se arman localmente aplicando limit/before/after
+# sobre la lista completa, así que cualquier patrón de paginación se reproduce.
+
+FIXTURES_DIR = os.getenv("FIXTURES_DIR", "fixtures")
+# Latencia artificial por consulta, para benchmarks con un costo de red realista
+FIXTURES_LATENCIA_MS = float(os.getenv("FIXTURES_LATENCIA_MS", "0"))
+
+
+def _ruta(directorio: str, tipo: str, clave: str) -> str:
+    return os.path.join(directorio, tipo, f"{clave}.json")
+
+
+def ordenar_txs(txs: List[dict]) -> List[dict]:
+    """Orden de BlockCypher: sin confirmar primero, luego por altura descendente."""
+    return sorted(
+        txs,
+        key=lambda tx: tx.get("block_height", -1) if tx.get("block_height", -1) > 0 else float("inf"),
+        reverse=True,
+    )
+
+
+class ProveedorFixtures(ProveedorCadena):
+    nombre = "fixtures"
+
+    def __init__(self, directorio: str = FIXTURES_DIR, latencia_ms: float = FIXTURES_LATENCIA_MS):
+        self.directorio = directorio
+        self.latencia = latencia_ms / 1000
+        self._cache = LRUCache(1000)
+
+    async def _leer(self, tipo: str, clave: str) -> Optional[object]:
+        if self.latencia:
+            await asyncio.sleep(self.latencia)
+        ruta = _ruta(self.directorio, tipo, clave)
+        if ruta in self._cache:
+            return self._cache.get(ruta)
+        if not os.path.exists(ruta):
+            return None
+        with open(ruta, encoding="utf-8") as f:
+            data = json.load(f)
+        if tipo == "transacciones":
+            data = ordenar_txs(data)
+        self._cache.set(ruta, data)
+        return data
+
+    async def obtener_direccion(self, address: str) -> dict:
+        data = await self._leer("direcciones", address)
+        if data is None:
+            raise Exception(f"Sin fixture para la dirección {address}")
+        return data
+
+    async def obtener_transacciones(
+        self,
+        address: str,
+        limit: int = 50,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+    ) -> dict:
+        txs = await self._leer("transacciones", address)
+        if txs is None:
+            # Sin lista grabada: usar las TX incluidas en la respuesta de la dirección
+            txs = ordenar_txs(((await self._leer("direcciones", address)) or {}).get("txs", []))
+
+        seleccion = [
+            tx for tx in txs
+            if (before is None or 0 < tx.get("block_height", -1) < before)
+            and (after is None or tx.get("block_height", -1) > after or tx.get("block_height", -1) <= 0)
+        ]
+        return {"txs": seleccion[:limit], "hasMore": len(seleccion) > limit}
+
+    async def obtener_bloque(self, block_hash: str) -> dict:
+        data = await self._leer("bloques", block_hash)
+        if data is None:
+            raise Exception(f"Sin fixture para el bloque {block_hash}")
+        return data
+
+    async def obtener_ultima_actividad(self, address: str) -> Optional[datetime]:
+        data = await self._leer("direcciones", address)
+        if not data:
+            return None
+        if data.get("final_tx_time"):
+            return a_datetime_utc(data["final_tx_time"])
+        txs = data.get("txs") or []
+        return a_datetime_utc(txs[0].get("confirmed")) if txs else None
+
+
+class ProveedorGrabador(ProveedorCadena):
+    """
+    Envuelve a otro proveedor y guarda cada respuesta en `directorio` con el
+    formato que lee `ProveedorFixtures`. Las TX de una dirección se acumulan
+    (sin duplicados) a medida que se recorren sus páginas.
+    """
+
+    nombre = "grabador"
+
+    def __init__(self, proveedor: ProveedorCadena, directorio: str):
+        self.proveedor = proveedor
+        self.directorio = directorio
+        self.nombre = f"{proveedor.nombre}+grabador"
+
+    def _escribir(self, tipo: str, clave: str, data) -> None:
+        ruta = _ruta(self.directorio, tipo, clave)
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    def _acumular_txs(self, address: str, txs: List[dict]) -> None:
+        if not txs:
+            return
+        ruta = _ruta(self.directorio, "transacciones", address)
+        previas = []
+        if os.path.exists(ruta):
+            with open(ruta, encoding="utf-8") as f:
+                previas = json.load(f)
+        por_hash = {tx["hash"]: tx for tx in previas}
+        por_hash.update({tx["hash"]: tx for tx in txs if tx.get("hash")})
+        self._escribir("transacciones", address, ordenar_txs(list(por_hash.values())))
+
+    async def obtener_direccion(self, address: str) -> dict:
+        data = await self.proveedor.obtener_direccion(address)
+        self._escribir("direcciones", address, data)
+        self._acumular_txs(address, data.get("txs", []))
+        return data
+
+    async def obtener_transacciones(
+        self,
+        address: str,
+        limit: int = 50,
+        before: Optional[int] = None,
+        after: Optional[int] = None,
+    ) -> dict:
+        pagina = await self.proveedor.obtener_transacciones(address, limit, before, after)
+        self._acumular_txs(address, pagina["txs"])
+        return pagina
+
+    async def obtener_bloque(self, block_hash: str) -> dict:
+        data = await self.proveedor.obtener_bloque(block_hash)
+        self._escribir("bloques", block_hash, data)
+        return data
+
+    async def obtener_ultima_actividad(self, address: str) -> Optional[datetime]:
+        return await self.proveedor.obtener_ultima_actividad(address)
+
+    async def cerrar(self) -> None:
+        await self.proveedor.cerrar()
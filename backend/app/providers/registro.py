@@ -0,0 +1,43 @@
+import os
+from typing import Optional
+from app.providers.base import ProveedorCadena
+
+# -----------------------------
+# Selección del proveedor de datos de la cadena
+# -----------------------------
+# CHAIN_PROVIDER=blockcypher (por defecto) | fixtures
+# CHAIN_RECORD_DIR=<dir>  graba las respuestas del proveedor real como fixtures
+
+CHAIN_PROVIDER = os.getenv("CHAIN_PROVIDER", "blockcypher").lower()
+CHAIN_RECORD_DIR = os.getenv("CHAIN_RECORD_DIR", "")
+
+_proveedor: Optional[ProveedorCadena] = None
+
+
+def _crear_proveedor(nombre: str) -> ProveedorCadena:
+    if nombre == "fixtures":
+        from app.providers.fixtures import ProveedorFixtures
+        return ProveedorFixtures()
+    if nombre == "blockcypher":
+        from app.providers.blockcypher import ProveedorBlockCypher
+        proveedor = ProveedorBlockCypher()
+        if CHAIN_RECORD_DIR:
+            from app.providers.fixtures import ProveedorGrabador
+            proveedor = ProveedorGrabador(proveedor, CHAIN_RECORD_DIR)
+        return proveedor
+    raise ValueError(f"CHAIN_PROVIDER desconocido: {nombre}")
+
+
+def get_proveedor() -> ProveedorCadena:
+    """Proveedor compartido por el proceso (se crea al primer uso)."""
+    global _proveedor
+    if _proveedor is None:
+        _proveedor = _crear_proveedor(CHAIN_PROVIDER)
+        print(f"⛓️ Proveedor de datos de la cadena: {_proveedor.nombre}")
+    return _proveedor
+
+
+def set_proveedor(proveedor: ProveedorCadena) -> None:
+    """Reemplaza el proveedor (scripts de benchmark, pruebas de carga)."""
+    global _proveedor
+    _proveedor = proveedor
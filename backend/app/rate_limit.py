@@ -0,0 +1,104 @@
+import asyncio
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# -----------------------------
+# Rate limiting asíncrono (token bucket)
+# -----------------------------
+
+
+class TokenBucket:
+    """Balde de `capacidad` permisos que se recarga a `tasa` permisos por segundo."""
+
+    def __init__(self, capacidad: float, tasa: float):
+        self.capacidad = capacidad
+        self.tasa = tasa
+        self.disponibles = capacidad
+        self.actualizado = time.monotonic()
+
+    def _recargar(self, ahora: float) -> None:
+        transcurrido = max(0.0, ahora - self.actualizado)
+        self.disponibles = min(self.capacidad, self.disponibles + transcurrido * self.tasa)
+        self.actualizado = ahora
+
+    def espera(self, ahora: float) -> float:
+        """Segundos hasta que haya al menos un permiso (0 si ya hay)."""
+        self._recargar(ahora)
+        if self.disponibles >= 1:
+            return 0.0
+        return (1 - self.disponibles) / self.tasa
+
+    def consumir(self) -> None:
+        self.disponibles -= 1
+
+    def agotar(self, segundos: float) -> None:
+        """Vacía el balde y lo deja sin permisos durante `segundos`."""
+        self.disponibles = min(self.disponibles, 0.0) - segundos * self.tasa
+
+
+class LimitadorPorToken:
+    """
+    Limitador global con un conjunto de baldes por credencial (API token).
+    Cada credencial puede tener varios límites simultáneos, p. ej. por
+    segundo y por hora. `adquirir()` devuelve inmediatamente la credencial
+    con más margen y solo espera cuando todas agotaron su cuota.
+    """
+
+    def __init__(self, claves: Iterable[str], limites: List[Tuple[float, float]]):
+        # limites: [(cantidad, periodo_en_segundos), ...]
+        self._baldes: Dict[str, List[TokenBucket]] = {
+            clave: [TokenBucket(cantidad, cantidad / periodo) for cantidad, periodo in limites]
+            for clave in claves
+        }
+        self.estadisticas = {"concedidas": 0, "esperas": 0, "segundos_espera": 0.0, "agotadas": 0}
+
+    def _intentar(self) -> Tuple[Optional[str], float]:
+        ahora = time.monotonic()
+        mejor_clave, mejor_margen = None, -math.inf
+        espera_min = math.inf
+
+        for clave, baldes in self._baldes.items():
+            espera = max(b.espera(ahora) for b in baldes)
+            if espera > 0:
+                espera_min = min(espera_min, espera)
+                continue
+            margen = min(b.disponibles / b.capacidad for b in baldes)
+            if margen > mejor_margen:
+                mejor_clave, mejor_margen = clave, margen
+
+        if mejor_clave is not None:
+            for b in self._baldes[mejor_clave]:
+                b.consumir()
+            return mejor_clave, 0.0
+        return None, espera_min
+
+    async def adquirir(self) -> str:
+        """Espera (solo si hace falta) y devuelve la credencial a usar."""
+        esperado = 0.0
+        while True:
+            clave, espera = self._intentar()
+            if clave is not None:
+                self.estadisticas["concedidas"] += 1
+                if esperado:
+                    self.estadisticas["esperas"] += 1
+                    self.estadisticas["segundos_espera"] += esperado
+                return clave
+            await asyncio.sleep(espera)
+            esperado += espera
+
+    def agotar(self, clave: str, segundos: float) -> None:
+        """Marca la credencial como agotada (el upstream respondió 429 / rate limit)."""
+        for b in self._baldes.get(clave, []):
+            b.agotar(segundos)
+        self.estadisticas["agotadas"] += 1
+
+    def resumen(self) -> dict:
+        """Permisos disponibles por credencial (se muestran los últimos 8 caracteres)."""
+        ahora = time.monotonic()
+        credenciales = {}
+        for clave, baldes in self._baldes.items():
+            for b in baldes:
+                b._recargar(ahora)
+            credenciales[clave[-8:]] = [round(b.disponibles, 2) for b in baldes]
+        return {**self.estadisticas, "credenciales": credenciales}
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, Request
-from typing import List
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from typing import List, Optional
 from app.database import db
+from app.paginacion import PAGINA_MAXIMA, publicar_cursor, RESPUESTA_PAGINADA
 from app.schemas.alerta import AlertaCreate, AlertaResponse
 from app.services.alerta import (
     crear_alerta,
@@ -35,12 +36,19 @@ async def create_alerta_endpoint(alerta: AlertaCreate):
 
 
 # 🟢 Listar todas las alertas (sin permisos)
-@router.get("/", response_model=List[AlertaResponse])
-async def list_alertas():
-    """Listar todas las alertas"""
+@router.get("/", response_model=List[AlertaResponse], responses=RESPUESTA_PAGINADA)
+async def list_alertas(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGINA_MAXIMA),
+    cursor: Optional[str] = None,
+):
+    """Listar las alertas por páginas (cursor de la siguiente en X-Next-Cursor)"""
     try:
-        alertas = await listar_alertas(db)
-        return [a for a in alertas]
+        alertas, siguiente = await listar_alertas(db, limit, cursor)
+        publicar_cursor(response, siguiente)
+        return alertas
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al listar alertas: {e}")
 
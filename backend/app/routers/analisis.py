@@ -11,10 +11,13 @@ from app.services.analisis import (
     analizar_riesgo_direcciones
 )
 from app.security import check_permissions_auto
+from app.jobs import tarea, responder_con_job
 from app.models.usuario import Usuario
 
 router = APIRouter(prefix="/analisis", tags=["analisis"])
 
+tarea("analisis_riesgo")(analizar_riesgo_direcciones)
+
 
 @router.get("/")
 async def list_analisis(current_user: Usuario = Depends(check_permissions_auto)):
@@ -38,12 +41,16 @@ async def generar(address: str, current_user: Usuario = Depends(check_permission
 async def analizar_riesgo_endpoint(
     data: Optional[AnalisisRiesgoIn] = None,
     direccion: Optional[str] = Query(None),
+    asincrono: bool = Query(False, description="Ejecutar como job en segundo plano (202 con el id del job)"),
     current_user: Usuario = Depends(check_permissions_auto)
 ):
     """
     - Si se recibe 'direccion' en query param → analiza solo esa dirección.
     - Si no, analiza todas las direcciones registradas.
+    - Con `asincrono=true` corre como job y se consulta en /jobs/{id}.
     """
+    if asincrono:
+        return await responder_con_job("analisis_riesgo", direccion=direccion or (data.direccion if data else None))
     try:
         if direccion:
             # 🔹 Caso individual (viene desde el botón de una fila)
@@ -1,5 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import List, Optional
 from app.schemas.bloque import BloqueCreateSchema, BloqueResponseSchema, BloqueFetchRequest
 from app.services.bloque import (
     create_bloque,
@@ -11,6 +11,7 @@ from app.services.bloque import (
 )
 from app.models.bloque import BloqueModel
 from app.security import check_permissions_auto
+from app.paginacion import PAGINA_MAXIMA, publicar_cursor, RESPUESTA_PAGINADA
 from app.models.usuario import Usuario
 
 router = APIRouter(prefix="/bloques", tags=["bloques"])
@@ -23,9 +24,14 @@ async def create_bloque_endpoint(bloque: BloqueCreateSchema, current_user: Usuar
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=List[BloqueResponseSchema])
-async def list_bloques():  # 👈 quitá el Depends(check_permissions_auto)
-    bloques = await get_all_bloques()
+@router.get("/", response_model=List[BloqueResponseSchema], responses=RESPUESTA_PAGINADA)
+async def list_bloques(  # 👈 quitá el Depends(check_permissions_auto)
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGINA_MAXIMA),
+    cursor: Optional[str] = None,
+):
+    bloques, siguiente = await get_all_bloques(limit, cursor)
+    publicar_cursor(response, siguiente)
     return [b.model_dump(by_alias=True) for b in bloques]
 
 @router.get("/{bloque_hash}", response_model=BloqueResponseSchema)
@@ -1,5 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import List, Optional
 from app.schemas.cluster import ClusterOut
 from app.services.cluster import (
     get_all_clusters,
@@ -8,6 +8,7 @@ from app.services.cluster import (
     detectar_cluster_por_transacciones,
 )
 from app.security import check_permissions_auto
+from app.paginacion import PAGINA_MAXIMA, publicar_cursor, RESPUESTA_PAGINADA
 from app.models.usuario import Usuario
 from app.models.cluster import ClusterModel
 from app.services.cluster import generar_analisis_cluster
@@ -16,11 +17,19 @@ from app.services.cluster import generar_analisis_cluster
 router = APIRouter(prefix="/clusters", tags=["Clusters"])
 
 # ==================== LISTAR TODOS LOS CLUSTERS ====================
-@router.get("/", response_model=List[ClusterOut])
-async def list_clusters(current_user: Usuario = Depends(check_permissions_auto)):
+@router.get("/", response_model=List[ClusterOut], responses=RESPUESTA_PAGINADA)
+async def list_clusters(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGINA_MAXIMA),
+    cursor: Optional[str] = None,
+    current_user: Usuario = Depends(check_permissions_auto),
+):
     try:
-        clusters = await get_all_clusters()
+        clusters, siguiente = await get_all_clusters(limit, cursor)
+        publicar_cursor(response, siguiente)
         return clusters
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
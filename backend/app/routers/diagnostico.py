@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Depends
+from app.diagnostico import diagnostico_db
+from app.security import check_permissions_auto
+from app.models.usuario import Usuario
+
+# Diagnóstico interno (planes de consulta, índices, operaciones lentas):
+# requiere el permiso del módulo /diagnostico, a diferencia de /health.
+router = APIRouter(prefix="/diagnostico", tags=["diagnostico"])
+
+
+# ==================== DIAGNÓSTICO DE LA BASE ====================
+@router.get("/db")
+async def diagnostico_base(current_user: Usuario = Depends(check_permissions_auto)):
+    """Tamaños de colecciones, uso de índices y planes de las consultas calientes."""
+    return await diagnostico_db()
@@ -1,6 +1,6 @@
 # app/routers/direccion.py
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import List, Optional
 from app.schemas.direccion import DireccionCreateSchema, DireccionResponseSchema, DireccionFetchRequest
 from app.services.direccion import (
     create_direccion,
@@ -14,6 +14,7 @@ from app.models.direccion import DireccionModel
 from app.services.transaccion import get_transacciones_by_direccion
 from app.schemas.transaccion import TransaccionResponseSchema
 from app.security import check_permissions_auto
+from app.paginacion import PAGINA_MAXIMA, publicar_cursor, RESPUESTA_PAGINADA
 from app.models.usuario import Usuario
 
 router = APIRouter(prefix="/direcciones", tags=["direcciones"])
@@ -28,9 +29,16 @@ async def create_direccion_endpoint(direccion: DireccionCreateSchema, current_us
         print(f"Error creating direccion: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=List[DireccionResponseSchema])
-async def list_direcciones(current_user: Usuario = Depends(check_permissions_auto)):
-    return await get_all_direcciones()
+@router.get("/", response_model=List[DireccionResponseSchema], responses=RESPUESTA_PAGINADA)
+async def list_direcciones(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGINA_MAXIMA),
+    cursor: Optional[str] = None,
+    current_user: Usuario = Depends(check_permissions_auto),
+):
+    direcciones, siguiente = await get_all_direcciones(limit, cursor)
+    publicar_cursor(response, siguiente)
+    return direcciones
 
 @router.get("/{direccion}", response_model=DireccionResponseSchema)
 async def get_direccion(direccion: str, current_user: Usuario = Depends(check_permissions_auto)):
@@ -76,7 +84,7 @@ async def delete_direccion_endpoint(direccion_id: str, current_user: Usuario = D
 @router.post("/fetch", response_model=DireccionModel)
 async def fetch_direccion(request: DireccionFetchRequest, current_user: Usuario = Depends(check_permissions_auto)):
     try:
-        return await fetch_and_save_direccion(request.direccion)
+        return await fetch_and_save_direccion(request.direccion, force_refresh=request.force_refresh)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
@@ -0,0 +1,73 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import List, Optional
+from bson import ObjectId
+from app.database import jobs_collection
+from app.jobs import pool_jobs, job_out, eventos_job
+from app.paginacion import PAGINA_MAXIMA, paginar, publicar_cursor, RESPUESTA_PAGINADA
+from app.schemas.job import JobOut
+from app.security import check_permissions_auto
+from app.sse import respuesta_sse
+from app.models.usuario import Usuario
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def _object_id(job_id: str) -> ObjectId:
+    if not ObjectId.is_valid(job_id):
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return ObjectId(job_id)
+
+
+# ==================== LISTAR JOBS ====================
+@router.get("/", response_model=List[JobOut], responses=RESPUESTA_PAGINADA)
+async def list_jobs(
+    response: Response,
+    estado: Optional[str] = Query(None, description="pendiente, en_curso, completado, error o cancelado"),
+    limit: Optional[int] = Query(None, ge=1, le=PAGINA_MAXIMA),
+    cursor: Optional[str] = None,
+    current_user: Usuario = Depends(check_permissions_auto),
+):
+    """Jobs del más reciente al más antiguo, sin el resultado (se pide por id)."""
+    docs, siguiente = await paginar(
+        jobs_collection, {"estado": estado} if estado else None, orden="creado",
+        limite=limit, cursor=cursor, proyeccion={"resultado": 0},
+    )
+    publicar_cursor(response, siguiente)
+    return [job_out(d) for d in docs]
+
+
+# ==================== CONSULTAR UN JOB ====================
+@router.get("/{job_id}", response_model=JobOut)
+async def get_job(job_id: str, current_user: Usuario = Depends(check_permissions_auto)):
+    doc = await jobs_collection.find_one({"_id": _object_id(job_id)})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    return job_out(doc)
+
+
+@router.get("/{job_id}/eventos")
+async def get_job_eventos(job_id: str, current_user: Usuario = Depends(check_permissions_auto)):
+    """
+    Server-Sent Events del job: `progreso` cada vez que cambia su estado o
+    progreso y `fin` con el documento completo al terminar.
+    """
+    return respuesta_sse(eventos_job(_object_id(job_id)))
+
+
+# ==================== CANCELAR UN JOB ====================
+@router.delete("/{job_id}", response_model=JobOut)
+async def cancelar_job(
+    job_id: str,
+    response: Response,
+    current_user: Usuario = Depends(check_permissions_auto),
+):
+    """
+    Cancela el job. Si corre en otro proceso la cancelación queda pedida
+    (202, `cancelacion_solicitada`) y se completa en el próximo latido.
+    """
+    doc = await pool_jobs.cancelar(_object_id(job_id))
+    if not doc:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    if doc["estado"] == "en_curso" and doc.get("cancelacion_solicitada"):
+        response.status_code = 202
+    return job_out(doc)
@@ -1,35 +1,71 @@
-from fastapi import APIRouter, Query, HTTPException
-from typing import List
+from fastapi import APIRouter, Query, HTTPException, Response
+from typing import List, Optional
 from app.services.rastreo import (
     rastrear_origen,
     rastrear_destino,
+    stream_rastreo_origen,
+    stream_rastreo_destino,
+    buscar_camino,
     listar_rastreos
 )
-from app.schemas.rastreo import RastreoOut
+from app.services.contaminacion import calcular_contaminacion, CONTAMINACION_MAX_TXS
+from app.paginacion import PAGINA_MAXIMA, publicar_cursor, RESPUESTA_PAGINADA
+from app.sse import respuesta_sse
+from app.jobs import tarea, responder_con_job, actualizar_progreso
+from app.schemas.rastreo import RastreoOut, ContaminacionOut, CaminoOut
 
 router = APIRouter(prefix="/rastreo", tags=["rastreo"])
 
 
-@router.get("/", response_model=List[RastreoOut])
-async def get_rastreos():
+@tarea("rastreo_origen")
+async def _job_rastreo_origen(direccion: str, profundidad: int = 3, presupuesto_por_nivel: Optional[int] = None):
+    """Rastreo de origen como job: cada nivel cerrado se guarda como progreso."""
+    final = None
+    async for evento, datos in stream_rastreo_origen(direccion, profundidad, presupuesto_por_nivel):
+        if evento == "nivel":
+            await actualizar_progreso(**datos)
+        elif evento == "fin":
+            final = datos
+    return final
+
+
+@router.get("/", response_model=List[RastreoOut], responses=RESPUESTA_PAGINADA)
+async def get_rastreos(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGINA_MAXIMA),
+    cursor: Optional[str] = None,
+):
     """
-    Lista todos los rastreos registrados en la base de datos.
+    Lista los rastreos registrados, del más reciente al más antiguo. La
+    página siguiente se pide con el cursor del header X-Next-Cursor.
     """
-    return await listar_rastreos()
+    rastreos, siguiente = await listar_rastreos(limit, cursor)
+    publicar_cursor(response, siguiente)
+    return rastreos
 
 
 @router.post("/origen", response_model=RastreoOut)
 async def rastrear_origen_endpoint(
     direccion: str = Query(..., description="Dirección destino a rastrear hacia atrás"),
-    profundidad: int = Query(3, ge=1, le=10, description="Cantidad de saltos hacia atrás")
+    profundidad: int = Query(3, ge=1, le=10, description="Cantidad de saltos hacia atrás"),
+    presupuesto_por_nivel: Optional[int] = Query(
+        None, ge=0, description="Direcciones a refrescar contra la API por nivel (0 = todas)"
+    ),
+    asincrono: bool = Query(False, description="Ejecutar como job en segundo plano (202 con el id del job)"),
 ):
     """
     Ejecuta un rastreo de origen, buscando hacia atrás en la blockchain
     para identificar el origen de los fondos. 
     Utiliza datos locales y, si no existen, consulta la API externa.
+    Con `asincrono=true` corre como job y se consulta en /jobs/{id}.
     """
+    if asincrono:
+        return await responder_con_job(
+            "rastreo_origen", direccion=direccion, profundidad=profundidad,
+            presupuesto_por_nivel=presupuesto_por_nivel,
+        )
     try:
-        resultado = await rastrear_origen(direccion, profundidad)
+        resultado = await rastrear_origen(direccion, profundidad, presupuesto_por_nivel)
         return resultado
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -38,7 +74,12 @@ async def rastrear_origen_endpoint(
 @router.post("/destino", response_model=RastreoOut)
 async def rastrear_destino_endpoint(
     direccion: str = Query(..., description="Dirección de origen a rastrear hacia adelante"),
-    dias: str = Query("7", description="Período de búsqueda: '7', '30', '90', o 'historico'")
+    dias: str = Query("7", description="Período de búsqueda: '7', '30', '90', o 'historico'"),
+    profundidad: int = Query(1, ge=1, le=10, description="Cantidad de saltos hacia adelante"),
+    fanout_por_nivel: Optional[int] = Query(
+        None, ge=0, description="Destinos que se siguen por nivel (0 = todos)"
+    ),
+    max_conexiones: Optional[int] = Query(None, ge=1, description="Tope total de conexiones"),
 ):
     """
     Ejecuta un rastreo de destino, analizando hacia dónde se dirigen los fondos
@@ -46,8 +87,87 @@ async def rastrear_destino_endpoint(
     Usa datos locales o los obtiene de la API externa.
     """
     try:
-        resultado = await rastrear_destino(direccion_inicial=direccion, dias=dias)
+        resultado = await rastrear_destino(
+            direccion_inicial=direccion,
+            dias=dias,
+            profundidad=profundidad,
+            fanout_por_nivel=fanout_por_nivel,
+            max_conexiones=max_conexiones,
+        )
         return resultado
     except Exception as e:
         print(f"❌ Error en rastreo destino: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/origen/stream")
+async def rastrear_origen_stream_endpoint(
+    direccion: str = Query(..., description="Dirección destino a rastrear hacia atrás"),
+    profundidad: int = Query(3, ge=1, le=10, description="Cantidad de saltos hacia atrás"),
+    presupuesto_por_nivel: Optional[int] = Query(
+        None, ge=0, description="Direcciones a refrescar contra la API por nivel (0 = todas)"
+    ),
+):
+    """
+    Variante de `/rastreo/origen` que emite Server-Sent Events a medida que
+    avanza: `conexion` por cada conexión, `terminal` donde se deja de
+    expandir, `nivel` al cerrar cada nivel y `fin` con el rastreo guardado
+    (o `error` si falla).
+    """
+    return respuesta_sse(stream_rastreo_origen(direccion, profundidad, presupuesto_por_nivel))
+
+
+@router.get("/destino/stream")
+async def rastrear_destino_stream_endpoint(
+    direccion: str = Query(..., description="Dirección de origen a rastrear hacia adelante"),
+    dias: str = Query("7", description="Período de búsqueda: '7', '30', '90', o 'historico'"),
+    profundidad: int = Query(1, ge=1, le=10, description="Cantidad de saltos hacia adelante"),
+    fanout_por_nivel: Optional[int] = Query(
+        None, ge=0, description="Destinos que se siguen por nivel (0 = todos)"
+    ),
+    max_conexiones: Optional[int] = Query(None, ge=1, description="Tope total de conexiones"),
+):
+    """
+    Variante de `/rastreo/destino` que emite Server-Sent Events
+    (`conexion`, `terminal`, `nivel`, `fin` / `error`) a medida que avanza.
+    """
+    return respuesta_sse(
+        stream_rastreo_destino(direccion, dias, profundidad, fanout_por_nivel, max_conexiones)
+    )
+
+
+@router.post("/contaminacion", response_model=ContaminacionOut)
+async def contaminacion_endpoint(
+    direccion: str = Query(..., description="Dirección cuyos fondos se consideran sucios"),
+    modo: str = Query("haircut", pattern="^(haircut|fifo)$", description="Modelo de propagación"),
+    profundidad: int = Query(3, ge=1, le=10, description="Cantidad de saltos hacia adelante"),
+    max_txs: Optional[int] = Query(
+        None, ge=1, le=CONTAMINACION_MAX_TXS, description="Tope de transacciones del subgrafo"
+    ),
+    limite: int = Query(100, ge=0, description="Direcciones a devolver (0 = todas)"),
+):
+    """
+    Calcula cuánto de los fondos enviados por `direccion` llegó a cada
+    dirección alcanzada, con el modelo haircut (proporcional) o FIFO.
+    """
+    try:
+        return await calcular_contaminacion(direccion, modo, profundidad, max_txs, limite)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/camino", response_model=CaminoOut)
+async def buscar_camino_endpoint(
+    origen: str = Query(..., description="Dirección desde la que salen los fondos (p. ej. la víctima)"),
+    destino: str = Query(..., description="Dirección a la que se sospecha que llegaron"),
+    max_saltos: int = Query(6, ge=1, le=12, description="Largo máximo del camino"),
+    criterio: str = Query("saltos", pattern="^(saltos|monto|tiempo)$", description="Desempate entre caminos"),
+):
+    """
+    Busca el camino de fondos más corto entre dos direcciones sobre las
+    transacciones guardadas, con un BFS bidireccional.
+    """
+    try:
+        return await buscar_camino(origen, destino, max_saltos, criterio)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
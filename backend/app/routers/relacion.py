@@ -1,12 +1,15 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
 from typing import List
 from app.schemas.relacion import RelacionOut
 from app.services.relacion import get_all_relaciones, detectar_relaciones, get_relaciones_by_direccion
 from app.security import check_permissions_auto
+from app.jobs import tarea, responder_con_job
 from app.models.usuario import Usuario
 
 router = APIRouter(prefix="/relaciones", tags=["Relaciones"])
 
+tarea("detectar_relaciones")(detectar_relaciones)
+
 @router.get("/", response_model=List[RelacionOut])
 async def list_relaciones(current_user: Usuario = Depends(check_permissions_auto)):
     """Listar relaciones existentes (limit 200 por defecto)."""
@@ -17,8 +20,13 @@ async def list_relaciones(current_user: Usuario = Depends(check_permissions_auto
 
 
 @router.post("/detectar")
-async def post_detectar_relaciones(current_user: Usuario = Depends(check_permissions_auto)):
-    """Ejecutar la detección de vínculos entre direcciones."""
+async def post_detectar_relaciones(
+    asincrono: bool = Query(False, description="Ejecutar como job en segundo plano (202 con el id del job)"),
+    current_user: Usuario = Depends(check_permissions_auto),
+):
+    """Ejecutar la detección de vínculos entre direcciones (o encolarla con `asincrono=true`)."""
+    if asincrono:
+        return await responder_con_job("detectar_relaciones")
     try:
         result = await detectar_relaciones()
         return result
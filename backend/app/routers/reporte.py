@@ -12,6 +12,7 @@ from app.services.reporte import (
 import os
 from datetime import datetime
 from app.database import reporte_collection
+from app.jobs import tarea, responder_con_job
 from datetime import datetime, timedelta
 
 
@@ -123,14 +124,9 @@ async def obtener_historial():
 # 🔹 GENERACIÓN DE REPORTES (sin autenticación)
 # =====================================================
 
-@router.post("/generar/riesgo/{address}")
-async def generar_riesgo(address: str, formato: str = "PDF", force_api: bool = False):
-    """Genera un reporte de riesgo (PDF o CSV) sin requerir autenticación."""
-    formato_upper = formato.upper()
-    path = await generar_reporte_riesgo(address, formato_upper, force_api)
-
+def _archivo_generado(path: str, detalle: str) -> dict:
     if not os.path.exists(path):
-        raise HTTPException(status_code=500, detail="No se encontró el archivo generado")
+        raise HTTPException(status_code=500, detail=detalle)
 
     filename = os.path.basename(path)
     return {
@@ -141,39 +137,54 @@ async def generar_riesgo(address: str, formato: str = "PDF", force_api: bool = F
     }
 
 
+# Los generadores también corren como jobs (`asincrono=true`): el resultado
+# del job es el mismo dict con la URL de descarga.
+@tarea("reporte_riesgo")
+async def _reporte_riesgo(address: str, formato: str = "PDF", force_api: bool = False) -> dict:
+    path = await generar_reporte_riesgo(address, formato.upper(), force_api)
+    return _archivo_generado(path, "No se encontró el archivo generado")
+
+
+@tarea("reporte_actividad")
+async def _reporte_actividad(fecha_inicio: str, fecha_fin: str, formato: str = "PDF") -> dict:
+    path = await generar_reporte_actividad(fecha_inicio, fecha_fin, formato)
+    return _archivo_generado(path, "Error al crear el archivo")
+
+
+@tarea("reporte_clusters")
+async def _reporte_clusters(formato: str = "PDF") -> dict:
+    path = await generar_reporte_clusters(formato)
+    return _archivo_generado(path, "Error al crear el archivo")
+
+
+@router.post("/generar/riesgo/{address}")
+async def generar_riesgo(address: str, formato: str = "PDF", force_api: bool = False, asincrono: bool = False):
+    """Genera un reporte de riesgo (PDF o CSV) sin requerir autenticación."""
+    if asincrono:
+        return await responder_con_job("reporte_riesgo", address=address, formato=formato, force_api=force_api)
+    return await _reporte_riesgo(address, formato, force_api)
+
+
 @router.post("/generar/actividad/")
 async def generar_actividad(
     fecha_inicio: str = Query(...),
     fecha_fin: str = Query(...),
     formato: str = Query("PDF"),
+    asincrono: bool = Query(False),
 ):
     """Genera un reporte de actividad (PDF o CSV) sin requerir autenticación."""
-    path = await generar_reporte_actividad(fecha_inicio, fecha_fin, formato)
-
-    if not os.path.exists(path):
-        raise HTTPException(status_code=500, detail="Error al crear el archivo")
-
-    filename = os.path.basename(path)
-    return {
-        "status": "ok",
-        "path": path,
-        "filename": filename,
-        "download_url": f"/reportes/download/{filename}",
-    }
+    if asincrono:
+        return await responder_con_job(
+            "reporte_actividad", fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, formato=formato
+        )
+    return await _reporte_actividad(fecha_inicio, fecha_fin, formato)
 
 
 @router.post("/generar/clusters/")
-async def generar_clusters(formato: str = Query("PDF")):
-    path = await generar_reporte_clusters(formato)
-    if not os.path.exists(path):
-        raise HTTPException(status_code=500, detail="Error al crear el archivo")
-    filename = os.path.basename(path)
-    return {
-        "status": "ok",
-        "path": path,
-        "filename": filename,
-        "download_url": f"/reportes/download/{filename}",
-    }
+async def generar_clusters(formato: str = Query("PDF"), asincrono: bool = Query(False)):
+    if asincrono:
+        return await responder_con_job("reporte_clusters", formato=formato)
+    return await _reporte_clusters(formato)
 
 
 # =====================================================
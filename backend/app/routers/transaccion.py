@@ -1,5 +1,5 @@
-from fastapi import APIRouter, HTTPException, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from typing import List, Optional
 from app.schemas.transaccion import TransaccionCreateSchema, TransaccionResponseSchema, TransaccionFetchRequest
 from app.services.transaccion import (
     create_transaccion,
@@ -10,6 +10,7 @@ from app.services.transaccion import (
     fetch_and_save_transactions_by_address,
 )
 from app.security import check_permissions_auto
+from app.paginacion import PAGINA_MAXIMA, publicar_cursor, RESPUESTA_PAGINADA
 from app.models.usuario import Usuario
 
 router = APIRouter(prefix="/transacciones", tags=["transacciones"])
@@ -22,9 +23,14 @@ async def create_transaccion_endpoint(transaccion: TransaccionCreateSchema, curr
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/", response_model=List[TransaccionResponseSchema])
-async def list_transacciones():
-    transacciones = await get_all_transacciones()
+@router.get("/", response_model=List[TransaccionResponseSchema], responses=RESPUESTA_PAGINADA)
+async def list_transacciones(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGINA_MAXIMA),
+    cursor: Optional[str] = None,
+):
+    transacciones, siguiente = await get_all_transacciones(limit, cursor)
+    publicar_cursor(response, siguiente)
     return [t.model_dump(by_alias=True) for t in transacciones]
 
 
@@ -65,9 +71,22 @@ async def delete_transaccion_endpoint(transaccion_id: str, current_user: Usuario
         raise HTTPException(status_code=500, detail=str(e))
     
 @router.post("/fetch", response_model=List[TransaccionResponseSchema])
-async def fetch_transacciones_by_direccion(direccion_hash: str, current_user: Usuario = Depends(check_permissions_auto)):
+async def fetch_transacciones_by_direccion(
+    direccion_hash: str,
+    max_txs: Optional[int] = None,
+    reanudar: bool = False,
+    incremental: bool = False,
+    current_user: Usuario = Depends(check_permissions_auto),
+):
+    """
+    `max_txs=0` descarga el historial completo; `reanudar` continúa una
+    descarga interrumpida; `incremental` solo trae (y devuelve) las TX
+    posteriores a la última sincronización.
+    """
     try:
-        transacciones = await fetch_and_save_transactions_by_address(direccion_hash)
+        transacciones = await fetch_and_save_transactions_by_address(
+            direccion_hash, max_txs=max_txs, reanudar=reanudar, incremental=incremental
+        )
         return [t.model_dump(by_alias=True) for t in transacciones]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
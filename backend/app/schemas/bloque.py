@@ -1,4 +1,4 @@
-from typing import Annotated
+from typing import Annotated, Optional
 from pydantic import BaseModel, Field
 from app.database import PyObjectId
 from datetime import datetime
@@ -22,3 +22,4 @@ class BloqueResponseSchema(BaseModel):
     fecha: datetime
     recompensa_total: float
     volumen_total: float
+    confirmaciones: Optional[int] = None
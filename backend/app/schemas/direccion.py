@@ -23,6 +23,7 @@ class DireccionCreateSchema(BaseModel):
 
 class DireccionFetchRequest(BaseModel):
     direccion: str
+    force_refresh: bool = False  # ignora la copia local aunque esté fresca
 
 class DireccionResponseSchema(BaseModel):
     model_config = ConfigDict(extra="allow", populate_by_name=True)
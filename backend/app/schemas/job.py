@@ -0,0 +1,20 @@
+from pydantic import BaseModel, Field
+from typing import Any, Optional
+from datetime import datetime
+
+
+class JobOut(BaseModel):
+    id: str = Field(alias="_id")
+    tipo: str
+    estado: str                      # pendiente | en_curso | completado | error | cancelado
+    parametros: dict = {}
+    progreso: Optional[dict] = None
+    resultado: Optional[Any] = None
+    error: Optional[str] = None
+    cancelacion_solicitada: bool = False  # cancelado desde otro proceso, pendiente de su dueño
+    creado: datetime
+    iniciado: Optional[datetime] = None
+    terminado: Optional[datetime] = None
+
+    class Config:
+        populate_by_name = True
@@ -17,9 +17,48 @@ class ConexionOut(BaseModel):
             return v[0] if v else ""
         return v
 
+class NodoTerminalOut(BaseModel):
+    direccion: str
+    nivel: int
+    motivo: str
+    grado: int
+    hash: Optional[str] = None
+
 class RastreoOut(BaseModel):
     direccion_inicial: str
     tipo: str
     resultado: List[ConexionOut]
     total_conexiones: int
     fecha_analisis: str
+    nodos_terminales: List[NodoTerminalOut] = []
+
+
+class DireccionContaminadaOut(BaseModel):
+    direccion: str
+    nivel: Optional[int] = None
+    recibido: float              # total recibido dentro del subgrafo
+    recibido_sucio: float        # parte de lo recibido que proviene del origen
+    saldo_sucio: float           # parte sucia que todavía no gastó
+    proporcion: float
+
+class ContaminacionOut(BaseModel):
+    direccion_inicial: str
+    modo: str
+    profundidad: int
+    transacciones: int
+    total_emitido: float
+    direcciones_alcanzadas: int
+    resultado: List[DireccionContaminadaOut]
+    fecha_analisis: str
+
+
+class CaminoOut(BaseModel):
+    origen: str
+    destino: str
+    criterio: str
+    encontrado: bool
+    saltos: int
+    camino: List[ConexionOut]
+    direcciones_exploradas: int
+    mensaje: Optional[str] = None
+    fecha_analisis: str
@@ -8,6 +8,8 @@ class TransaccionCreateSchema(BaseModel):
     fecha: datetime
     inputs: List[str]
     outputs: List[str]
+    inputs_valores: Optional[List[float]] = None    # BTC de cada input, en el orden de inputs
+    outputs_valores: Optional[List[float]] = None   # BTC de cada output, en el orden de outputs
     monto_total: float
     estado: str
     patrones_sospechosos: List[str] = Field(default_factory=list)
@@ -21,6 +23,8 @@ class TransaccionResponseSchema(BaseModel):
     fecha: datetime
     inputs: List[str]  # IDs como strings
     outputs: List[str]  # IDs como strings
+    inputs_valores: List[float] = Field(default_factory=list)
+    outputs_valores: List[float] = Field(default_factory=list)
     monto_total: float
     estado: str
     patrones_sospechosos: List[str]
@@ -1,5 +1,6 @@
 from datetime import datetime
 from bson import ObjectId
+from app.paginacion import paginar
 
 # Crear alerta
 async def crear_alerta(db, alerta_data):
@@ -11,13 +12,14 @@ async def crear_alerta(db, alerta_data):
 
 
 # Listar todas las alertas
-async def listar_alertas(db):
+async def listar_alertas(db, limite=None, cursor=None):
+    docs, siguiente = await paginar(db.alertas, limite=limite, cursor=cursor, por_defecto=None)
     alertas = []
-    async for alerta in db.alertas.find({}):
+    for alerta in docs:
         if isinstance(alerta.get("direccion"), ObjectId):
             alerta["direccion"] = str(alerta["direccion"])
         alertas.append(alerta)
-    return alertas
+    return alertas, siguiente
 
 # Obtener una alerta por ID
 async def get_alerta_by_id(db, alerta_id: str):
@@ -64,3 +66,37 @@ async def generar_alerta_por_riesgo(db, direccion_id, nivel_riesgo, transaccione
         print(f"🚨 ALERTA generada para {direccion_id} → tipo={tipo_alerta}, nivel={nivel_riesgo}")
     else:
         print(f"ℹ️ Ya existe alerta para {direccion_id} con nivel {nivel_riesgo}")
+
+
+# Versión por lotes: una consulta para las alertas existentes y un insert_many
+async def generar_alertas_por_riesgo(db, pares):
+    """`pares` es una lista de (direccion_id, nivel_riesgo)."""
+    tipos = {"Crítico": "lavado", "Alto": "fraude", "Medio": "monitoreo", "Bajo": "vinculo_riesgoso"}
+    pares = [(ObjectId(d), n) for d, n in pares if n in tipos]
+    if not pares:
+        return 0
+
+    existentes = set()
+    async for alerta in db.alertas.find(
+        {"direccion": {"$in": list({d for d, _ in pares})}, "nivel_riesgo": {"$in": list({n for _, n in pares})}},
+        {"direccion": 1, "nivel_riesgo": 1},
+    ):
+        existentes.add((alerta["direccion"], alerta["nivel_riesgo"]))
+
+    nuevas = [
+        {
+            "direccion": direccion_id,
+            "tipo_alerta": tipos[nivel],
+            "nivel_riesgo": nivel,
+            "fecha": datetime.utcnow(),
+            "transacciones": [],
+            "cluster": None,
+        }
+        for direccion_id, nivel in dict.fromkeys(pares)
+        if (direccion_id, nivel) not in existentes
+    ]
+    if nuevas:
+        await db.alertas.insert_many(nuevas)
+        print(f"🚨 {len(nuevas)} ALERTA(S) generadas ({len(pares) - len(nuevas)} ya existían)")
+    return len(nuevas)
+
@@ -3,10 +3,23 @@ from app.services.cluster import get_cluster_by_address, fetch_and_save_cluster
 from app.services.reporte import fetch_reportes_by_address
 from app.models.analisis import AnalisisModel
 from app.schemas.reporte import Reporte
+from app.services.direccion import direccion_esta_fresca, ttl_direccion
+from app.utils import a_datetime_utc, gather_acotado
 from datetime import datetime, timezone, timedelta
-from typing import Optional
+from typing import Dict, List, Optional
 from bson import ObjectId
-import httpx
+from pymongo import UpdateOne
+from app.providers.registro import get_proveedor
+from app.jobs import actualizar_progreso
+import asyncio
+import os
+import numpy as np
+import pandas as pd
+
+# Direcciones por lote en el análisis de riesgo masivo (una escritura bulk por lote)
+ANALISIS_LOTE = int(os.getenv("ANALISIS_LOTE", "500"))
+# Consultas de actividad upstream simultáneas para direcciones vencidas
+ANALISIS_CONCURRENCIA = int(os.getenv("ANALISIS_CONCURRENCIA", "8"))
 
 PESOS_CATEGORIAS = {
     "RANSOMWARE": 3,
@@ -77,25 +90,11 @@ async def generar_analisis_por_direccion(address: str) -> Optional[AnalisisModel
 
 
 async def verificar_actividad_blockcypher(direccion: str):
-    """Consulta a BlockCypher para obtener la fecha de la última transacción."""
-    url = f"https://api.blockcypher.com/v1/btc/main/addrs/{direccion}"
+    """Consulta al proveedor de la cadena la fecha de la última transacción."""
     try:
-        async with httpx.AsyncClient() as client:
-            r = await client.get(url, timeout=10)
-            if r.status_code != 200:
-                return None
-            data = r.json()
-            last_tx = data.get("final_tx_time")
-            if last_tx:
-                # Convierte a datetime con timezone UTC
-                if isinstance(last_tx, str):
-                    if last_tx.endswith("Z"):
-                        last_tx = last_tx.replace("Z", "+00:00")
-                    return datetime.fromisoformat(last_tx)
-                return last_tx
-            return None
+        return await get_proveedor().obtener_ultima_actividad(direccion)
     except Exception as e:
-        print(f"⚠️ Error consultando BlockCypher para {direccion}: {e}")
+        print(f"⚠️ Error consultando actividad de {direccion}: {e}")
         return None
 
 
@@ -198,160 +197,197 @@ def calcular_perfil_riesgo(num_reportes, categorias, ultima_tx: Optional[datetim
     }
 
 
-async def analizar_riesgo_direcciones(direccion: Optional[str] = None):
+def calcular_perfiles_riesgo(
+    num_reportes: List[int], categorias: List[List[str]], ultimas_tx: List[Optional[datetime]]
+) -> List[dict]:
     """
-    Analiza una dirección específica o todas las direcciones.
-    Combina reportes, actividad reciente y categorías delictivas.
-    Actualiza la colección `direccion_collection` con el estado actual del riesgo
-    y genera alertas automáticas si el riesgo es ALTO o CRÍTICO.
+    Versión vectorizada de `calcular_perfil_riesgo` para un lote de
+    direcciones (listas paralelas). Mismos umbrales y pesos, sin logs por
+    dirección.
     """
-    print("\n" + "=" * 60)
-    print("🚀 INICIANDO ANÁLISIS DE RIESGO")
-    print("=" * 60)
+    ahora = pd.Timestamp.now(tz="UTC")
+    reportes = np.asarray(num_reportes)
+    score_reportes = np.select([reportes == 0, reportes == 1, reportes <= 3], [0, 1, 2], 3)
+    score_categoria = np.array(
+        [max((PESOS_CATEGORIAS.get(c.upper(), 0) for c in cats), default=0) for cats in categorias],
+        dtype=float,
+    )
+
+    antiguedad = ahora - pd.to_datetime(pd.Series([_parse_datetime(u) for u in ultimas_tx], dtype=object), utc=True)
+    con_tx = antiguedad.notna().to_numpy()
+    reciente = (antiguedad <= pd.Timedelta(days=90)).to_numpy()
+    media = (antiguedad <= pd.Timedelta(days=365)).to_numpy()
+    score_actividad = np.select([reciente, media, con_tx], [3, 2, 1], 0)
+    actividad = np.select([reciente, media, con_tx], ["reciente", "media", "inactiva"], "sin transacciones")
 
-    # QUERY
-    query = {"direccion": direccion} if direccion else {}
-    print(f"📍 Query: {query}")
+    total = score_reportes + score_categoria + score_actividad
+    nivel = np.select([total <= 2, total <= 4, total <= 6], ["bajo", "medio", "alto"], "crítico")
+
+    return [
+        {
+            "total": float(total[i]),
+            "nivel": str(nivel[i]),
+            "ponderaciones": {
+                "reportes": int(score_reportes[i]),
+                "categorias": float(score_categoria[i]),
+                "actividad": int(score_actividad[i]),
+            },
+            "actividad": str(actividad[i]),
+        }
+        for i in range(len(reportes))
+    ]
+
+
+async def _reportes_por_direccion(direccion: Optional[str] = None) -> Dict[str, dict]:
+    """Cantidad de reportes y categorías de cada dirección, en una sola agregación."""
+    pipeline = [{"$match": {"id_direccion": direccion}}] if direccion else []
+    pipeline.append({
+        "$group": {
+            "_id": "$id_direccion",
+            "cantidad": {"$sum": 1},
+            "categorias": {"$push": {"$ifNull": ["$scamCategory", "OTHER"]}},
+        }
+    })
+    return {
+        doc["_id"]: doc
+        async for doc in reporte_collection.aggregate(pipeline, allowDiskUse=True)
+    }
 
-    direcciones = await direccion_collection.find(query).to_list(None)
-    print(f"🔍 Analizando {len(direcciones)} dirección(es)...")
-    resultados = []
 
-    for dir_doc in direcciones:
+def _actividad_vigente(dir_doc: dict) -> bool:
+    """La última actividad conocida sigue vigente (dentro del TTL de la dirección)."""
+    if direccion_esta_fresca(dir_doc):
+        return True
+    verificada = a_datetime_utc(dir_doc.get("actividad_verificada"))
+    return verificada is not None and datetime.now(timezone.utc) - verificada <= ttl_direccion(dir_doc)
+
+
+async def _analizar_lote(lote: List[dict], reportes: Dict[str, dict], forzar_actividad: bool, semaforo) -> List[dict]:
+    """Puntúa un lote de direcciones y escribe sus resultados con operaciones bulk."""
+    from app.services.alerta import generar_alertas_por_riesgo
+    from app.database import db
+
+    # --- Actividad: solo se consulta upstream lo que está vencido ---
+    vencidas = [d["direccion"] for d in lote if forzar_actividad or not _actividad_vigente(d)]
+    actividad, errores = await gather_acotado(
+        vencidas, lambda addr: get_proveedor().obtener_ultima_actividad(addr), semaforo
+    )
+    for addr, e in errores.items():
+        print(f"⚠️ Error consultando actividad de {addr}: {e}")
+    verificada = datetime.now(timezone.utc)
+
+    ultimas_tx = [actividad.get(d["direccion"]) or d.get("ultima_tx") for d in lote]
+    categorias = [reportes.get(d["direccion"], {}).get("categorias", []) for d in lote]
+    cantidades = [reportes.get(d["direccion"], {}).get("cantidad", 0) for d in lote]
+    perfiles = calcular_perfiles_riesgo(cantidades, categorias, ultimas_tx)
+
+    ahora_iso = datetime.now(timezone.utc).isoformat()
+    actualizaciones, registros, alertas, resultados = [], [], [], []
+    for dir_doc, ultima_tx, cats, cantidad, resultado in zip(lote, ultimas_tx, categorias, cantidades, perfiles):
         addr = dir_doc["direccion"]
-        doc_id = dir_doc["_id"]
-
-        print(f"\n{'=' * 60}")
-        print(f"📌 DIRECCIÓN: {addr}")
-        print(f"🆔 ObjectId: {doc_id} (tipo: {type(doc_id)})")
-        print(f"{'=' * 60}")
-
-        # --- Reportes asociados ---
-        reportes = await reporte_collection.find({"id_direccion": addr}).to_list(None)
-        print(f"📄 Reportes encontrados: {len(reportes)}")
-        if reportes:
-            print(f"🧾 Categorías: {[r.get('scamCategory', 'OTHER') for r in reportes]}")
-
-        categorias = [r.get("scamCategory", "OTHER") for r in reportes]
-
-        # --- Actividad: DB o API ---
-        ultima_tx = dir_doc.get("ultima_tx")
-        print(f"🕐 ultima_tx en DB: {ultima_tx} (tipo: {type(ultima_tx)})")
-
-        if not ultima_tx:
-            api_tx = await verificar_actividad_blockcypher(addr)
-            if api_tx:
-                ultima_tx = api_tx
-                print(f"✅ TX desde BlockCypher: {ultima_tx}")
-            else:
-                print(f"❌ Sin TX en BlockCypher")
-        else:
-            api_tx = await verificar_actividad_blockcypher(addr)
-            if api_tx:
-                ultima_tx = api_tx
-                print(f"🔄 TX actualizada desde BlockCypher: {ultima_tx}")
-
-        # --- Cálculo de riesgo ---
-        resultado = calcular_perfil_riesgo(len(reportes), categorias, ultima_tx)
-
-        # --- Conversión de fecha a string ISO ---
-        ultima_tx_iso = None
-        if ultima_tx:
-            if isinstance(ultima_tx, datetime):
-                ultima_tx_iso = ultima_tx.isoformat()
-            else:
-                ultima_tx_iso = str(ultima_tx)
-            print(f"📅 ultima_tx_iso: {ultima_tx_iso}")
-
-        # --- Preparar datos para actualización ---
         update_data = {
             "perfil_riesgo": resultado["nivel"],
-            "ultimo_update_riesgo": datetime.now(timezone.utc).isoformat(),
+            "ultimo_update_riesgo": ahora_iso,
             "total": resultado["total"],
-            "cantidad_reportes": len(reportes),
+            "cantidad_reportes": cantidad,
             "actividad": resultado["actividad"],
-            "categorias": categorias,
+            "categorias": cats,
             "ponderaciones": resultado["ponderaciones"],
         }
+        if ultima_tx:
+            update_data["ultima_tx"] = ultima_tx.isoformat() if isinstance(ultima_tx, datetime) else str(ultima_tx)
+        if addr in actividad:
+            update_data["actividad_verificada"] = verificada
+        actualizaciones.append(UpdateOne({"_id": dir_doc["_id"]}, {"$set": update_data}))
 
-        if ultima_tx_iso:
-            update_data["ultima_tx"] = ultima_tx_iso
-
-        print(f"\n💾 ACTUALIZACIÓN:")
-        print(f"   Query: {{'_id': {doc_id}}}")
-        print(f"   Datos a actualizar:")
-        for key, val in update_data.items():
-            print(f"      - {key}: {val}")
-
-        try:
-            # --- Actualización en direccion_collection ---
-            update_result = await direccion_collection.update_one(
-                {"_id": doc_id},
-                {"$set": update_data}
-            )
-
-            print(f"\n📊 RESULTADO DE UPDATE:")
-            print(f"   ✓ Matched: {update_result.matched_count}")
-            print(f"   ✓ Modified: {update_result.modified_count}")
-            print(f"   ✓ Acknowledged: {update_result.acknowledged}")
-
-            actualizado = update_result.modified_count > 0
-
-            # ------------------------------------------------------------
-            # 🚨 GENERAR ALERTA AUTOMÁTICA SI RIESGO ES ALTO O CRÍTICO
-            # ------------------------------------------------------------
-            try:
-                from app.services.alerta import generar_alerta_por_riesgo
-                from app.database import db
-
-                nivel = update_data.get("perfil_riesgo", "").lower()
-                if nivel in ["alto", "crítico"]:
-                    print(f"🚨 Nivel {nivel.upper()} detectado para {addr}, generando alerta...")
-                    await generar_alerta_por_riesgo(db, str(doc_id), nivel.capitalize())
-                else:
-                    print(f"ℹ️ Riesgo {nivel} → no se genera alerta para {addr}")
-
-            except Exception as e:
-                print(f"❌ Error generando alerta automática para {addr}: {e}")
-
-        except Exception as e:
-            print(f"   ❌ ERROR EN UPDATE: {type(e).__name__}: {e}")
-            import traceback
-            traceback.print_exc()
-            actualizado = False
-
-        # --- Registro histórico en colección analisis ---
-        try:
-            analisis_doc = {
-                "direccion": addr,
-                "puntaje_total": resultado["total"],
-                "nivel_riesgo": resultado["nivel"],
-                "factores": {
-                    "reportes": len(reportes),
-                    "categorias": categorias,
-                    "actividad": resultado["actividad"],
-                    "ponderaciones": resultado["ponderaciones"]
-                },
-                "fecha_analisis": datetime.now(timezone.utc).isoformat()
-            }
-
-            insert_result = await analisis_collection.insert_one(analisis_doc)
-            print(f"📝 Análisis guardado con ID: {insert_result.inserted_id}")
-        except Exception as e:
-            print(f"❌ ERROR guardando análisis: {e}")
-
+        registros.append({
+            "direccion": addr,
+            "puntaje_total": resultado["total"],
+            "nivel_riesgo": resultado["nivel"],
+            "factores": {
+                "reportes": cantidad,
+                "categorias": cats,
+                "actividad": resultado["actividad"],
+                "ponderaciones": resultado["ponderaciones"],
+            },
+            "fecha_analisis": ahora_iso,
+        })
+        if resultado["nivel"] in ["alto", "crítico"]:
+            alertas.append((str(dir_doc["_id"]), resultado["nivel"].capitalize()))
         resultados.append({
             "direccion": addr,
             "nivel": resultado["nivel"],
             "total": resultado["total"],
-            "cantidad_reportes": len(reportes),
-            "categorias": categorias,
+            "cantidad_reportes": cantidad,
+            "categorias": cats,
             "actividad": resultado["actividad"],
             "ponderaciones": resultado["ponderaciones"],
-            "fecha_analisis": datetime.now(timezone.utc).isoformat(),
-            "actualizado": actualizado
+            "fecha_analisis": ahora_iso,
         })
 
+    actualizado = True
+    try:
+        await direccion_collection.bulk_write(actualizaciones, ordered=False)
+    except Exception as e:
+        print(f"❌ ERROR EN UPDATE del lote: {type(e).__name__}: {e}")
+        actualizado = False
+    if actualizado and alertas:
+        try:
+            # 🚨 Alertas automáticas para riesgo ALTO o CRÍTICO
+            await generar_alertas_por_riesgo(db, alertas)
+        except Exception as e:
+            print(f"❌ Error generando alertas automáticas del lote: {e}")
+    try:
+        # Registro histórico en colección analisis
+        await analisis_collection.insert_many(registros, ordered=False)
+    except Exception as e:
+        print(f"❌ ERROR guardando análisis del lote: {e}")
+
+    for r in resultados:
+        r["actualizado"] = actualizado
+    print(
+        f"📦 Lote: {len(lote)} direcciones, {len(vencidas)} con actividad vencida "
+        f"({len(errores)} errores), {len(alertas)} en riesgo alto/crítico"
+    )
+    return resultados
+
+
+async def analizar_riesgo_direcciones(direccion: Optional[str] = None):
+    """
+    Analiza una dirección específica o todas las direcciones.
+    Combina reportes, actividad reciente y categorías delictivas.
+    Actualiza la colección `direccion_collection` con el estado actual del riesgo
+    y genera alertas automáticas si el riesgo es ALTO o CRÍTICO.
+
+    Trabaja por lotes de ANALISIS_LOTE direcciones: los reportes se agregan
+    en una sola consulta, el puntaje se calcula vectorizado y las escrituras
+    van en bulk. La actividad upstream solo se refresca para direcciones
+    vencidas (o siempre, si se pidió una dirección puntual), con
+    concurrencia acotada.
+    """
+    print("\n" + "=" * 60)
+    print("🚀 INICIANDO ANÁLISIS DE RIESGO")
+    print("=" * 60)
+
+    # QUERY
+    query = {"direccion": direccion} if direccion else {}
+    print(f"📍 Query: {query}")
+
+    reportes = await _reportes_por_direccion(direccion)
+    print(f"📄 Direcciones con reportes: {len(reportes)}")
+
+    proyeccion = {"direccion": 1, "ultima_tx": 1, "updated_at": 1, "actividad_verificada": 1}
+    semaforo = asyncio.Semaphore(ANALISIS_CONCURRENCIA)
+    resultados, lote = [], []
+    async for dir_doc in direccion_collection.find(query, proyeccion).batch_size(ANALISIS_LOTE):
+        lote.append(dir_doc)
+        if len(lote) >= ANALISIS_LOTE:
+            resultados.extend(await _analizar_lote(lote, reportes, bool(direccion), semaforo))
+            lote = []
+            await actualizar_progreso(analizadas=len(resultados))
+    if lote:
+        resultados.extend(await _analizar_lote(lote, reportes, bool(direccion), semaforo))
+
     print(f"\n{'=' * 60}")
     print(f"🏁 ANÁLISIS COMPLETADO")
     print(f"   Direcciones analizadas: {len(resultados)}")
@@ -1,27 +1,30 @@
 from app.database import bloque_collection, PyObjectId
 from app.models.bloque import BloqueModel
 from app.schemas.bloque import BloqueCreateSchema
-from typing import List, Optional
-import httpx
-from datetime import datetime
+from app.providers.registro import get_proveedor
+from app.singleflight import singleflight_upstream
+from app.cache import LRUCache
+from app.utils import a_datetime_utc, gather_acotado
+from app.paginacion import paginar
+from pymongo import UpdateOne
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 import asyncio
-import random
-import json
+import os
 
-BLOCKCYPHER_API = "https://api.blockcypher.com/v1/btc/main"
-BLOCKCYPHER_TOKENS = [
-    "d210a6ac92274d61b1f15e2c3652bf57",
-    "0da27d786bd94dbb89c7ca6d0274fc03",
-]
+# Un bloque con suficientes confirmaciones no cambia: una vez en Mongo se
+# reutiliza para siempre, con un LRU en memoria delante (hash -> BloqueModel).
+BLOQUE_CONFIRMACIONES_MIN = int(os.getenv("BLOQUE_CONFIRMACIONES_MIN", "6"))
+BLOQUE_CACHE_MAX = int(os.getenv("BLOQUE_CACHE_MAX", "5000"))
+bloques_confirmados = LRUCache(BLOQUE_CACHE_MAX)
 
-def get_random_token():
-    """Rota entre múltiples tokens para evitar límites."""
-    return random.choice(BLOCKCYPHER_TOKENS)
+# Descargas simultáneas por lote cuando no se recibe un semáforo compartido
+BLOQUE_CONCURRENCIA = int(os.getenv("BLOQUE_CONCURRENCIA", "4"))
 
 # Obtener todos
-async def get_all_bloques():
-    docs = await bloque_collection.find().to_list(1000)
-    return [BloqueModel(**doc) for doc in docs]  # 👈 convierte cada doc en modelo
+async def get_all_bloques(limite: Optional[int] = None, cursor: Optional[str] = None):
+    docs, siguiente = await paginar(bloque_collection, limite=limite, cursor=cursor, por_defecto=1000)
+    return [BloqueModel(**doc) for doc in docs], siguiente  # 👈 convierte cada doc en modelo
 
 async def create_bloque(data: dict) -> dict:
     result = await bloque_collection.insert_one(data)
@@ -46,80 +49,118 @@ async def delete_bloque(bloque_id: str) -> int:
     result = await bloque_collection.delete_one({"_id": PyObjectId(bloque_id)})
     return result.deleted_count
 
-async def fetch_and_save_bloque(block_hash: str) -> BloqueModel:
-    MAX_INTENTOS = 3
-    BASE_DELAY = 5  # segundos
-    data = None
-
-    for intento in range(MAX_INTENTOS):
-        try:
-            token = get_random_token()
-            url = f"{BLOCKCYPHER_API}/blocks/{block_hash}?token={token}"
-            
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Accept": "application/json",
-            }
-            
-            delay = random.uniform(2, 5)
-            await asyncio.sleep(delay)
-            
-            print(f"🌐 [Bloque] Consultando {block_hash[:8]}... (Intento {intento + 1})")
-            
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(url, headers=headers)
-                
-                content_type = response.headers.get("Content-Type", "")
-                response_text = response.text
-                
-                if "Cloudflare" in response_text or "Just a moment" in response_text:
-                    print(f"🔒 Cloudflare detectado en bloque {block_hash[:8]}. Reintentando...")
-                    await asyncio.sleep(BASE_DELAY * (intento + 1))
-                    continue
-                
-                if "application/json" not in content_type:
-                    print(f"⚠️ Respuesta no es JSON para bloque {block_hash[:8]}: {content_type}")
-                    await asyncio.sleep(BASE_DELAY * (intento + 1))
-                    continue
-                
-                try:
-                    api_data = response.json()
-                except json.JSONDecodeError:
-                    print(f"❌ JSON inválido para bloque {block_hash[:8]}.")
-                    await asyncio.sleep(BASE_DELAY * (intento + 1))
-                    continue
-                
-                if "error" in api_data:
-                    error_msg = api_data["error"]
-                    if "limit" in error_msg.lower():
-                        print(f"⏳ Rate limit en bloque {block_hash[:8]}. Esperando...")
-                        await asyncio.sleep(BASE_DELAY * 2)
-                        continue
-                    raise Exception(f"Error de API para bloque {block_hash}: {error_msg}")
-                
-                response.raise_for_status()
-                data = api_data
-                break # Salir del bucle si todo fue bien
-
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 429: # Too Many Requests
-                print(f"⏳ HTTP 429 en bloque {block_hash[:8]}. Esperando...")
-                await asyncio.sleep(BASE_DELAY * 3)
-            else:
-                raise Exception(f"Error HTTP para bloque {block_hash}: {e.response.text}") from e
-        except httpx.RequestError as e:
-            print(f"🔌 Error de conexión para bloque {block_hash}. Reintentando...")
-            await asyncio.sleep(BASE_DELAY * (intento + 1))
-
-    if not data:
-        raise Exception(f"No se pudo obtener datos para el bloque {block_hash} después de {MAX_INTENTOS} intentos.")
+def bloque_es_definitivo(doc: dict, confirmaciones: Optional[int] = None) -> bool:
+    """
+    True si el bloque ya no puede cambiar. `confirmaciones` permite pasar la
+    profundidad conocida por otra vía (p. ej. las confirmaciones de una TX).
+    """
+    conocidas = [c for c in (doc.get("confirmaciones"), confirmaciones) if c is not None]
+    if conocidas:
+        return max(conocidas) >= BLOQUE_CONFIRMACIONES_MIN
+    # Documentos previos sin el campo: ~10 min por bloque
+    fecha = a_datetime_utc(doc.get("fecha"))
+    return bool(fecha and datetime.now(timezone.utc) - fecha >= timedelta(minutes=10 * BLOQUE_CONFIRMACIONES_MIN))
+
+
+async def fetch_and_save_bloque(block_hash: str, confirmaciones: Optional[int] = None) -> BloqueModel:
+    """
+    Devuelve el bloque desde el LRU o desde Mongo si ya está confirmado; si no,
+    lo descarga y guarda. Consultas simultáneas del mismo hash se coalescen.
+    """
+    modelos, errores = await _resolver_bloques({block_hash: confirmaciones})
+    if block_hash in errores:
+        raise errores[block_hash]
+    return modelos[block_hash]
+
+
+async def resolver_bloques(
+    confirmaciones_por_hash: Dict[str, Optional[int]],
+    semaforo: Optional[asyncio.Semaphore] = None,
+) -> Dict[str, BloqueModel]:
+    """
+    Versión por lotes de `fetch_and_save_bloque` ({hash: confirmaciones}):
+    LRU, una lectura `$in`, descargas en paralelo y un único `bulk_write`.
+    Los bloques que no se pudieron obtener se omiten del resultado.
+    """
+    modelos, errores = await _resolver_bloques(confirmaciones_por_hash, semaforo)
+    for block_hash, error in errores.items():
+        print(f"⚠️ Error guardando bloque {block_hash[:8]}: {error}")
+    return modelos
+
+
+async def _resolver_bloques(
+    confirmaciones_por_hash: Dict[str, Optional[int]],
+    semaforo: Optional[asyncio.Semaphore] = None,
+) -> Tuple[Dict[str, BloqueModel], Dict[str, Exception]]:
+    modelos: Dict[str, BloqueModel] = {}
+    pendientes = []
+    for block_hash in confirmaciones_por_hash:
+        cacheado = bloques_confirmados.get(block_hash)
+        if cacheado is not None:
+            modelos[block_hash] = cacheado
+        else:
+            pendientes.append(block_hash)
+    if not pendientes:
+        return modelos, {}
+
+    # 1️⃣ Una sola lectura: los bloques ya confirmados no se vuelven a descargar
+    existentes = {
+        doc["hash"]: doc
+        async for doc in bloque_collection.find({"hash": {"$in": pendientes}})
+    }
+    a_descargar = []
+    for block_hash in pendientes:
+        doc = existentes.get(block_hash)
+        if doc and bloque_es_definitivo(doc, confirmaciones_por_hash[block_hash]):
+            modelos[block_hash] = BloqueModel(**doc)
+            bloques_confirmados.set(block_hash, modelos[block_hash])
+        else:
+            a_descargar.append(block_hash)
+    if not a_descargar:
+        return modelos, {}
+
+    # 2️⃣ Descargas en paralelo (coalescidas con otras consultas en vuelo)
+    descargados, errores = await gather_acotado(
+        a_descargar,
+        lambda h: singleflight_upstream.ejecutar("bloque", h, _descargar_bloque, h),
+        semaforo or asyncio.Semaphore(BLOQUE_CONCURRENCIA),
+    )
+    if not descargados:
+        return modelos, errores
+
+    # 3️⃣ Un único bulk_write con upserts
+    orden = list(descargados)
+    resultado = await bloque_collection.bulk_write(
+        [UpdateOne({"hash": h}, {"$set": descargados[h]}, upsert=True) for h in orden],
+        ordered=False,
+    )
+    ids = {h: existentes[h]["_id"] for h in orden if h in existentes}
+    for indice, _id in resultado.upserted_ids.items():
+        ids[orden[indice]] = _id
+    faltantes = [h for h in orden if h not in ids]
+    if faltantes:
+        async for doc in bloque_collection.find({"hash": {"$in": faltantes}}, {"hash": 1}):
+            ids[doc["hash"]] = doc["_id"]
+
+    for block_hash in orden:
+        bloque = BloqueModel(**descargados[block_hash], _id=ids[block_hash])
+        modelos[block_hash] = bloque
+        if bloque_es_definitivo(descargados[block_hash], confirmaciones_por_hash[block_hash]):
+            bloques_confirmados.set(block_hash, bloque)
+
+    return modelos, errores
+
+
+async def _descargar_bloque(block_hash: str) -> dict:
+    """Consulta el proveedor de la cadena y devuelve el documento a guardar (sin `_id`)."""
+    data = await get_proveedor().obtener_bloque(block_hash)
 
     fecha_str = data.get("time")
     if fecha_str:
         fecha_obj = datetime.fromisoformat(fecha_str.replace("Z", "+00:00"))
     else:
         # Si no hay fecha, usar la actual como fallback
-        fecha_obj = datetime.now(datetime.timezone.utc)
+        fecha_obj = datetime.now(timezone.utc)
     
     doc = {
         "numero_bloque": data.get("height"),
@@ -127,14 +168,6 @@ async def fetch_and_save_bloque(block_hash: str) -> BloqueModel:
         "fecha": fecha_obj,
         "recompensa_total": float(data.get("fees", 0)) / 100_000_000,
         "volumen_total": float(data.get("total", 0)) / 100_000_000,
+        "confirmaciones": int(data.get("depth", 0)) + 1,
     }
-
-    existing = await bloque_collection.find_one({"hash": block_hash})
-    if existing:
-        await bloque_collection.update_one({"hash": block_hash}, {"$set": doc})
-        doc["_id"] = existing["_id"]
-    else:
-        result = await bloque_collection.insert_one(doc)
-        doc["_id"] = result.inserted_id
-
-    return BloqueModel(**doc)
+    return doc
@@ -1,22 +1,26 @@
-from app.database import cluster_collection, transaccion_collection
+from app.database import cluster_collection, transaccion_collection, direccion_collection
 from app.models.cluster import ClusterModel
-from typing import Optional, List
-import httpx
+from typing import Optional, List, Tuple
 from bson import ObjectId
+from app.http_client import get_http_client
 from app.services.reporte import fetch_reportes_by_address
+from app.graph_index import indice_grafo
+from app.paginacion import paginar
 
 # ======================= OBTENER TODOS LOS CLUSTERS =======================
-async def get_all_clusters(limit: int = 100) -> List[ClusterModel]:
+async def get_all_clusters(
+    limite: Optional[int] = None, cursor: Optional[str] = None
+) -> Tuple[List[ClusterModel], Optional[str]]:
     """
-    Devuelve todos los clusters almacenados en la base de datos.
+    Devuelve una página de clusters (más recientes primero) y el cursor de la siguiente.
     """
-    docs = await cluster_collection.find().to_list(limit)
+    docs, siguiente = await paginar(cluster_collection, limite=limite, cursor=cursor)
     result = []
     for doc in docs:
         doc["id"] = str(doc["_id"])
         del doc["_id"]
         result.append(ClusterModel(**doc))
-    return result
+    return result, siguiente
 
 
 # ======================= BUSCAR CLUSTER POR DIRECCIÓN =======================
@@ -44,9 +48,9 @@ async def fetch_and_save_cluster(address: str) -> Optional[ClusterModel]:
     url = f"https://www.walletexplorer.com/api/1/address-lookup?address={address}"
 
     try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            r = await client.get(url)
-            data = r.json()
+        client = get_http_client()
+        r = await client.get(url, timeout=10.0)
+        data = r.json()
     except Exception as e:
         print(f"❌ Error al conectar con la API externa: {e}")
         return None
@@ -76,6 +80,21 @@ async def fetch_and_save_cluster(address: str) -> Optional[ClusterModel]:
     return ClusterModel(**doc)
 
 
+# ======================= COINCIDENCIA DE TRANSACCIONES (ENRIQUECIDA) =======================
+async def _relacionadas_desde_indice(address: str) -> List[str]:
+    """Direcciones que compartieron transacciones con `address`, según el índice del grafo."""
+    doc = await direccion_collection.find_one({"direccion": address}, {"_id": 1})
+    claves = indice_grafo.vecinos(doc["_id"]) if doc else set()
+    claves |= indice_grafo.vecinos(address)  # TX antiguas que guardaban la dirección como texto
+
+    ids = [c for c in claves if isinstance(c, ObjectId)]
+    relacionadas = [c for c in claves if isinstance(c, str)]
+    if ids:
+        async for d in direccion_collection.find({"_id": {"$in": ids}}, {"direccion": 1}):
+            relacionadas.append(d["direccion"])
+    return list(dict.fromkeys(relacionadas))
+
+
 # ======================= COINCIDENCIA DE TRANSACCIONES (ENRIQUECIDA) =======================
 async def detectar_cluster_por_transacciones(address: str) -> Optional[ClusterModel]:
     """
@@ -85,21 +104,22 @@ async def detectar_cluster_por_transacciones(address: str) -> Optional[ClusterMo
     print(f"🔎 Buscando coincidencias de transacciones para {address}")
 
     try:
-        pipeline = [
-            {"$match": {"$or": [{"inputs": address}, {"outputs": address}]}},
-            {"$project": {"direcciones": {"$setUnion": ["$inputs", "$outputs"]}}},
-            {"$unwind": "$direcciones"},
-            {"$group": {"_id": None, "relacionadas": {"$addToSet": "$direcciones"}}},
-        ]
-
-        result = await transaccion_collection.aggregate(pipeline).to_list(1)
-
-        if not result:
+        if indice_grafo.listo:
+            relacionadas = await _relacionadas_desde_indice(address)
+        else:
+            pipeline = [
+                {"$match": {"$or": [{"inputs": address}, {"outputs": address}]}},
+                {"$project": {"direcciones": {"$setUnion": ["$inputs", "$outputs"]}}},
+                {"$unwind": "$direcciones"},
+                {"$group": {"_id": None, "relacionadas": {"$addToSet": "$direcciones"}}},
+            ]
+            result = await transaccion_collection.aggregate(pipeline).to_list(1)
+            relacionadas = result[0]["relacionadas"] if result else []
+
+        if not relacionadas:
             print("⚠️ No se encontraron transacciones relacionadas")
             return None
 
-        relacionadas = result[0]["relacionadas"]
-
         # Asegurar que la base esté incluida
         if address not in relacionadas:
             relacionadas.append(address)
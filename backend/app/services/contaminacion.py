@@ -0,0 +1,318 @@
+import asyncio
+import os
+from array import array
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+from app.services.rastreo import (
+    RASTREO_PRESUPUESTO_POR_NIVEL,
+    ResolutorDirecciones,
+    _refrescar_frontera,
+    _txs_enviadas_por_direccion,
+)
+from app.services.direccion import fetch_and_save_direccion
+from app.services.transaccion import fetch_and_save_transactions_by_address
+
+# -----------------------------
+# Propagación de fondos contaminados (taint)
+# -----------------------------
+# Parte de una dirección cuyos fondos se consideran 100% sucios y recorre
+# hacia adelante sus TX en orden cronológico, repartiendo lo sucio entre
+# los outputs según el modelo elegido:
+#
+#   haircut  cada dirección mezcla sus fondos: lo que gasta lleva la
+#            proporción sucia de su saldo y cada output de la TX recibe la
+#            proporción sucia del total de inputs.
+#   fifo     las monedas salen en el orden en que llegaron: cada dirección
+#            gasta primero sus lotes más antiguos y los outputs de la TX se
+#            llenan en orden con los inputs en orden.
+#
+# Solo se conoce lo que entra al subgrafo cargado: lo que una dirección
+# gasta sin haberlo recibido dentro de él se considera limpio.
+
+MODOS_CONTAMINACION = ("haircut", "fifo")
+# Tope de TX del subgrafo y TX enviadas que se cargan por dirección y nivel
+CONTAMINACION_MAX_TXS = int(os.getenv("CONTAMINACION_MAX_TXS", "5000"))
+CONTAMINACION_TXS_POR_DIRECCION = int(os.getenv("CONTAMINACION_TXS_POR_DIRECCION", "50"))
+
+# Por debajo de esto (en BTC) un monto sucio se considera cero
+EPSILON = 1e-12
+
+
+def _ceros(n: int) -> array:
+    return array("d", bytes(8 * n))
+
+
+def _valores_tx(doc: dict, campo: str) -> List[float]:
+    """
+    Valor de cada input/output de la TX. Las TX guardadas antes de tener
+    valores por input/output reparten el total en partes iguales.
+    """
+    ids = doc.get(campo) or []
+    valores = doc.get(f"{campo}_valores") or []
+    if len(valores) == len(ids):
+        return [float(v) for v in valores]
+    total = float(doc.get("monto_total") or 0)
+    if campo == "inputs":
+        total += float(doc.get("fees") or 0)
+    return [total / len(ids)] * len(ids) if ids else []
+
+
+def _orden_cronologico(doc: dict):
+    fecha = doc.get("fecha")
+    # Las TX sin fecha (pendientes) van al final
+    return fecha.replace(tzinfo=None) if isinstance(fecha, datetime) else datetime.max
+
+
+class MotorContaminacion:
+    """
+    Subgrafo de TX en arreglos compactos (CSR TX → nodos, con el valor de
+    cada arista) sobre el que se propagan los montos sucios. Los nodos son
+    las claves de dirección de los documentos (ObjectId).
+    """
+
+    def __init__(self, docs: Iterable[dict]):
+        self._nodo_por_clave: Dict[Hashable, int] = {}
+        self.claves: List[Hashable] = []
+        self.tx_hash: List[str] = []
+        self.in_off, self.in_nodo, self.in_val = array("q", [0]), array("q"), array("d")
+        self.out_off, self.out_nodo, self.out_val = array("q", [0]), array("q"), array("d")
+
+        for doc in sorted(docs, key=_orden_cronologico):
+            self.tx_hash.append(doc.get("hash"))
+            for clave, valor in zip(doc.get("inputs") or [], _valores_tx(doc, "inputs")):
+                self.in_nodo.append(self._nodo(clave))
+                self.in_val.append(valor)
+            self.in_off.append(len(self.in_nodo))
+            for clave, valor in zip(doc.get("outputs") or [], _valores_tx(doc, "outputs")):
+                self.out_nodo.append(self._nodo(clave))
+                self.out_val.append(valor)
+            self.out_off.append(len(self.out_nodo))
+
+    def _nodo(self, clave: Hashable) -> int:
+        nodo = self._nodo_por_clave.get(clave)
+        if nodo is None:
+            nodo = len(self.claves)
+            self._nodo_por_clave[clave] = nodo
+            self.claves.append(clave)
+        return nodo
+
+    def propagar(self, origen: Hashable, modo: str = "haircut") -> dict:
+        """
+        Propaga los fondos sucios de `origen` por todo el subgrafo y devuelve
+        los vectores por nodo (`recibido`, `recibido_sucio`, `saldo`,
+        `saldo_sucio`), el monto sucio que movió cada TX (`tx_sucio`) y el
+        total que gastó el origen (`emitido`).
+        """
+        if modo not in MODOS_CONTAMINACION:
+            raise ValueError(f"Modo de contaminación no válido: {modo}")
+        n_nodos, n_tx = len(self.claves), len(self.tx_hash)
+        fuente = self._nodo_por_clave.get(origen, -1)
+        recibido, recibido_sucio = _ceros(n_nodos), _ceros(n_nodos)
+        saldo, saldo_sucio = _ceros(n_nodos), _ceros(n_nodos)
+        tx_sucio = _ceros(n_tx)
+        emitido = 0.0
+        # FIFO: lotes [monto, fracción sucia] por nodo, del más antiguo al más nuevo
+        lotes = [deque() for _ in range(n_nodos)] if modo == "fifo" else None
+
+        for t in range(n_tx):
+            # 1️⃣ Gastar los inputs
+            segmentos: List[Tuple[float, float]] = []  # (monto, fracción sucia) en orden
+            total_in = sucio_in = 0.0
+            for k in range(self.in_off[t], self.in_off[t + 1]):
+                v, valor = self.in_nodo[k], self.in_val[k]
+                total_in += valor
+                if v == fuente:
+                    sucio = valor
+                    emitido += valor
+                    segmentos.append((valor, 1.0))
+                elif modo == "haircut":
+                    disponible = max(saldo[v], valor)
+                    sucio = valor * saldo_sucio[v] / disponible if disponible > 0 else 0.0
+                else:
+                    sucio = self._gastar_lotes(lotes[v], valor, segmentos)
+                sucio_in += sucio
+                if v != fuente:
+                    saldo[v] = max(saldo[v] - valor, 0.0)
+                    saldo_sucio[v] = max(saldo_sucio[v] - sucio, 0.0)
+            tx_sucio[t] = sucio_in
+
+            # 2️⃣ Repartir entre los outputs
+            fraccion = sucio_in / total_in if total_in > 0 else 0.0
+            posicion = 0  # FIFO: segmento de inputs que se está consumiendo
+            for k in range(self.out_off[t], self.out_off[t + 1]):
+                o, valor = self.out_nodo[k], self.out_val[k]
+                if modo == "haircut":
+                    sucio = valor * fraccion
+                else:
+                    sucio, posicion = self._llenar_output(segmentos, posicion, valor, lotes[o])
+                if sucio < EPSILON:
+                    sucio = 0.0
+                recibido[o] += valor
+                recibido_sucio[o] += sucio
+                saldo[o] += valor
+                saldo_sucio[o] += sucio
+
+        return {
+            "recibido": recibido,
+            "recibido_sucio": recibido_sucio,
+            "saldo": saldo,
+            "saldo_sucio": saldo_sucio,
+            "tx_sucio": tx_sucio,
+            "emitido": emitido,
+        }
+
+    @staticmethod
+    def _gastar_lotes(cola: deque, valor: float, segmentos: List[Tuple[float, float]]) -> float:
+        """Consume `valor` de los lotes más antiguos; lo que falte se considera limpio."""
+        restante, sucio = valor, 0.0
+        while restante > EPSILON and cola:
+            lote = cola[0]
+            tomado = min(lote[0], restante)
+            segmentos.append((tomado, lote[1]))
+            sucio += tomado * lote[1]
+            restante -= tomado
+            lote[0] -= tomado
+            if lote[0] <= EPSILON:
+                cola.popleft()
+        if restante > EPSILON:
+            segmentos.append((restante, 0.0))
+        return sucio
+
+    @staticmethod
+    def _llenar_output(
+        segmentos: List[Tuple[float, float]], posicion: int, valor: float, cola: deque
+    ) -> Tuple[float, int]:
+        """Llena un output con los segmentos de inputs en orden y los encola como lotes."""
+        restante, sucio = valor, 0.0
+        while restante > EPSILON and posicion < len(segmentos):
+            monto, fraccion_segmento = segmentos[posicion]
+            tomado = min(monto, restante)
+            if cola and cola[-1][1] == fraccion_segmento:
+                cola[-1][0] += tomado
+            else:
+                cola.append([tomado, fraccion_segmento])
+            sucio += tomado * fraccion_segmento
+            restante -= tomado
+            if tomado >= monto - EPSILON:
+                posicion += 1
+            else:
+                segmentos[posicion] = (monto - tomado, fraccion_segmento)
+        if restante > EPSILON:
+            # Más outputs que inputs conocidos: el excedente es limpio
+            cola.append([restante, 0.0])
+        return sucio, posicion
+
+
+async def _cargar_subgrafo(
+    direccion_inicial: str,
+    profundidad: int,
+    max_txs: int,
+    resolutor: ResolutorDirecciones,
+) -> Tuple[List[dict], Dict[str, int]]:
+    """
+    TX enviadas desde `direccion_inicial` y, nivel a nivel, desde cada
+    dirección que recibió de ellas (hasta `profundidad` saltos y `max_txs`
+    TX). Devuelve los documentos y el nivel en que apareció cada dirección.
+    """
+    frontera = await resolutor.ids_de([direccion_inicial])
+    docs: Dict[str, dict] = {}
+    nivel_de = {direccion_inicial: 0}
+
+    for nivel in range(profundidad):
+        txs_por_direccion = await _txs_enviadas_por_direccion(
+            frontera, None, CONTAMINACION_TXS_POR_DIRECCION
+        )
+        await resolutor.resolver(
+            o for txs in txs_por_direccion.values() for tx_doc in txs for o in (tx_doc.get("outputs") or [])
+        )
+        siguientes = []
+        for txs in txs_por_direccion.values():
+            for tx_doc in txs:
+                if len(docs) >= max_txs:
+                    break
+                if tx_doc.get("hash") in docs:
+                    continue
+                docs[tx_doc.get("hash")] = tx_doc
+                for output_id in tx_doc.get("outputs") or []:
+                    output_addr = resolutor.nombre(output_id)
+                    if output_addr not in nivel_de:
+                        nivel_de[output_addr] = nivel + 1
+                        siguientes.append(output_addr)
+
+        print(f"🔹 Nivel {nivel + 1} - {len(frontera)} direcciones, {len(docs)} TX en el subgrafo")
+        if len(docs) >= max_txs:
+            print(f"⛔ Tope de {max_txs} TX alcanzado")
+            break
+        if not siguientes or nivel + 1 >= profundidad:
+            break
+        await _refrescar_frontera(siguientes, RASTREO_PRESUPUESTO_POR_NIVEL)
+        frontera = await resolutor.ids_de(siguientes)
+        if not frontera:
+            break
+
+    return list(docs.values()), nivel_de
+
+
+# ================================================================
+# 🔹 CONTAMINACIÓN — Cuánto de lo sucio llegó a cada dirección
+# ================================================================
+async def calcular_contaminacion(
+    direccion_inicial: str,
+    modo: str = "haircut",
+    profundidad: int = 3,
+    max_txs: Optional[int] = None,
+    limite: int = 100,
+) -> dict:
+    """
+    Considera sucios todos los fondos que envía `direccion_inicial` y
+    calcula, hasta `profundidad` saltos, cuánto de ellos recibió cada
+    dirección alcanzada (modelo `haircut` o `fifo`). Devuelve las `limite`
+    direcciones con más fondos sucios recibidos.
+    """
+    if modo not in MODOS_CONTAMINACION:
+        raise ValueError(f"Modo de contaminación no válido: {modo}")
+    max_txs = max_txs or CONTAMINACION_MAX_TXS
+    print(f"\n🧪 [CONTAMINACIÓN] {direccion_inicial} | modo={modo} | profundidad={profundidad}")
+
+    try:
+        await fetch_and_save_direccion(direccion_inicial)
+        await fetch_and_save_transactions_by_address(direccion_inicial)
+    except Exception as e:
+        print(f"⚠️ Error al actualizar {direccion_inicial[:8]}...: {e}")
+
+    resolutor = ResolutorDirecciones()
+    docs, nivel_de = await _cargar_subgrafo(direccion_inicial, profundidad, max_txs, resolutor)
+    origen_id = (await resolutor.ids_de([direccion_inicial])).get(direccion_inicial)
+
+    # La propagación es CPU pura sobre el subgrafo: en un hilo para no frenar el event loop
+    motor = await asyncio.to_thread(MotorContaminacion, docs)
+    vectores = await asyncio.to_thread(motor.propagar, origen_id, modo)
+    await resolutor.resolver(motor.claves)
+
+    resultado = []
+    for v, clave in enumerate(motor.claves):
+        if clave == origen_id or vectores["recibido_sucio"][v] <= 0:
+            continue
+        direccion = resolutor.nombre(clave)
+        resultado.append({
+            "direccion": direccion,
+            "nivel": nivel_de.get(direccion),
+            "recibido": vectores["recibido"][v],
+            "recibido_sucio": vectores["recibido_sucio"][v],
+            "saldo_sucio": vectores["saldo_sucio"][v],
+            "proporcion": vectores["recibido_sucio"][v] / vectores["recibido"][v] if vectores["recibido"][v] else 0.0,
+        })
+    resultado.sort(key=lambda r: r["recibido_sucio"], reverse=True)
+
+    print(f"✅ {len(resultado)} direcciones recibieron fondos sucios de {len(docs)} TX")
+    return {
+        "direccion_inicial": direccion_inicial,
+        "modo": modo,
+        "profundidad": profundidad,
+        "transacciones": len(docs),
+        "total_emitido": vectores["emitido"],
+        "direcciones_alcanzadas": len(resultado),
+        "resultado": resultado[:limite] if limite else resultado,
+        "fecha_analisis": datetime.now(timezone.utc).isoformat(),
+    }
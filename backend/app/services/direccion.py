@@ -1,32 +1,41 @@
 from app.database import direccion_collection, bloque_collection, PyObjectId
 from app.models.direccion import DireccionModel
-from app.schemas.direccion import DireccionCreateSchema
-from typing import List, Optional
-import httpx
+from app.schemas.direccion import DireccionCreateSchema, DireccionResponseSchema
+from app.providers.registro import get_proveedor
+from app.singleflight import singleflight_upstream
+from app.utils import a_datetime_utc, gather_acotado
+from app.paginacion import paginar, proyeccion_de
+from pymongo import UpdateOne
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
 import asyncio
-import random
-import json
+import os
 
-BLOCKCYPHER_API = "https://api.blockcypher.com/v1/btc/main"
-BLOCKCYPHER_TOKENS = [
-    "d210a6ac92274d61b1f15e2c3652bf57",
-    "0da27d786bd94dbb89c7ca6d0274fc03",
-]
+# Ventana de frescura de los documentos locales: dentro del TTL se devuelven
+# sin consultar BlockCypher. Las direcciones sin actividad reciente cambian
+# poco, así que usan un TTL más largo.
+DIRECCION_TTL_SEGUNDOS = int(os.getenv("DIRECCION_TTL_SEGUNDOS", "900"))
+DIRECCION_TTL_INACTIVA_SEGUNDOS = int(os.getenv("DIRECCION_TTL_INACTIVA_SEGUNDOS", "86400"))
+DIRECCION_DIAS_INACTIVA = int(os.getenv("DIRECCION_DIAS_INACTIVA", "30"))
 
-def get_random_token():
-    return random.choice(BLOCKCYPHER_TOKENS)
+# Descargas simultáneas por lote cuando no se recibe un semáforo compartido
+DIRECCION_CONCURRENCIA = int(os.getenv("DIRECCION_CONCURRENCIA", "8"))
 
 # ==============================================================
 # CRUD DIRECCIONES
 # ==============================================================
 
-async def get_all_direcciones():
-    docs = await direccion_collection.find().to_list(None)
+async def get_all_direcciones(limite: Optional[int] = None, cursor: Optional[str] = None):
+    """Página de direcciones (más recientes primero) y cursor de la siguiente; sin `limite` ni `cursor`, todas."""
+    docs, siguiente = await paginar(
+        direccion_collection, limite=limite, cursor=cursor, por_defecto=None,
+        proyeccion=proyeccion_de(DireccionResponseSchema),
+    )
     result = []
     for doc in docs:
         doc["_id"] = str(doc["_id"])
         result.append(DireccionModel(**doc).dict(by_alias=True))
-    return result
+    return result, siguiente
 
 async def create_direccion(data: dict) -> dict:
     result = await direccion_collection.insert_one(data)
@@ -52,71 +61,119 @@ async def delete_direccion(direccion_id: str) -> int:
 # FETCH DIRECCIÓN DESDE BLOCKCYPHER Y BLOQUES LOCALES
 # ==============================================================
 
-async def fetch_and_save_direccion(address: str) -> DireccionModel:
-    MAX_INTENTOS = 3
-    BASE_DELAY = 5  # segundos
-    data = None
-
-    for intento in range(MAX_INTENTOS):
-        try:
-            token = get_random_token()
-            url = f"{BLOCKCYPHER_API}/addrs/{address}/full?token={token}"
-
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Accept": "application/json",
-            }
-
-            delay = random.uniform(2, 5)
-            await asyncio.sleep(delay)
-            print(f"🌐 [Dirección] Consultando {address[:8]}... (Intento {intento + 1})")
-
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(url, headers=headers)
-                content_type = response.headers.get("Content-Type", "")
-                response_text = response.text
-
-                if "Cloudflare" in response_text or "Just a moment" in response_text:
-                    print(f"🔒 Cloudflare detectado en dirección {address[:8]}. Reintentando...")
-                    await asyncio.sleep(BASE_DELAY * (intento + 1))
-                    continue
-
-                if "application/json" not in content_type:
-                    print(f"⚠️ Respuesta no es JSON para dirección {address[:8]}: {content_type}")
-                    await asyncio.sleep(BASE_DELAY * (intento + 1))
-                    continue
-
-                try:
-                    api_data = response.json()
-                except json.JSONDecodeError:
-                    print(f"❌ JSON inválido para dirección {address[:8]}.")
-                    await asyncio.sleep(BASE_DELAY * (intento + 1))
-                    continue
-
-                if "error" in api_data:
-                    error_msg = api_data["error"]
-                    if "limit" in error_msg.lower():
-                        print(f"⏳ Rate limit en dirección {address[:8]}. Esperando...")
-                        await asyncio.sleep(BASE_DELAY * 2)
-                        continue
-                    raise Exception(f"Error de API para {address}: {error_msg}")
-
-                response.raise_for_status()
-                data = api_data
-                break  # ✅ Salir del bucle si todo fue bien
-
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 429:
-                print(f"⏳ HTTP 429 en dirección {address[:8]}. Esperando...")
-                await asyncio.sleep(BASE_DELAY * 3)
-            else:
-                raise Exception(f"Error HTTP para {address}: {e.response.text}") from e
-        except httpx.RequestError:
-            print(f"🔌 Error de conexión para {address}. Reintentando...")
-            await asyncio.sleep(BASE_DELAY * (intento + 1))
-
-    if not data:
-        raise Exception(f"No se pudo obtener datos para la dirección {address} después de {MAX_INTENTOS} intentos.")
+def ttl_direccion(doc: dict) -> timedelta:
+    """TTL aplicable a un documento según la antigüedad de su última transacción."""
+    ultima_tx = a_datetime_utc(doc.get("ultima_tx"))
+    if ultima_tx and datetime.now(timezone.utc) - ultima_tx > timedelta(days=DIRECCION_DIAS_INACTIVA):
+        return timedelta(seconds=DIRECCION_TTL_INACTIVA_SEGUNDOS)
+    return timedelta(seconds=DIRECCION_TTL_SEGUNDOS)
+
+
+def direccion_esta_fresca(doc: Optional[dict]) -> bool:
+    """True si el documento local se actualizó desde BlockCypher dentro de su TTL."""
+    if not doc:
+        return False
+    updated_at = a_datetime_utc(doc.get("updated_at"))
+    if not updated_at:
+        return False
+    return datetime.now(timezone.utc) - updated_at <= ttl_direccion(doc)
+
+
+async def fetch_and_save_direccion(address: str, force_refresh: bool = False) -> DireccionModel:
+    """
+    Devuelve la dirección desde Mongo si está fresca; si no (o con
+    `force_refresh`), la descarga desde BlockCypher y la guarda.
+    Llamadas concurrentes para la misma dirección comparten una única consulta.
+    """
+    modelos, errores = await _resolver_direcciones([address], force_refresh=force_refresh)
+    if address in errores:
+        raise errores[address]
+    return modelos[address]
+
+
+async def resolver_direcciones(
+    addresses: List[str],
+    semaforo: Optional[asyncio.Semaphore] = None,
+    force_refresh: bool = False,
+) -> Dict[str, DireccionModel]:
+    """
+    Versión por lotes de `fetch_and_save_direccion`: una lectura `$in`, las
+    descargas necesarias en paralelo y un único `bulk_write` con upserts.
+    Las direcciones que no se pudieron obtener se omiten del resultado.
+    """
+    modelos, errores = await _resolver_direcciones(addresses, semaforo, force_refresh)
+    for address, error in errores.items():
+        print(f"⚠️ Error guardando dirección {address[:8]}: {error}")
+    return modelos
+
+
+async def _resolver_direcciones(
+    addresses: List[str],
+    semaforo: Optional[asyncio.Semaphore] = None,
+    force_refresh: bool = False,
+) -> Tuple[Dict[str, DireccionModel], Dict[str, Exception]]:
+    addresses = list(dict.fromkeys(a for a in addresses if a))
+    if not addresses:
+        return {}, {}
+
+    # 1️⃣ Una sola lectura para todas las direcciones
+    existentes = {
+        doc["direccion"]: doc
+        async for doc in direccion_collection.find({"direccion": {"$in": addresses}})
+    }
+
+    modelos: Dict[str, DireccionModel] = {}
+    pendientes = []
+    for address in addresses:
+        doc = existentes.get(address)
+        if not force_refresh and direccion_esta_fresca(doc):
+            modelos[address] = DireccionModel(**doc)
+        else:
+            pendientes.append(address)
+
+    if len(modelos):
+        print(f"📂 [Dirección] {len(modelos)} dirección(es) frescas en BD, sin consultar BlockCypher")
+    if not pendientes:
+        return modelos, {}
+
+    # 2️⃣ Descargas en paralelo (coalescidas con otras consultas en vuelo)
+    descargados, errores = await gather_acotado(
+        pendientes,
+        lambda a: singleflight_upstream.ejecutar("direccion", a, _descargar_direccion, a),
+        semaforo or asyncio.Semaphore(DIRECCION_CONCURRENCIA),
+    )
+    if not descargados:
+        return modelos, errores
+
+    # 3️⃣ Un único bulk_write con upserts
+    orden = list(descargados)
+    operaciones = [
+        UpdateOne({"direccion": address}, {"$set": descargados[address]}, upsert=True)
+        for address in orden
+    ]
+    resultado = await direccion_collection.bulk_write(operaciones, ordered=False)
+
+    ids = {address: existentes[address]["_id"] for address in orden if address in existentes}
+    for indice, _id in resultado.upserted_ids.items():
+        ids[orden[indice]] = _id
+
+    # Insertadas por otra corrutina entre la lectura y la escritura
+    faltantes = [address for address in orden if address not in ids]
+    if faltantes:
+        async for doc in direccion_collection.find({"direccion": {"$in": faltantes}}, {"direccion": 1}):
+            ids[doc["direccion"]] = doc["_id"]
+
+    for address in orden:
+        doc = {**existentes.get(address, {}), **descargados[address], "_id": ids[address]}
+        modelos[address] = DireccionModel(**doc)
+
+    print(f"✅ {len(orden)} dirección(es) guardadas desde BlockCypher.")
+    return modelos, errores
+
+
+async def _descargar_direccion(address: str) -> dict:
+    """Consulta el proveedor de la cadena y devuelve el documento a guardar (sin `_id`)."""
+    data = await get_proveedor().obtener_direccion(address)
 
     txs = data.get("txs", [])
     primer_tx = None
@@ -164,15 +221,6 @@ async def fetch_and_save_direccion(address: str) -> DireccionModel:
         "primer_tx": primer_tx,
         "ultima_tx": ultima_tx,
         "bloques": bloques,
+        "updated_at": datetime.now(timezone.utc),
     }
-
-    existing = await direccion_collection.find_one({"direccion": address})
-    if existing:
-        await direccion_collection.update_one({"direccion": address}, {"$set": doc})
-        doc["_id"] = existing["_id"]
-    else:
-        result = await direccion_collection.insert_one(doc)
-        doc["_id"] = result.inserted_id
-
-    print(f"✅ Dirección {address[:8]} guardada con {len(bloques)} bloques asociados.")
-    return DireccionModel(**doc)
+    return doc
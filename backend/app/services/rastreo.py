@@ -8,48 +8,473 @@ from app.services.transaccion import (
 from app.models.transaccion import TransaccionModel
 from app.models.rastreo import RastreoModel, Conexion
 from app.database import PyObjectId
+from app.cache import LRUCache
+from app.utils import gather_acotado
+from app.graph_index import indice_grafo
+from app.paginacion import paginar
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 import asyncio
+import heapq
+import math
+import os
 from app.services.direccion import fetch_and_save_direccion
 
+# BFS de origen: direcciones de la frontera que se refrescan contra el
+# proveedor por nivel (las de mayor monto primero) y cuántas a la vez;
+# el rate limiter global sigue acotando lo que sale a la API.
+RASTREO_PRESUPUESTO_POR_NIVEL = int(os.getenv("RASTREO_PRESUPUESTO_POR_NIVEL", "25"))
+RASTREO_CONCURRENCIA = int(os.getenv("RASTREO_CONCURRENCIA", "8"))
+# Poda por grado: una dirección con más TX que esto (n_tx del proveedor o su
+# grado en el índice local) se trata como servicio (exchange, mixer, pool):
+# aparece en el resultado pero el BFS no la expande
+RASTREO_GRADO_TERMINAL = int(os.getenv("RASTREO_GRADO_TERMINAL", "500"))
+# TX con más inputs que esto (consolidaciones, CoinJoin) no abren ramas nuevas
+RASTREO_MAX_ENTRADAS_POR_TX = int(os.getenv("RASTREO_MAX_ENTRADAS_POR_TX", "50"))
+# Transacciones recibidas que se consideran por dirección y nivel; con la
+# poda por grado solo se alcanza si n_tx está desactualizado (y se informa)
+RASTREO_TXS_POR_DIRECCION = int(os.getenv("RASTREO_TXS_POR_DIRECCION", str(RASTREO_GRADO_TERMINAL)))
+# BFS de destino: TX enviadas por dirección, direcciones que se siguen por
+# nivel (las de mayor monto primero) y tope total de conexiones del rastreo
+RASTREO_TXS_ENVIADAS_POR_DIRECCION = int(os.getenv("RASTREO_TXS_ENVIADAS_POR_DIRECCION", "50"))
+RASTREO_FANOUT_POR_NIVEL = int(os.getenv("RASTREO_FANOUT_POR_NIVEL", "50"))
+RASTREO_MAX_CONEXIONES = int(os.getenv("RASTREO_MAX_CONEXIONES", "1000"))
+# Orden temporal: cada salto debe ser anterior (origen) o posterior (destino)
+# a la TX por la que se llegó a la dirección; las TX que no cumplen se podan
+RASTREO_ORDEN_TEMPORAL = os.getenv("RASTREO_ORDEN_TEMPORAL", "1") == "1"
+# Búsqueda de camino: tope de direcciones visitadas entre los dos lados
+CAMINO_MAX_DIRECCIONES = int(os.getenv("CAMINO_MAX_DIRECCIONES", "20000"))
+
+# Mapa ObjectId → dirección compartido por el proceso (el par no cambia nunca)
+RASTREO_CACHE_DIRECCIONES = int(os.getenv("RASTREO_CACHE_DIRECCIONES", "20000"))
+direcciones_por_id = LRUCache(RASTREO_CACHE_DIRECCIONES)
+
+# Vida de un rastreo guardado como respuesta cacheada (0 = no reutilizar).
+# Además del TTL, la ingesta marca como no vigentes los rastreos que
+# contienen alguna dirección con TX nuevas (ver `transaccion.invalidar_rastreos`).
+RASTREO_CACHE_TTL_SEGUNDOS = int(os.getenv("RASTREO_CACHE_TTL_SEGUNDOS", "3600"))
+
+
 # ================================================================
-# 🔹 HELPER: Convertir ObjectId a dirección Bitcoin
+# 🔹 HELPER: Convertir ObjectId a dirección Bitcoin (por lotes)
 # ================================================================
-async def _resolve_direccion(obj_id) -> str:
-    """Convierte un ObjectId de dirección a su address Bitcoin"""
-    if isinstance(obj_id, str):
-        if len(obj_id) > 26:  # Ya es una dirección Bitcoin
-            return obj_id
-        obj_id = PyObjectId(obj_id)
-    
-    doc = await direccion_collection.find_one({"_id": obj_id})
-    return doc["direccion"] if doc else str(obj_id)
+class ResolutorDirecciones:
+    """
+    Mapa ObjectId ↔ dirección con alcance de una petición de rastreo.
+    Cada nivel del BFS junta todos sus ObjectId y los resuelve con una
+    sola consulta `$in`; lo ya visto se sirve del mapa local o del LRU
+    del proceso sin tocar Mongo.
+    """
+
+    def __init__(self):
+        self._por_id: Dict[PyObjectId, str] = {}
+        self._por_direccion: Dict[str, PyObjectId] = {}
+        self._n_tx: Dict[str, int] = {}
+
+    def _registrar(self, obj_id, direccion: str, n_tx: Optional[int] = None) -> None:
+        self._por_id[obj_id] = direccion
+        self._por_direccion[direccion] = obj_id
+        if n_tx is not None:
+            self._n_tx[direccion] = int(n_tx)
+        direcciones_por_id.set(obj_id, direccion)
+
+    async def resolver(self, ids: Iterable) -> None:
+        """Precarga las direcciones de `ids` (una consulta para los desconocidos)."""
+        faltantes = set()
+        for obj_id in ids:
+            if isinstance(obj_id, str):
+                if len(obj_id) > 26 or not PyObjectId.is_valid(obj_id):
+                    continue  # Ya es una dirección Bitcoin
+                obj_id = PyObjectId(obj_id)
+            if obj_id in self._por_id:
+                continue
+            cacheada = direcciones_por_id.get(obj_id)
+            if cacheada is not None:
+                self._por_id[obj_id] = cacheada
+                self._por_direccion[cacheada] = obj_id
+            else:
+                faltantes.add(obj_id)
+
+        if faltantes:
+            cursor = direccion_collection.find({"_id": {"$in": list(faltantes)}}, {"direccion": 1, "n_tx": 1})
+            async for doc in cursor:
+                self._registrar(doc["_id"], doc["direccion"], doc.get("n_tx") or 0)
+
+    async def ids_de(self, direcciones: Iterable[str]) -> Dict[str, PyObjectId]:
+        """ObjectId de cada dirección existente en la BD (una consulta para las desconocidas)."""
+        direcciones = list(direcciones)
+        faltantes = [d for d in direcciones if d not in self._por_direccion]
+        if faltantes:
+            cursor = direccion_collection.find({"direccion": {"$in": faltantes}}, {"direccion": 1, "n_tx": 1})
+            async for doc in cursor:
+                self._registrar(doc["_id"], doc["direccion"], doc.get("n_tx") or 0)
+        return {d: self._por_direccion[d] for d in direcciones if d in self._por_direccion}
+
+    async def grados(self, direcciones: Iterable[str]) -> Dict[str, int]:
+        """
+        Grado de cada dirección: su `n_tx` guardado (historial completo según
+        el proveedor) o, si es mayor, su grado en el índice del grafo local.
+        Una consulta para las que todavía no tienen `n_tx` en el mapa.
+        """
+        direcciones = list(direcciones)
+        faltantes = [d for d in direcciones if d not in self._n_tx]
+        if faltantes:
+            cursor = direccion_collection.find({"direccion": {"$in": faltantes}}, {"direccion": 1, "n_tx": 1})
+            async for doc in cursor:
+                self._registrar(doc["_id"], doc["direccion"], doc.get("n_tx") or 0)
+
+        grados = {}
+        for direccion in direcciones:
+            grado = self._n_tx.get(direccion, 0)
+            obj_id = self._por_direccion.get(direccion)
+            if indice_grafo.listo and obj_id is not None:
+                grado = max(grado, len(indice_grafo.recibidas(obj_id)) + len(indice_grafo.enviadas(obj_id)))
+            grados[direccion] = grado
+        return grados
+
+    async def terminales(self, direcciones: Iterable[str], nivel: int) -> Dict[str, dict]:
+        """Direcciones de grado mayor a RASTREO_GRADO_TERMINAL, con el motivo de la poda."""
+        if RASTREO_GRADO_TERMINAL <= 0:
+            return {}
+        return {
+            direccion: _nodo_terminal(direccion, nivel, "servicio", grado)
+            for direccion, grado in (await self.grados(direcciones)).items()
+            if grado > RASTREO_GRADO_TERMINAL
+        }
+
+    def id_de(self, direccion: str) -> Optional[PyObjectId]:
+        """ObjectId ya precargado de `direccion` (None si no se conoce)."""
+        return self._por_direccion.get(direccion)
+
+    def nombre(self, obj_id) -> str:
+        """Dirección ya precargada de `obj_id` (el id como texto si no existe)."""
+        if isinstance(obj_id, str):
+            if len(obj_id) > 26 or not PyObjectId.is_valid(obj_id):
+                return obj_id
+            obj_id = PyObjectId(obj_id)
+        return self._por_id.get(obj_id, str(obj_id))
+
+
+def _nodo_terminal(direccion: str, nivel: int, motivo: str, grado: int, tx_hash: Optional[str] = None) -> dict:
+    """
+    Dónde y por qué el rastreo dejó de expandir:
+    - "servicio": dirección de grado mayor a RASTREO_GRADO_TERMINAL.
+    - "tx_con_muchas_entradas": TX recibida con más de RASTREO_MAX_ENTRADAS_POR_TX inputs.
+    - "limite_txs": la dirección tenía más TX de las que se consultan por nivel.
+    """
+    return {"direccion": direccion, "nivel": nivel, "motivo": motivo, "grado": grado, "hash": tx_hash}
+
+
+def _monto_hacia(tx_doc: dict, obj_id) -> float:
+    """BTC que recibió `obj_id` en la TX (monto_total si la TX no guarda valores por output)."""
+    outputs, valores = tx_doc.get("outputs") or [], tx_doc.get("outputs_valores") or []
+    if valores and len(valores) == len(outputs):
+        return sum(v for o, v in zip(outputs, valores) if o == obj_id)
+    return tx_doc.get("monto_total") or 0
+
+
+def _epoch(fecha: Optional[datetime]) -> float:
+    """Fecha (naive en UTC, como las guarda Mongo) a epoch; sin fecha = pendiente = +inf."""
+    if not isinstance(fecha, datetime):
+        return float("inf")
+    if fecha.tzinfo is None:
+        fecha = fecha.replace(tzinfo=timezone.utc)
+    return fecha.timestamp()
+
+
+def _utc(fecha: datetime) -> datetime:
+    return fecha.replace(tzinfo=timezone.utc) if fecha.tzinfo is None else fecha
+
+
+def _filtro_por_direccion(
+    campo: str,
+    ids: Dict[str, PyObjectId],
+    cotas: Dict[str, datetime],
+    operador: str,
+    fecha_minima: Optional[datetime] = None,
+) -> dict:
+    """
+    `$match` de las TX con cada dirección de `ids` en `campo`, acotadas por
+    su cota temporal (`cotas[direccion]` con `operador` "$lte" o "$gte") y,
+    para todas, por `fecha_minima`. Las direcciones sin cota comparten un
+    solo `$in`; cada cota es un rango sobre el índice {campo, fecha}.
+    """
+    condiciones = []
+    libres = [obj_id for direccion, obj_id in ids.items() if direccion not in cotas]
+    if libres:
+        condicion = {campo: {"$in": libres}}
+        if fecha_minima:
+            condicion["fecha"] = {"$gte": fecha_minima}
+        condiciones.append(condicion)
+    for direccion, obj_id in ids.items():
+        if direccion not in cotas:
+            continue
+        rango = {operador: cotas[direccion]}
+        if fecha_minima:
+            rango["$gte"] = max(_utc(rango.get("$gte", fecha_minima)), _utc(fecha_minima))
+        condiciones.append({campo: obj_id, "fecha": rango})
+    return condiciones[0] if len(condiciones) == 1 else {"$or": condiciones}
+
+
+def _mas_cercanas(candidatas: Iterable[int], limite: int, recientes: bool) -> List[int]:
+    """
+    Las `limite` TX del índice más cercanas al salto: las más recientes
+    (origen) o las más tempranas (destino). Sin fecha ordenan como en Mongo
+    (antes que cualquier fecha). `limite` 0 = todas.
+    """
+    def clave(t: int) -> float:
+        fecha = indice_grafo.tx_fecha[t]
+        return -math.inf if math.isnan(fecha) else fecha
+
+    if limite <= 0:
+        return sorted(candidatas, key=clave, reverse=recientes)
+    elegir = heapq.nlargest if recientes else heapq.nsmallest
+    return elegir(limite, candidatas, key=clave)
+
+
+def _primeras_por_fecha(limite: int, sentido: int) -> dict:
+    """Acumulador de $group con las `limite` TX del grupo ordenadas por fecha (0 = todas)."""
+    if limite <= 0:
+        return {"$push": "$$ROOT"}
+    return {"$topN": {"n": limite, "sortBy": {"fecha": sentido, "_id": sentido}, "output": "$$ROOT"}}
+
+
+async def _txs_recibidas_por_direccion(
+    ids: Dict[str, PyObjectId],
+    limite: int = RASTREO_TXS_POR_DIRECCION,
+    hasta: Optional[Dict[str, datetime]] = None,
+) -> Dict[str, List[dict]]:
+    """
+    Transacciones donde cada dirección de `ids` aparece en OUTPUTS (recibió
+    fondos), hasta `limite` por dirección (las más recientes), con una sola
+    agregación para todo el nivel en lugar de un `find` por dirección (o
+    desde el índice del grafo en memoria si está cargado).
+
+    `hasta[direccion]` descarta las TX posteriores a esa fecha: los fondos
+    que la dirección gastó en el salto siguiente no pueden venir de ellas.
+    """
+    if not ids:
+        return {}
+    hasta = hasta or {}
+    if indice_grafo.listo:
+        resultado = {}
+        for direccion, obj_id in ids.items():
+            cota = _epoch(hasta[direccion]) if direccion in hasta else None
+            candidatas = (
+                t for t in indice_grafo.recibidas(obj_id)
+                if cota is None or indice_grafo.tx_fecha[t] <= cota
+            )
+            resultado[direccion] = [indice_grafo.doc(t) for t in _mas_cercanas(candidatas, limite, True)]
+        return resultado
+
+    por_id = {obj_id: direccion for direccion, obj_id in ids.items()}
+    # $topN conserva solo `limite` TX por grupo (las más recientes antes de
+    # la cota), así el grupo de una dirección muy activa no crece sin tope.
+    # $setUnion deja cada dirección una sola vez por TX (como el índice):
+    # varios outputs a la misma dirección no cuentan como varias TX.
+    pipeline = [
+        {"$match": _filtro_por_direccion("outputs", ids, hasta, "$lte")},
+        {"$addFields": {"_receptor": {"$setUnion": ["$outputs", []]}}},
+        {"$unwind": "$_receptor"},
+        {"$match": _filtro_por_direccion("_receptor", ids, hasta, "$lte")},
+        {"$group": {"_id": "$_receptor", "txs": _primeras_por_fecha(limite, -1)}},
+    ]
+    resultado = {}
+    async for grupo in transaccion_collection.aggregate(pipeline, allowDiskUse=True):
+        txs = grupo["txs"]
+        for tx_doc in txs:
+            tx_doc.pop("_receptor", None)
+        resultado[por_id[grupo["_id"]]] = txs
+    return resultado
+
+
+async def _txs_enviadas_por_direccion(
+    ids: Dict[str, PyObjectId],
+    fecha_limite: Optional[datetime] = None,
+    limite: int = RASTREO_TXS_ENVIADAS_POR_DIRECCION,
+    desde: Optional[Dict[str, datetime]] = None,
+) -> Dict[str, List[dict]]:
+    """
+    Transacciones donde cada dirección de `ids` aparece en INPUTS (envió
+    fondos) desde `fecha_limite`, hasta `limite` por dirección (las más
+    tempranas), con una sola agregación (o desde el índice del grafo en
+    memoria si está cargado).
+
+    `desde[direccion]` descarta además las TX anteriores a esa fecha (la
+    dirección no pudo reenviar fondos antes de recibirlos).
+    """
+    if not ids:
+        return {}
+    desde = desde or {}
+    if indice_grafo.listo:
+        resultado = {}
+        for direccion, obj_id in ids.items():
+            cotas = [_epoch(f) for f in (fecha_limite, desde.get(direccion)) if f]
+            cota = max(cotas) if cotas else None
+            candidatas = (
+                t for t in indice_grafo.enviadas(obj_id)
+                if cota is None or indice_grafo.tx_fecha[t] >= cota
+            )
+            resultado[direccion] = [indice_grafo.doc(t) for t in _mas_cercanas(candidatas, limite, False)]
+        return resultado
+
+    por_id = {obj_id: direccion for direccion, obj_id in ids.items()}
+    # Una dirección que gasta varios UTXO en la misma TX la cuenta una vez
+    pipeline = [
+        {"$match": _filtro_por_direccion("inputs", ids, desde, "$gte", fecha_limite)},
+        {"$addFields": {"_emisor": {"$setUnion": ["$inputs", []]}}},
+        {"$unwind": "$_emisor"},
+        {"$match": _filtro_por_direccion("_emisor", ids, desde, "$gte", fecha_limite)},
+        {"$group": {"_id": "$_emisor", "txs": _primeras_por_fecha(limite, 1)}},
+    ]
+    resultado = {}
+    async for grupo in transaccion_collection.aggregate(pipeline, allowDiskUse=True):
+        txs = grupo["txs"]
+        for tx_doc in txs:
+            tx_doc.pop("_emisor", None)
+        resultado[por_id[grupo["_id"]]] = txs
+    return resultado
+
+
+async def _refrescar_frontera(direcciones: List[str], presupuesto: int) -> None:
+    """Trae de forma concurrente las TX nuevas de hasta `presupuesto` direcciones."""
+    seleccion = direcciones[:presupuesto] if presupuesto > 0 else direcciones
+    if not seleccion:
+        return
+    print(f"   🌐 Refrescando {len(seleccion)}/{len(direcciones)} direcciones de la frontera")
+    _, errores = await gather_acotado(
+        seleccion,
+        fetch_and_save_transactions_by_address,
+        asyncio.Semaphore(RASTREO_CONCURRENCIA),
+    )
+    for direccion, error in errores.items():
+        # No fallar todo el proceso por un error
+        print(f"⚠️ Error al consultar {direccion[:8]}...: {error}")
+
+
+# ================================================================
+# 🔹 CACHE DE RASTREOS
+# ================================================================
+def _clave_rastreo(
+    direccion_inicial: str,
+    tipo: str,
+    profundidad: int,
+    dias: Optional[str] = None,
+    parametros: Optional[dict] = None,
+) -> dict:
+    """
+    Campos que identifican un rastreo: dos consultas con la misma clave dan
+    el mismo resultado. `parametros` lleva los de la consulta; se suman los
+    límites de poda del proceso para no reutilizar un rastreo guardado con
+    otra configuración.
+    """
+    return {
+        "direccion_inicial": direccion_inicial,
+        "tipo": tipo,
+        "profundidad": profundidad,
+        "dias": dias,
+        "parametros": {
+            **(parametros or {}),
+            "grado_terminal": RASTREO_GRADO_TERMINAL,
+            "max_entradas_por_tx": RASTREO_MAX_ENTRADAS_POR_TX,
+            "orden_temporal": RASTREO_ORDEN_TEMPORAL,
+        },
+    }
+
+
+async def _buscar_rastreo_cacheado(clave: dict) -> Optional[dict]:
+    """Último rastreo vigente guardado con `clave` dentro del TTL."""
+    if RASTREO_CACHE_TTL_SEGUNDOS <= 0:
+        return None
+    desde = datetime.now(timezone.utc) - timedelta(seconds=RASTREO_CACHE_TTL_SEGUNDOS)
+    existente = await rastreo_collection.find_one(
+        {**clave, "vigente": True, "fecha_analisis": {"$gte": desde}},
+        {"nodos": 0},
+        sort=[("fecha_analisis", -1)],
+    )
+    if not existente:
+        return None
+    existente["id"] = str(existente.get("_id", ""))
+    existente.pop("_id", None)
+    for r in existente.get("resultado", []):
+        if isinstance(r.get("fecha"), datetime):
+            r["fecha"] = r["fecha"].isoformat()
+    if isinstance(existente.get("fecha_analisis"), datetime):
+        existente["fecha_analisis"] = existente["fecha_analisis"].isoformat()
+    return existente
+
+
+async def _guardar_rastreo(rastreo: RastreoModel, nodos: Iterable[PyObjectId]) -> None:
+    """
+    Persiste el rastreo junto con `nodos`: los ObjectId de las direcciones
+    cuyas TX se consultaron, que es lo que compara `invalidar_rastreos`.
+    """
+    doc = rastreo.model_dump(by_alias=True, exclude={"id"})
+    doc["nodos"] = list(nodos)
+    insert_result = await rastreo_collection.insert_one(doc)
+    rastreo.id = str(insert_result.inserted_id)
+
+
+async def _resultado_final(eventos: AsyncIterator[Tuple[str, dict]]) -> dict:
+    """Consume los eventos de un rastreo y devuelve el rastreo final."""
+    final = None
+    async for evento, datos in eventos:
+        if evento == "fin":
+            final = datos
+    return final
 
 
 # ================================================================
 # 🔹 RASTREO DE ORIGEN — Hacia atrás en la cadena (CORREGIDO)
 # ================================================================
-async def rastrear_origen(direccion_inicial: str, profundidad: int = 3):
+async def rastrear_origen(
+    direccion_inicial: str,
+    profundidad: int = 3,
+    presupuesto_por_nivel: Optional[int] = None,
+):
+    """Rastreo de origen completo (ver `stream_rastreo_origen`)."""
+    return await _resultado_final(
+        stream_rastreo_origen(direccion_inicial, profundidad, presupuesto_por_nivel)
+    )
+
+
+async def stream_rastreo_origen(
+    direccion_inicial: str,
+    profundidad: int = 3,
+    presupuesto_por_nivel: Optional[int] = None,
+) -> AsyncIterator[Tuple[str, dict]]:
     """
     Rastrear únicamente el origen de fondos que llegan a la dirección_inicial.
     Solo sigue transacciones donde la dirección aparece en OUTPUTS (recibiendo fondos).
+
+    El BFS avanza por niveles completos: todas las direcciones de un nivel se
+    consultan en Mongo con una sola agregación y la frontera siguiente se
+    refresca contra el proveedor de forma concurrente, hasta
+    `presupuesto_por_nivel` direcciones (RASTREO_PRESUPUESTO_POR_NIVEL; 0 = todas).
+
+    Las direcciones de grado alto (servicios) y las TX con demasiados
+    inputs no se expanden; quedan listadas en `nodos_terminales`.
+
+    Genera eventos a medida que avanza: ("conexion", conexión) por cada
+    conexión encontrada, ("terminal", nodo) por cada punto donde se dejó de
+    expandir, ("nivel", resumen) al cerrar cada nivel y ("fin", rastreo)
+    con el rastreo ya guardado.
     """
+    if presupuesto_por_nivel is None:
+        presupuesto_por_nivel = RASTREO_PRESUPUESTO_POR_NIVEL
     print(f"\n🚀 [RASTREO DE ORIGEN] {direccion_inicial} | profundidad={profundidad}")
 
-    # Verificar si ya existe el rastreo guardado
-    existente = await rastreo_collection.find_one({
-        "direccion_inicial": direccion_inicial,
-        "tipo": "origen"
-    })
+    # Verificar si ya existe un rastreo vigente con los mismos parámetros
+    clave = _clave_rastreo(
+        direccion_inicial, "origen", profundidad,
+        parametros={"presupuesto_por_nivel": presupuesto_por_nivel, "txs_por_direccion": RASTREO_TXS_POR_DIRECCION},
+    )
+    existente = await _buscar_rastreo_cacheado(clave)
     if existente:
-        existente["id"] = str(existente.get("_id", ""))
-        existente.pop("_id", None)
-        for r in existente.get("resultado", []):
-            if isinstance(r.get("fecha"), datetime):
-                r["fecha"] = r["fecha"].isoformat()
-        if isinstance(existente.get("fecha_analisis"), datetime):
-            existente["fecha_analisis"] = existente["fecha_analisis"].isoformat()
         print("📂 Rastreo existente → devolviendo desde Mongo")
-        return existente
+        for conexion in existente.get("resultado", []):
+            yield "conexion", conexion
+        yield "fin", existente
+        return
 
     # 🔹 PASO 0: Asegurarse de que la dirección inicial exista en la BD
     print(f"🌐 [Paso 0] Asegurando que la dirección {direccion_inicial[:8]}... exista en la BD.")
@@ -72,61 +497,67 @@ async def rastrear_origen(direccion_inicial: str, profundidad: int = 3):
     resultados = []
     direcciones_procesadas = set()
     direcciones_a_procesar = {direccion_inicial}
+    nodos = set()  # ObjectId de las direcciones cuyas TX se consultaron
+    # Fecha más tardía de una TX por la que cada dirección envió fondos hacia
+    # la inicial: solo lo recibido antes pudo financiar ese envío
+    hasta: Dict[str, datetime] = {}
+    nodos_terminales = []
+    resolutor = ResolutorDirecciones()
 
     for nivel in range(profundidad):
         print(f"🔹 Nivel {nivel + 1} - Procesando {len(direcciones_a_procesar)} direcciones")
-        nuevas_direcciones = set()
+        nuevas_direcciones = {}  # dirección → monto por el que se la descubrió
+        pendientes = [d for d in direcciones_a_procesar if d not in direcciones_procesadas]
 
-        for direccion_actual in direcciones_a_procesar:
-            if direccion_actual in direcciones_procesadas:
-                continue
-
-            # 🔹 PASO 2: Obtener el ObjectId de la dirección actual
-            direccion_doc = await direccion_collection.find_one({"direccion": direccion_actual})
-            if not direccion_doc:
+        # 🔹 PASO 2: ObjectId de todas las direcciones del nivel (una consulta)
+        ids_nivel = await resolutor.ids_de(pendientes)
+        nodos.update(ids_nivel.values())
+        for direccion_actual in pendientes:
+            if direccion_actual not in ids_nivel:
                 print(f"⚠️ Dirección {direccion_actual[:8]}... no encontrada en DB local")
-                direcciones_procesadas.add(direccion_actual)
-                continue
-            
-            direccion_obj_id = direccion_doc["_id"]
-            print(f"   🔍 Buscando transacciones donde {direccion_actual[:8]}... esté en OUTPUTS")
-
-            # 🔹 PASO 3: Buscar transacciones donde esta dirección RECIBIÓ fondos
-            cursor = transaccion_collection.find(
-                # Para rastrear el origen, buscamos transacciones donde la dirección es un output (recibió fondos)
-                {"outputs": direccion_obj_id}
-            ).limit(10)
-            
-            txs_recibidas = await cursor.to_list(length=None)
-            print(f"   📥 {direccion_actual[:8]}... recibió {len(txs_recibidas)} transacciones")
-
-            for tx_doc in txs_recibidas:
+
+        # 🔹 PASO 3: Transacciones donde cada dirección RECIBIÓ fondos (una agregación)
+        txs_por_direccion = await _txs_recibidas_por_direccion(
+            ids_nivel, hasta={d: hasta[d] for d in ids_nivel if d in hasta}
+        )
+        for direccion_actual in ids_nivel:
+            recibidas = len(txs_por_direccion.get(direccion_actual, []))
+            print(f"   📥 {direccion_actual[:8]}... recibió {recibidas} transacciones")
+            if RASTREO_TXS_POR_DIRECCION and recibidas >= RASTREO_TXS_POR_DIRECCION:
+                terminal = _nodo_terminal(direccion_actual, nivel + 1, "limite_txs", recibidas)
+                nodos_terminales.append(terminal)
+                yield "terminal", terminal
+
+        # 🔹 PASO 4: Resolver los inputs de todo el nivel (una consulta); las TX
+        # con demasiados inputs no abren ramas, así que no hace falta resolverlos
+        await resolutor.resolver(
+            obj_id
+            for txs in txs_por_direccion.values()
+            for tx_doc in txs
+            if len(tx_doc.get("inputs") or []) <= RASTREO_MAX_ENTRADAS_POR_TX
+            for obj_id in tx_doc.get("inputs") or []
+        )
+        id_inicial = resolutor.id_de(direccion_inicial)
+
+        for direccion_actual in pendientes:
+            for tx_doc in txs_por_direccion.get(direccion_actual, []):
                 try:
                     tx = TransaccionModel(**tx_doc)
-
-                    # 🔹 PASO 4: Resolver ObjectIds a direcciones Bitcoin reales
-                    input_addresses = []
-                    for input_id in (tx.inputs or [])[:5]:  # Limitar a 5
-                        addr = await _resolve_direccion(input_id)
-                        if addr:
-                            input_addresses.append(addr)
-                    
-                    output_addresses = []
-                    for output_id in (tx.outputs or [])[:5]:
-                        addr = await _resolve_direccion(output_id)
-                        if addr:
-                            output_addresses.append(addr)
+                    inputs = tx.inputs or []
 
                     # Verificar que la dirección actual está en outputs
-                    if direccion_actual not in output_addresses:
+                    if ids_nivel[direccion_actual] not in (tx.outputs or []):
                         print(f"   ⚠️ TX {tx.hash[:8]}... no tiene a {direccion_actual[:8]} en outputs")
                         continue
                     
                     # No rastrear si es una autotransferencia
-                    if direccion_inicial in input_addresses:
+                    if id_inicial in inputs:
                         print(f"   ⏭️ TX {tx.hash[:8]}... es autotransferencia, ignorando")
                         continue
 
+                    masiva = len(inputs) > RASTREO_MAX_ENTRADAS_POR_TX
+                    input_addresses = [] if masiva else [resolutor.nombre(i) for i in inputs]
+
                     # Evitar duplicados
                     existe = any(
                         r["hacia"] == direccion_actual and r["hash"] == tx.hash
@@ -136,28 +567,37 @@ async def rastrear_origen(direccion_inicial: str, profundidad: int = 3):
                         continue
 
                     # 🔹 PASO 5: Guardar resultado con información clara
+                    monto = _monto_hacia(tx_doc, ids_nivel[direccion_actual])
                     resultados.append({
                         "nivel": nivel + 1,
                         "desde": input_addresses[0] if len(input_addresses) == 1 
-                                else f"{len(input_addresses)} direcciones",
+                                else f"{len(inputs)} direcciones",
                         "hacia": direccion_actual,
-                        "monto": tx.monto_total or 0,
+                        "monto": monto,
                         "hash": tx.hash,
                         "estado": tx.estado or "desconocido",
                         "fecha": (tx.fecha or datetime.now(timezone.utc)).isoformat(),
                     })
+                    yield "conexion", resultados[-1]
 
                     print(
-                        f"   ✅ {direccion_actual[:8]}... recibió {tx.monto_total:.8f} BTC "
-                        f"de {len(input_addresses)} dirección(es)"
+                        f"   ✅ {direccion_actual[:8]}... recibió {monto:.8f} BTC "
+                        f"de {len(inputs)} dirección(es)"
                     )
+                    if masiva:
+                        terminal = _nodo_terminal(direccion_actual, nivel + 1, "tx_con_muchas_entradas", len(inputs), tx.hash)
+                        nodos_terminales.append(terminal)
+                        yield "terminal", terminal
 
                     # 🔹 PASO 6: Agregar direcciones de origen para siguiente nivel
                     for input_addr in input_addresses:
                         if (input_addr not in direcciones_procesadas 
                             and input_addr != direccion_inicial
                             and input_addr != direccion_actual):
-                            nuevas_direcciones.add(input_addr)
+                            nuevas_direcciones[input_addr] = nuevas_direcciones.get(input_addr, 0) + monto
+                            if RASTREO_ORDEN_TEMPORAL and isinstance(tx_doc.get("fecha"), datetime):
+                                fecha = _utc(tx_doc["fecha"])
+                                hasta[input_addr] = max(hasta.get(input_addr, fecha), fecha)
 
                 except Exception as e:
                     print(f"⚠️ Error procesando {tx_doc.get('hash', 'sin-hash')}: {e}")
@@ -167,25 +607,32 @@ async def rastrear_origen(direccion_inicial: str, profundidad: int = 3):
 
             direcciones_procesadas.add(direccion_actual)
 
+        # 🔹 Poda por grado: los servicios quedan en el resultado pero no se expanden
+        if nivel + 1 < profundidad:
+            for direccion, terminal in (await resolutor.terminales(nuevas_direcciones, nivel + 1)).items():
+                del nuevas_direcciones[direccion]
+                nodos_terminales.append(terminal)
+                yield "terminal", terminal
+
+        yield "nivel", {
+            "nivel": nivel + 1,
+            "direcciones": len(pendientes),
+            "nuevas_direcciones": len(nuevas_direcciones),
+            "total_conexiones": len(resultados),
+        }
+
         if not nuevas_direcciones:
             print(f"✅ Nivel {nivel + 1}: No hay más orígenes por rastrear")
             break
 
         print(f"🔄 Nivel {nivel + 1}: Encontradas {len(nuevas_direcciones)} nuevas direcciones")
 
-        # 🔹 PASO 7: Consultar nuevas direcciones en BlockCypher (con límite)
-        MAX_DIRECCIONES_POR_NIVEL = 3  # Reducido para evitar rate limits
-        for i, nueva_dir in enumerate(list(nuevas_direcciones)[:MAX_DIRECCIONES_POR_NIVEL]):
-            print(f"   🌐 [{i+1}/{MAX_DIRECCIONES_POR_NIVEL}] consultando {nueva_dir[:8]}...")
-            try:
-                await fetch_and_save_transactions_by_address(nueva_dir)
-                await asyncio.sleep(2)  # Delay para evitar rate limits
-            except Exception as e:
-                print(f"⚠️ Error al consultar {nueva_dir[:8]}...: {e}")
-                # No fallar todo el proceso por un error
-                continue
+        # 🔹 PASO 7: Refrescar la frontera en paralelo (las de mayor monto primero)
+        if nivel + 1 < profundidad:
+            frontera = sorted(nuevas_direcciones, key=nuevas_direcciones.get, reverse=True)
+            await _refrescar_frontera(frontera, presupuesto_por_nivel)
 
-        direcciones_a_procesar = nuevas_direcciones
+        direcciones_a_procesar = set(nuevas_direcciones)
 
     # ===============================================================
     # 📦 Construcción y guardado del modelo Rastreo
@@ -198,13 +645,14 @@ async def rastrear_origen(direccion_inicial: str, profundidad: int = 3):
             resultado=conexiones,
             total_conexiones=len(conexiones),
             fecha_analisis=datetime.now(timezone.utc),
+            direcciones_analizadas=len(direcciones_procesadas),
+            profundidad=profundidad,
+            parametros=clave["parametros"],
+            nodos_terminales=nodos_terminales,
         )
 
         try:
-            insert_result = await rastreo_collection.insert_one(
-                rastreo.model_dump(by_alias=True, exclude={'id'})
-            )
-            rastreo.id = str(insert_result.inserted_id)
+            await _guardar_rastreo(rastreo, nodos)
         except Exception as e:
             import traceback
             print("⚠️ Error al guardar rastreo en Mongo:", e)
@@ -212,7 +660,8 @@ async def rastrear_origen(direccion_inicial: str, profundidad: int = 3):
             raise
 
         print(f"💾 Rastreo ORIGEN guardado ({len(conexiones)} conexiones)")
-        return rastreo.model_dump(mode="json", by_alias=True)
+        yield "fin", rastreo.model_dump(mode="json", by_alias=True)
+        return
 
     # 🔸 Si no hay resultados, devolver modelo vacío válido
     rastreo_vacio = RastreoModel(
@@ -225,33 +674,65 @@ async def rastrear_origen(direccion_inicial: str, profundidad: int = 3):
     )
 
     print(f"⚠️ No se encontraron transacciones que lleguen a {direccion_inicial}")
-    return rastreo_vacio.model_dump(mode="json", by_alias=True)
+    yield "fin", rastreo_vacio.model_dump(mode="json", by_alias=True)
 
 
 # ================================================================
 # 🔹 RASTREO DE DESTINO — Hacia adelante en la cadena (CORREGIDO)
 # ================================================================
-async def rastrear_destino(direccion_inicial: str, dias: str = "7"): # Acepta str para "historico"
+async def rastrear_destino(
+    direccion_inicial: str,
+    dias: str = "7", # Acepta str para "historico"
+    profundidad: int = 1,
+    fanout_por_nivel: Optional[int] = None,
+    max_conexiones: Optional[int] = None,
+):
+    """Rastreo de destino completo (ver `stream_rastreo_destino`)."""
+    return await _resultado_final(
+        stream_rastreo_destino(direccion_inicial, dias, profundidad, fanout_por_nivel, max_conexiones)
+    )
+
+
+async def stream_rastreo_destino(
+    direccion_inicial: str,
+    dias: str = "7", # Acepta str para "historico"
+    profundidad: int = 1,
+    fanout_por_nivel: Optional[int] = None,
+    max_conexiones: Optional[int] = None,
+) -> AsyncIterator[Tuple[str, dict]]:
     """
-    Rastrear hacia dónde se dirigen los fondos desde una dirección origen.
+    Rastrear hacia dónde se dirigen los fondos desde una dirección origen,
+    hasta `profundidad` saltos.
+
+    Igual que el rastreo de origen, el BFS avanza por niveles completos (una
+    agregación por nivel, refrescos concurrentes de la frontera). Para que
+    los nodos de grado alto no lo disparen, cada nivel sigue como máximo
+    `fanout_por_nivel` destinos (los de mayor monto) y el rastreo se corta
+    al llegar a `max_conexiones` conexiones.
+
+    Genera los mismos eventos que `stream_rastreo_origen`.
     """
+    fanout_por_nivel = RASTREO_FANOUT_POR_NIVEL if fanout_por_nivel is None else fanout_por_nivel
+    max_conexiones = RASTREO_MAX_CONEXIONES if max_conexiones is None else max_conexiones
     periodo_str = f"últimos {dias} días" if dias != "historico" else "histórico"
-    print(f"\n🚀 [RASTREO DE DESTINO] {direccion_inicial} | período={periodo_str}")
+    print(f"\n🚀 [RASTREO DE DESTINO] {direccion_inicial} | período={periodo_str} | profundidad={profundidad}")
 
-    existente = await rastreo_collection.find_one({
-        "direccion_inicial": direccion_inicial,
-        "tipo": "destino",
-    })
+    # Verificar si ya existe un rastreo vigente con los mismos parámetros
+    clave = _clave_rastreo(
+        direccion_inicial, "destino", profundidad, dias,
+        {
+            "fanout_por_nivel": fanout_por_nivel,
+            "max_conexiones": max_conexiones,
+            "txs_por_direccion": RASTREO_TXS_ENVIADAS_POR_DIRECCION,
+        },
+    )
+    existente = await _buscar_rastreo_cacheado(clave)
     if existente:
-        existente["id"] = str(existente.get("_id", ""))
-        existente.pop("_id", None)
-        for r in existente.get("resultado", []):
-            if isinstance(r.get("fecha"), datetime):
-                r["fecha"] = r["fecha"].isoformat()
-        if isinstance(existente.get("fecha_analisis"), datetime):
-            existente["fecha_analisis"] = existente["fecha_analisis"].isoformat()
         print("📂 Rastreo DESTINO existente → devolviendo desde Mongo")
-        return existente
+        for conexion in existente.get("resultado", []):
+            yield "conexion", conexion
+        yield "fin", existente
+        return
 
     # 🔹 PASO 0: Asegurarse de que la dirección inicial exista en la BD
     print(f"🌐 [Paso 0] Asegurando que la dirección {direccion_inicial[:8]}... exista en la BD.")
@@ -271,7 +752,7 @@ async def rastrear_destino(direccion_inicial: str, dias: str = "7"): # Acepta st
     direccion_doc = await direccion_collection.find_one({"direccion": direccion_inicial})
     if not direccion_doc:
         print(f"⚠️ Dirección no encontrada: {direccion_inicial}")
-        return {
+        yield "fin", {
             "direccion_inicial": direccion_inicial,
             "tipo": "destino",
             "mensaje": "Dirección no encontrada en la base de datos",
@@ -279,56 +760,123 @@ async def rastrear_destino(direccion_inicial: str, dias: str = "7"): # Acepta st
             "total_conexiones": 0,
             "fecha_analisis": datetime.now(timezone.utc).isoformat(),
         }
+        return
     
     direccion_obj_id = direccion_doc["_id"]
 
-    # Construir el filtro de consulta
-    query_filter = {"inputs": direccion_obj_id}
+    fecha_limite = None
     if dias != "historico": # Si no es histórico, aplicar filtro de fecha
         try:
             dias_int = int(dias)
             fecha_limite = datetime.now(timezone.utc) - timedelta(days=dias_int)
-            query_filter["fecha"] = {"$gte": fecha_limite}
         except ValueError:
             print(f"⚠️ Valor de 'dias' no válido: {dias}. Se procederá sin filtro de fecha.")
     else:
         print("ℹ️ Realizando búsqueda histórica sin límite de fecha.")
 
-    # Buscar transacciones donde la dirección es un input (envió fondos)
-    cursor = transaccion_collection.find(query_filter).limit(50)
-    
-    txs_enviadas = await cursor.to_list(length=None)
-    print(f"📤 {direccion_inicial[:8]}... envió {len(txs_enviadas)} transacciones")
-
     resultados = []
+    vistos = set()  # (hash, destino) ya agregados
+    direcciones_procesadas = {direccion_inicial}
+    frontera = {direccion_inicial: direccion_obj_id}
+    nodos = set()
+    # Fecha más temprana en que cada dirección recibió fondos de la inicial:
+    # antes de eso no pudo reenviarlos
+    desde: Dict[str, datetime] = {}
+    nodos_terminales = []
+    resolutor = ResolutorDirecciones()
 
-    for tx_doc in txs_enviadas:
-        try:
-            tx = TransaccionModel(**tx_doc)
-            
-            # Resolver direcciones de salida (outputs)
-            for output_id in (tx.outputs or []):
-                output_addr = await _resolve_direccion(output_id)
-                
-                # El destino no puede ser la misma dirección de origen
-                if output_addr and output_addr != direccion_inicial:
-                    # Evitar duplicados en los resultados
-                    if not any(r["hash"] == tx.hash and r["hacia"] == output_addr for r in resultados):
+    for nivel in range(profundidad):
+        # Buscar transacciones donde las direcciones del nivel son input (enviaron fondos)
+        nodos.update(frontera.values())
+        txs_por_direccion = await _txs_enviadas_por_direccion(
+            frontera, fecha_limite, desde={d: desde[d] for d in frontera if d in desde}
+        )
+        print(f"🔹 Nivel {nivel + 1} - {len(frontera)} direcciones enviaron "
+              f"{sum(len(t) for t in txs_por_direccion.values())} transacciones")
+        for origen, txs in txs_por_direccion.items():
+            if len(txs) >= RASTREO_TXS_ENVIADAS_POR_DIRECCION:
+                terminal = _nodo_terminal(origen, nivel + 1, "limite_txs", len(txs))
+                nodos_terminales.append(terminal)
+                yield "terminal", terminal
+
+        # Resolver las direcciones de salida de todas las transacciones del nivel (una consulta)
+        await resolutor.resolver(
+            o for txs in txs_por_direccion.values() for tx_doc in txs for o in (tx_doc.get("outputs") or [])
+        )
+
+        siguientes = {}  # destino → monto recibido en este nivel
+        for origen in frontera:
+            for tx_doc in txs_por_direccion.get(origen, []):
+                if len(resultados) >= max_conexiones:
+                    break
+                try:
+                    tx = TransaccionModel(**tx_doc)
+
+                    # Resolver direcciones de salida (outputs)
+                    for output_id in (tx.outputs or []):
+                        output_addr = resolutor.nombre(output_id)
+
+                        # El destino no puede ser la dirección que envía ni la de origen
+                        if not output_addr or output_addr in (origen, direccion_inicial):
+                            continue
+                        # Evitar duplicados en los resultados
+                        if (tx.hash, output_addr) in vistos:
+                            continue
+                        if len(resultados) >= max_conexiones:
+                            break
+                        vistos.add((tx.hash, output_addr))
+                        monto = _monto_hacia(tx_doc, output_id)
                         resultados.append({
-                            "nivel": 1,
-                            "desde": direccion_inicial,
+                            "nivel": nivel + 1,
+                            "desde": origen,
                             "hacia": output_addr,
-                            "monto": tx.monto_total or 0, # Idealmente, aquí iría el monto específico del output
+                            "monto": monto,
                             "hash": tx.hash,
                             "estado": tx.estado or "desconocido",
                             "fecha": (tx.fecha or datetime.now(timezone.utc)).isoformat(),
                         })
-                        print(f"   ✅ {direccion_inicial[:8]}... envió fondos a {output_addr[:8]}... (TX: {tx.hash[:8]})")
+                        yield "conexion", resultados[-1]
+                        print(f"   ✅ {origen[:8]}... envió fondos a {output_addr[:8]}... (TX: {tx.hash[:8]})")
 
+                        if output_addr not in direcciones_procesadas:
+                            siguientes[output_addr] = siguientes.get(output_addr, 0) + monto
+                            if RASTREO_ORDEN_TEMPORAL and isinstance(tx_doc.get("fecha"), datetime):
+                                fecha = _utc(tx_doc["fecha"])
+                                desde[output_addr] = min(desde.get(output_addr, fecha), fecha)
 
-        except Exception as e:
-            print(f"⚠️ Error procesando {tx_doc.get('hash', 'sin-hash')}: {e}")
-            continue
+                except Exception as e:
+                    print(f"⚠️ Error procesando {tx_doc.get('hash', 'sin-hash')}: {e}")
+                    continue
+
+        yield "nivel", {
+            "nivel": nivel + 1,
+            "direcciones": len(frontera),
+            "nuevas_direcciones": len(siguientes),
+            "total_conexiones": len(resultados),
+        }
+
+        if len(resultados) >= max_conexiones:
+            print(f"⛔ Tope de {max_conexiones} conexiones alcanzado en el nivel {nivel + 1}")
+            break
+        if not siguientes or nivel + 1 >= profundidad:
+            break
+
+        # Los servicios quedan en el resultado pero no se expanden
+        for direccion, terminal in (await resolutor.terminales(siguientes, nivel + 1)).items():
+            del siguientes[direccion]
+            nodos_terminales.append(terminal)
+            yield "terminal", terminal
+
+        # Seguir solo los destinos de mayor monto y refrescarlos en paralelo
+        elegidas = sorted(siguientes, key=siguientes.get, reverse=True)
+        if fanout_por_nivel > 0:
+            elegidas = elegidas[:fanout_por_nivel]
+        print(f"🔄 Nivel {nivel + 1}: siguiendo {len(elegidas)}/{len(siguientes)} destinos")
+        await _refrescar_frontera(elegidas, RASTREO_PRESUPUESTO_POR_NIVEL)
+        direcciones_procesadas.update(elegidas)
+        frontera = await resolutor.ids_de(elegidas)
+        if not frontera:
+            break
 
     if resultados:
         conexiones = [Conexion(**r) for r in resultados]
@@ -338,15 +886,17 @@ async def rastrear_destino(direccion_inicial: str, dias: str = "7"): # Acepta st
             resultado=conexiones,
             total_conexiones=len(conexiones),
             fecha_analisis=datetime.now(timezone.utc),
+            direcciones_analizadas=len(direcciones_procesadas),
+            profundidad=profundidad,
+            dias=dias,
+            parametros=clave["parametros"],
+            nodos_terminales=nodos_terminales,
         )
         # Guardar el rastreo en la base de datos
-        insert_result = await rastreo_collection.insert_one(
-            rastreo.model_dump(by_alias=True, exclude={'id'})
-        )
-        rastreo.id = str(insert_result.inserted_id)
+        await _guardar_rastreo(rastreo, nodos)
 
         print(f"💾 Rastreo DESTINO guardado ({len(conexiones)} conexiones)")
-        return rastreo.model_dump(mode="json", by_alias=True)
+        yield "fin", rastreo.model_dump(mode="json", by_alias=True)
     else:
         print(f"⚠️ No se encontraron transacciones salientes")
         rastreo_vacio = RastreoModel(
@@ -358,14 +908,191 @@ async def rastrear_destino(direccion_inicial: str, dias: str = "7"): # Acepta st
             total_conexiones=0,
             fecha_analisis=datetime.now(timezone.utc),
         )
-        return rastreo_vacio.model_dump(mode="json", by_alias=True, exclude_none=True)
+        yield "fin", rastreo_vacio.model_dump(mode="json", by_alias=True, exclude_none=True)
+
+
+# ================================================================
+# 🔹 CAMINO ENTRE DOS DIRECCIONES — BFS bidireccional
+# ================================================================
+class _LadoBusqueda:
+    """
+    Estado de un lado de la búsqueda bidireccional. `adelante` sigue TX
+    donde la dirección envía (desde el origen); el otro lado sigue TX donde
+    recibe (desde el destino). `padre[d] = (vecino, tx_doc)` apunta un paso
+    más cerca del extremo de este lado y `tiempo[d]` es la fecha de esa TX
+    (llegada más temprana hacia adelante, salida más tardía hacia atrás).
+    """
+
+    def __init__(self, direccion: str, obj_id, adelante: bool):
+        self.adelante = adelante
+        self.padre: Dict[str, Tuple[Optional[str], Optional[dict]]] = {direccion: (None, None)}
+        self.tiempo: Dict[str, float] = {direccion: float("-inf") if adelante else float("inf")}
+        self.cuello: Dict[str, float] = {direccion: float("inf")}  # menor monto del tramo
+        self.frontera: Dict[str, PyObjectId] = {direccion: obj_id}
+        self.saltos = 0
+
+    async def expandir(self, resolutor: ResolutorDirecciones, criterio: str) -> List[str]:
+        """Avanza un nivel completo (una agregación) y devuelve las direcciones nuevas."""
+        cotas = {}
+        if criterio == "tiempo":
+            cotas = {
+                d: datetime.fromtimestamp(self.tiempo[d], timezone.utc)
+                for d in self.frontera if math.isfinite(self.tiempo[d])
+            }
+        if self.adelante:
+            txs_por_direccion = await _txs_enviadas_por_direccion(self.frontera, desde=cotas)
+            campo = "outputs"
+        else:
+            txs_por_direccion = await _txs_recibidas_por_direccion(
+                self.frontera, RASTREO_TXS_ENVIADAS_POR_DIRECCION, hasta=cotas
+            )
+            campo = "inputs"
+        await resolutor.resolver(
+            obj_id for txs in txs_por_direccion.values() for tx_doc in txs for obj_id in (tx_doc.get(campo) or [])
+        )
+
+        nuevas: Dict[str, PyObjectId] = {}
+        for actual, txs in txs_por_direccion.items():
+            for tx_doc in txs:
+                fecha = _epoch(tx_doc.get("fecha"))
+                # Orden temporal: hacia adelante solo TX posteriores a la llegada, hacia atrás anteriores a la salida
+                if criterio == "tiempo" and (fecha < self.tiempo[actual] if self.adelante else fecha > self.tiempo[actual]):
+                    continue
+                for obj_id in tx_doc.get(campo) or []:
+                    vecino = resolutor.nombre(obj_id)
+                    if vecino == actual or (vecino in self.padre and vecino not in nuevas):
+                        continue
+                    monto = _monto_hacia(tx_doc, obj_id if self.adelante else self.frontera[actual])
+                    cuello = min(self.cuello[actual], monto)
+                    if vecino in nuevas and not _mejor_tramo(
+                        criterio, self.adelante, fecha, cuello, self.tiempo[vecino], self.cuello[vecino]
+                    ):
+                        continue
+                    self.padre[vecino] = (actual, tx_doc)
+                    self.tiempo[vecino] = fecha
+                    self.cuello[vecino] = cuello
+                    nuevas[vecino] = obj_id
+
+        self.frontera = nuevas
+        self.saltos += 1
+        return list(nuevas)
+
+    def tramo(self, direccion: str) -> List[Tuple[str, str, dict]]:
+        """Aristas (desde, hacia, tx_doc) entre el extremo de este lado y `direccion`, en sentido de los fondos."""
+        aristas = []
+        actual = direccion
+        while self.padre[actual][0] is not None:
+            vecino, tx_doc = self.padre[actual]
+            aristas.append((vecino, actual, tx_doc) if self.adelante else (actual, vecino, tx_doc))
+            actual = vecino
+        return aristas[::-1] if self.adelante else aristas
+
+
+def _mejor_tramo(criterio: str, adelante: bool, fecha: float, cuello: float, fecha_previa: float, cuello_previo: float) -> bool:
+    """True si el nuevo tramo hacia una dirección ya alcanzada en este nivel es preferible."""
+    if criterio == "monto":
+        return cuello > cuello_previo
+    if criterio == "tiempo":
+        return fecha < fecha_previa if adelante else fecha > fecha_previa
+    return False
+
+
+async def buscar_camino(
+    origen: str,
+    destino: str,
+    max_saltos: int = 6,
+    criterio: str = "saltos",
+    max_direcciones: Optional[int] = None,
+) -> dict:
+    """
+    Camino de fondos más corto de `origen` a `destino` sobre las TX ya
+    guardadas, con un BFS bidireccional: se expande por niveles completos
+    el lado con la frontera más chica hasta que ambos se encuentran, así
+    que se visita una fracción de lo que recorrería un rastreo completo.
+
+    Entre los caminos de la misma longitud, `criterio` decide:
+    - "saltos": el primero que se encuentra.
+    - "monto": el de mayor cuello de botella (monto mínimo entre sus aristas).
+    - "tiempo": solo caminos con fechas no decrecientes y, entre ellos, el
+      de llegada más temprana.
+    """
+    max_direcciones = max_direcciones or CAMINO_MAX_DIRECCIONES
+    print(f"\n🧭 [CAMINO] {origen[:8]}... → {destino[:8]}... | criterio={criterio} | max_saltos={max_saltos}")
+
+    resolutor = ResolutorDirecciones()
+    ids = await resolutor.ids_de([origen, destino])
+    respuesta = {
+        "origen": origen,
+        "destino": destino,
+        "criterio": criterio,
+        "encontrado": False,
+        "saltos": 0,
+        "camino": [],
+        "direcciones_exploradas": 0,
+        "fecha_analisis": datetime.now(timezone.utc).isoformat(),
+    }
+    if origen not in ids or destino not in ids:
+        respuesta["mensaje"] = "Dirección no encontrada en la base de datos"
+        return respuesta
+    if origen == destino:
+        respuesta["encontrado"] = True
+        return respuesta
+
+    adelante = _LadoBusqueda(origen, ids[origen], adelante=True)
+    atras = _LadoBusqueda(destino, ids[destino], adelante=False)
+    encuentro = None
+
+    while adelante.saltos + atras.saltos < max_saltos and adelante.frontera and atras.frontera:
+        lado, otro = (adelante, atras) if len(adelante.frontera) <= len(atras.frontera) else (atras, adelante)
+        nuevas = await lado.expandir(resolutor, criterio)
+        print(f"   🔹 {'→' if lado.adelante else '←'} nivel {lado.saltos}: {len(nuevas)} direcciones nuevas")
+
+        candidatos = [
+            d for d in nuevas
+            if d in otro.padre and (criterio != "tiempo" or adelante.tiempo[d] <= atras.tiempo[d])
+        ]
+        if candidatos:
+            if criterio == "monto":
+                encuentro = max(candidatos, key=lambda d: min(adelante.cuello[d], atras.cuello[d]))
+            elif criterio == "tiempo":
+                encuentro = min(candidatos, key=lambda d: adelante.tiempo[d])
+            else:
+                encuentro = candidatos[0]
+            break
+        if len(adelante.padre) + len(atras.padre) > max_direcciones:
+            print(f"⛔ Tope de {max_direcciones} direcciones exploradas")
+            break
+
+    respuesta["direcciones_exploradas"] = len(adelante.padre) + len(atras.padre)
+    if encuentro is None:
+        print(f"⚠️ Sin camino en {max_saltos} saltos ({respuesta['direcciones_exploradas']} direcciones exploradas)")
+        return respuesta
+
+    aristas = adelante.tramo(encuentro) + atras.tramo(encuentro)
+    respuesta["encontrado"] = True
+    respuesta["saltos"] = len(aristas)
+    for nivel, (desde, hacia, tx_doc) in enumerate(aristas, start=1):
+        respuesta["camino"].append({
+            "nivel": nivel,
+            "desde": desde,
+            "hacia": hacia,
+            "monto": _monto_hacia(tx_doc, resolutor.id_de(hacia)),
+            "hash": tx_doc.get("hash"),
+            "estado": tx_doc.get("estado") or "desconocido",
+            "fecha": tx_doc["fecha"].isoformat() if isinstance(tx_doc.get("fecha"), datetime) else None,
+        })
+    print(f"✅ Camino de {len(aristas)} saltos vía {encuentro[:8]}... ({respuesta['direcciones_exploradas']} direcciones exploradas)")
+    return respuesta
 
 
 # ================================================================
 # 🔹 LISTAR RASTREOS
 # ================================================================
-async def listar_rastreos():
-    docs = await rastreo_collection.find().sort("fecha_analisis", -1).to_list(100)
+async def listar_rastreos(limite: Optional[int] = None, cursor: Optional[str] = None):
+    docs, siguiente = await paginar(
+        rastreo_collection, orden="fecha_analisis", limite=limite, cursor=cursor,
+        proyeccion={"nodos": 0},
+    )
     for d in docs:
         d["_id"] = str(d["_id"])
         if "resultado" in d:
@@ -374,4 +1101,4 @@ async def listar_rastreos():
                     r["fecha"] = r["fecha"].isoformat()
         if isinstance(d.get("fecha_analisis"), datetime):
             d["fecha_analisis"] = d["fecha_analisis"].isoformat()
-    return docs
\ No newline at end of file
+    return docs, siguiente
\ No newline at end of file
@@ -3,6 +3,7 @@ import base64
 from typing import List
 from app.database import reporte_collection, transaccion_collection
 from app.models.reporte import Reporte
+from app.http_client import get_http_client
 from datetime import datetime
 import os
 from reportlab.lib.pagesizes import A4
@@ -50,19 +51,19 @@ async def fetch_reportes_by_address(address: str) -> List[Reporte]:
 
     url = f"https://api.chainabuse.com/v0/reports?address={address}&includePrivate=false&page=1&perPage=50"
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, headers=headers)
-            if response.status_code == 404:
-                return []
-            if response.status_code == 429:
-                raise Exception("Has superado el límite de consultas a ChainAbuse. Intenta más tarde.")
-            response.raise_for_status()
-            data = response.json()
-        except httpx.HTTPStatusError as e:
-            raise Exception(f"API request failed with status {e.response.status_code}: {e.response.text}") from e
-        except httpx.RequestError as e:
-            raise Exception(f"API request failed: {e}") from e
+    client = get_http_client()
+    try:
+        response = await client.get(url, headers=headers)
+        if response.status_code == 404:
+            return []
+        if response.status_code == 429:
+            raise Exception("Has superado el límite de consultas a ChainAbuse. Intenta más tarde.")
+        response.raise_for_status()
+        data = response.json()
+    except httpx.HTTPStatusError as e:
+        raise Exception(f"API request failed with status {e.response.status_code}: {e.response.text}") from e
+    except httpx.RequestError as e:
+        raise Exception(f"API request failed: {e}") from e
 
     if "reports" not in data:
         return []
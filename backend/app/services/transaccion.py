@@ -1,49 +1,63 @@
-from typing import List, Optional
-import httpx
-import json
-from datetime import datetime
-from app.database import transaccion_collection, PyObjectId
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+from datetime import datetime, timezone
+from app.database import transaccion_collection, direccion_collection, rastreo_collection, PyObjectId
 from app.models.transaccion import TransaccionModel
-from app.schemas.transaccion import TransaccionCreateSchema
-from app.services.direccion import fetch_and_save_direccion
-from app.services.bloque import fetch_and_save_bloque
+from app.schemas.transaccion import TransaccionCreateSchema, TransaccionResponseSchema
+from app.services.direccion import resolver_direcciones
+from app.services.bloque import resolver_bloques
+from bson import ObjectId
+from pymongo import UpdateOne
+from app.providers.registro import get_proveedor
+from app.singleflight import singleflight_upstream
+from app.graph_index import indice_grafo
+from app.paginacion import paginar, proyeccion_de
 import asyncio
-import random
+import os
 
+# Consultas simultáneas al resolver direcciones/bloques de una página
+INGESTA_CONCURRENCIA = int(os.getenv("INGESTA_CONCURRENCIA", "8"))
 
-# ================================================================
-# 🔹 CONFIGURACIÓN DE BLOCKCYPHER
-# ================================================================
-BLOCKCYPHER_API = "https://api.blockcypher.com/v1/btc/main"
-
-# 🔥 SOLUCIÓN: Rotación de tokens para evitar límites
-BLOCKCYPHER_TOKENS = [
-    "d210a6ac92274d61b1f15e2c3652bf57",
-    "0da27d786bd94dbb89c7ca6d0274fc03",
-]
-
-def get_random_token():
-    """Rotar entre múltiples tokens"""
-    return random.choice(BLOCKCYPHER_TOKENS)
+# Paginación del historial de una dirección (BlockCypher admite hasta 50 TX por página)
+TX_POR_PAGINA = min(int(os.getenv("TX_POR_PAGINA", "50")), 50)
+# Presupuesto por defecto de TX por consulta (0 = historial completo)
+TX_MAX_POR_DIRECCION = int(os.getenv("TX_MAX_POR_DIRECCION", "50"))
 
 
 # ================================================================
 # 🔹 CRUD BÁSICO
 # ================================================================
-async def get_all_transacciones() -> List[TransaccionModel]:
-    docs = await transaccion_collection.find().to_list(100)
-    return [TransaccionModel(**doc) for doc in docs]
+async def get_all_transacciones(
+    limite: Optional[int] = None, cursor: Optional[str] = None
+) -> Tuple[List[TransaccionModel], Optional[str]]:
+    """Página de transacciones por fecha descendente y cursor de la siguiente."""
+    docs, siguiente = await paginar(
+        transaccion_collection, orden="fecha", limite=limite, cursor=cursor,
+        proyeccion=proyeccion_de(TransaccionResponseSchema),
+    )
+    return [TransaccionModel(**doc) for doc in docs], siguiente
 
 
 async def create_transaccion(data: TransaccionCreateSchema) -> TransaccionModel:
-    inputs_ids = [(await fetch_and_save_direccion(addr)).id for addr in data.inputs]
-    outputs_ids = [(await fetch_and_save_direccion(addr)).id for addr in data.outputs]
+    direcciones = await resolver_direcciones(
+        data.inputs + data.outputs, semaforo=asyncio.Semaphore(INGESTA_CONCURRENCIA)
+    )
+    faltantes = [addr for addr in data.inputs + data.outputs if addr not in direcciones]
+    if faltantes:
+        raise Exception(f"No se pudo obtener datos para las direcciones {', '.join(faltantes)}")
+    if data.inputs_valores is not None and len(data.inputs_valores) != len(data.inputs):
+        raise Exception("inputs_valores debe tener un valor por cada input")
+    if data.outputs_valores is not None and len(data.outputs_valores) != len(data.outputs):
+        raise Exception("outputs_valores debe tener un valor por cada output")
+    inputs_ids = [direcciones[addr].id for addr in data.inputs]
+    outputs_ids = [direcciones[addr].id for addr in data.outputs]
 
     transaccion_doc = {
         "hash": data.hash,
         "fecha": data.fecha,
         "inputs": inputs_ids,
         "outputs": outputs_ids,
+        "inputs_valores": data.inputs_valores or [],
+        "outputs_valores": data.outputs_valores or [],
         "monto_total": data.monto_total,
         "estado": data.estado,
         "patrones_sospechosos": data.patrones_sospechosos,
@@ -51,8 +65,10 @@ async def create_transaccion(data: TransaccionCreateSchema) -> TransaccionModel:
     }
 
     result = await transaccion_collection.insert_one(transaccion_doc)
-    created = await transaccion_collection.find_one({"_id": result.inserted_id})
-    return TransaccionModel(**created)
+    transaccion_doc["_id"] = result.inserted_id
+    indice_grafo.agregar([transaccion_doc])
+    await invalidar_rastreos(inputs_ids + outputs_ids)
+    return TransaccionModel(**transaccion_doc)
 
 
 async def get_transaccion_by_hash(hash_str: str) -> Optional[TransaccionModel]:
@@ -61,214 +77,389 @@ async def get_transaccion_by_hash(hash_str: str) -> Optional[TransaccionModel]:
 
 
 async def update_transaccion(transaccion_id: str, data: dict) -> Optional[TransaccionModel]:
-    await transaccion_collection.update_one(
+    anterior = await transaccion_collection.find_one_and_update(
         {"_id": PyObjectId(transaccion_id)}, {"$set": data}
     )
     updated = await transaccion_collection.find_one({"_id": PyObjectId(transaccion_id)})
+    if updated:
+        indice_grafo.actualizar(updated)
+    await invalidar_rastreos(_direcciones_de([d for d in (anterior, updated) if d]))
     return TransaccionModel(**updated) if updated else None
 
 
 async def delete_transaccion(transaccion_id: str) -> int:
-    result = await transaccion_collection.delete_one({"_id": PyObjectId(transaccion_id)})
-    return result.deleted_count
+    borrada = await transaccion_collection.find_one_and_delete({"_id": PyObjectId(transaccion_id)})
+    if borrada:
+        indice_grafo.eliminar(borrada["_id"])
+        await invalidar_rastreos(_direcciones_de([borrada]))
+    return 1 if borrada else 0
+
+
+# ================================================================
+# 🔹 INVALIDACIÓN DE RASTREOS CACHEADOS
+# ================================================================
+def _direcciones_de(docs: Iterable[dict]) -> List:
+    """ObjectIds de todas las direcciones (inputs y outputs) de los documentos."""
+    return [obj_id for doc in docs for obj_id in (doc.get("inputs") or []) + (doc.get("outputs") or [])]
+
+
+async def invalidar_rastreos(direcciones_ids: Iterable[PyObjectId]) -> int:
+    """Marca como no vigentes los rastreos que pasan por alguna de las direcciones."""
+    ids = list(set(direcciones_ids))
+    if not ids:
+        return 0
+    resultado = await rastreo_collection.update_many(
+        {"vigente": True, "nodos": {"$in": ids}},
+        {"$set": {"vigente": False}},
+    )
+    if resultado.modified_count:
+        print(f"♻️ {resultado.modified_count} rastreo(s) invalidados por TX nuevas")
+    return resultado.modified_count
 
 
 # ================================================================
-# 🔹 DESCARGA DESDE BLOCKCYPHER (CORREGIDA)
+# 🔹 DESCARGA DESDE EL PROVEEDOR DE LA CADENA
 # ================================================================
 async def _fetch_raw_transactions_by_address(address: str, limit: int = 5) -> List[dict]:
+    """Primera página (las `limit` TX más recientes) de `address`."""
+    pagina = await _fetch_pagina_transacciones(address, limit)
+    return pagina["txs"]
+
+
+async def _fetch_pagina_transacciones(
+    address: str,
+    limit: int = TX_POR_PAGINA,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+) -> dict:
+    """
+    Página {"txs": [...], "hasMore": bool} del proveedor de la cadena con TX
+    anteriores a la altura `before` (la más reciente si es None) y, si se
+    indica `after`, solo posteriores a esa altura. Las consultas idénticas
+    en vuelo se coalescen.
+    """
+    return await singleflight_upstream.ejecutar(
+        "transacciones", (address, limit, before, after),
+        get_proveedor().obtener_transacciones, address, limit, before, after,
+    )
+
+
+# ================================================================
+# 🔹 PAGINACIÓN DEL HISTORIAL
+# ================================================================
+async def _leer_progreso(address: str) -> dict:
+    doc = await direccion_collection.find_one({"direccion": address}, {"sync": 1})
+    return (doc or {}).get("sync") or {}
+
+
+async def _guardar_progreso(
+    address: str,
+    before: Optional[int] = None,
+    completo: bool = False,
+    descargadas: int = 0,
+    altura_max: Optional[int] = None,
+    ultimo_hash: Optional[str] = None,
+    hueco: Optional[dict] = None,
+    cerrar_hueco: bool = False,
+) -> None:
+    """
+    Guarda el progreso en el documento de la dirección:
+    - `sync.before`: cursor de la descarga hacia atrás; `$min` conserva el
+      más profundo aunque otra consulta más corta termine después.
+    - `sync.altura_max` / `sync.ultimo_hash`: marca de agua de lo más nuevo
+      ya sincronizado; `$max` impide que retroceda.
+    - `sync.hueco`: sincronización incremental cortada por el presupuesto
+      antes de llegar a la marca (cursor para continuarla y la marca que
+      se adopta al completarla).
+    """
+    update = {
+        "$set": {"sync.actualizado": datetime.now(timezone.utc)},
+        "$inc": {"sync.descargadas": descargadas},
+    }
+    if completo:
+        update["$set"]["sync.completo"] = True
+    if ultimo_hash:
+        update["$set"]["sync.ultimo_hash"] = ultimo_hash
+    if hueco is not None:
+        update["$set"]["sync.hueco"] = hueco
+    elif cerrar_hueco:
+        update["$unset"] = {"sync.hueco": ""}
+    if before is not None:
+        update["$min"] = {"sync.before": before}
+    if altura_max is not None:
+        update["$max"] = {"sync.altura_max": altura_max}
+    await direccion_collection.update_one({"direccion": address}, update)
+
+
+def _altura_maxima(txs: List[dict]) -> Optional[int]:
+    alturas = [tx["block_height"] for tx in txs if tx.get("block_height", -1) > 0]
+    return max(alturas) if alturas else None
+
+
+async def paginar_transacciones(
+    address: str,
+    max_txs: Optional[int] = None,
+    tam_pagina: int = TX_POR_PAGINA,
+    reanudar: bool = False,
+    incremental: bool = False,
+) -> AsyncIterator[List[dict]]:
     """
-    Consulta la API de BlockCypher con protección contra Cloudflare y rate limits.
-    
-    MEJORAS:
-    - Rotación de tokens
-    - Delay aleatorio para evitar patrones
-    - Detección mejorada de Cloudflare
-    - Sin duplicación de except
+    Recorre el historial de `address` de la TX más reciente a la más antigua,
+    entregando páginas crudas de BlockCypher con cursores `before=` por altura
+    de bloque. Se detiene al agotar el historial (`hasMore`) o el presupuesto
+    `max_txs` (0 o negativo = sin límite).
+
+    El progreso se persiste después de procesar cada página, así que con
+    `reanudar=True` una descarga interrumpida continúa desde el último cursor.
+    Con `incremental=True` y una marca de agua previa solo se piden las TX
+    en bloques posteriores a `sync.altura_max` (`after=`). Si el presupuesto
+    corta antes de llegar a la marca, el tramo que falta queda en
+    `sync.hueco` y la siguiente llamada incremental lo completa; la marca
+    avanza recién entonces.
     """
-    
-    MAX_INTENTOS = 3
-    BASE_DELAY = 5  # segundos
-    
-    for intento in range(MAX_INTENTOS):
-        try:
-            # 🔄 Usar token rotativo
-            token = get_random_token()
-            url = f"{BLOCKCYPHER_API}/addrs/{address}/full?limit={limit}&token={token}"
-            
-            # Headers más realistas (SIN Accept-Encoding para evitar problemas GZIP)
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-                "Accept": "application/json",
-                "Accept-Language": "en-US,en;q=0.9",
-                "Connection": "keep-alive",
-            }
-            
-            # ⏱️ Delay aleatorio (2-5 segundos) para evitar detección de bot
-            delay = random.uniform(2, 5)
-            await asyncio.sleep(delay)
-            
-            print(f"🌐 [Intento {intento + 1}/{MAX_INTENTOS}] Consultando {address[:8]}... con token {token[-8:]}")
-            
-            # httpx descomprime automáticamente si no especificamos Accept-Encoding
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.get(url, headers=headers)
-                
-                # 🚨 DETECCIÓN MEJORADA DE CLOUDFLARE
-                content_type = response.headers.get("Content-Type", "")
-                response_text = response.text[:500]  # Primeros 500 caracteres
-                
-                # Verificar si es HTML de Cloudflare
-                if any(indicator in response_text for indicator in [
-                    "Just a moment",
-                    "Cloudflare",
-                    "challenge-platform",
-                    "cf-chl-opt"
-                ]):
-                    print(f"🔒 Cloudflare detectado. Esperando {BASE_DELAY * (intento + 1)}s...")
-                    await asyncio.sleep(BASE_DELAY * (intento + 1))
-                    continue
-                
-                # Verificar que sea JSON válido
-                if "application/json" not in content_type:
-                    print(f"⚠️ Respuesta no es JSON: {content_type}")
-                    await asyncio.sleep(BASE_DELAY * (intento + 1))
-                    continue
-                
-                # Intentar parsear JSON
-                try:
-                    data = response.json()
-                except json.JSONDecodeError as e:
-                    print(f"❌ JSON inválido: {str(e)[:100]}")
-                    await asyncio.sleep(BASE_DELAY * (intento + 1))
-                    continue
-                
-                # Manejar errores de la API
-                if "error" in data:
-                    error_msg = data["error"]
-                    
-                    if "rate limit" in error_msg.lower() or "limit" in error_msg.lower():
-                        print(f"⏳ Rate limit alcanzado. Esperando {BASE_DELAY * 2}s...")
-                        await asyncio.sleep(BASE_DELAY * 2)
-                        continue
-                    
-                    # Error no recuperable
-                    print(f"❌ Error de API: {error_msg}")
-                    return []
-                
-                # ✅ Respuesta exitosa
-                response.raise_for_status()
-                txs = data.get("txs", [])
-                print(f"✅ Obtenidas {len(txs)} transacciones para {address[:8]}...")
-                return txs
-                
-        except httpx.TimeoutException:
-            print(f"⏱️ Timeout en intento {intento + 1}")
-            await asyncio.sleep(BASE_DELAY * (intento + 1))
-            
-        except httpx.HTTPStatusError as e:
-            status = e.response.status_code
-            print(f"❌ HTTP {status}: {e.response.text[:200]}")
-            
-            if status == 429:  # Too Many Requests
-                await asyncio.sleep(BASE_DELAY * 3)
-            elif status >= 500:  # Server error
-                await asyncio.sleep(BASE_DELAY * 2)
+    presupuesto = TX_MAX_POR_DIRECCION if max_txs is None else max_txs
+    before = after = hueco = None
+    if reanudar or incremental:
+        progreso = await _leer_progreso(address)
+        if reanudar:
+            if not progreso.get("completo"):
+                before = progreso.get("before")
+        else:
+            hueco = progreso.get("hueco")
+            if hueco:
+                before, after = hueco.get("before"), hueco.get("after")
             else:
-                break  # No reintentar para otros errores
-                
-        except Exception as e:
-            print(f"⚠️ Error inesperado: {type(e).__name__}: {str(e)[:100]}")
-            await asyncio.sleep(BASE_DELAY)
-    
-    print(f"❌ Fallaron todos los intentos para {address}")
-    return []
+                after = progreso.get("altura_max")
+    desde_la_cima = before is None
+
+    vistos = set()
+    entregadas = 0
+    # Marca de agua a adoptar cuando lo nuevo quede cubierto (la del hueco si se está completando uno)
+    marca = hueco.get("altura_max") if hueco else None
+    ultimo_hash = hueco.get("ultimo_hash") if hueco else None
+    while presupuesto <= 0 or entregadas < presupuesto:
+        # Siempre páginas completas: BlockCypher no pagina dentro de un bloque,
+        # así que páginas más chicas harían saltar TX del último bloque.
+        pagina = await _fetch_pagina_transacciones(address, tam_pagina, before, after)
+        nuevas = [tx for tx in pagina["txs"] if tx.get("hash") and tx["hash"] not in vistos]
+        if not nuevas:
+            if pagina["txs"] and pagina["hasMore"] and before is not None:
+                # El bloque `before - 1` tiene más TX que una página: saltarlo
+                before -= 1
+                continue
+            if hueco:
+                # No quedaba nada entre el cursor y la marca: el hueco está cubierto
+                await _guardar_progreso(address, altura_max=marca, ultimo_hash=ultimo_hash, cerrar_hueco=True)
+            break
+        recortada = presupuesto > 0 and len(nuevas) > presupuesto - entregadas
+        if recortada:
+            nuevas = nuevas[:presupuesto - entregadas]
+        vistos.update(tx["hash"] for tx in nuevas)
+        if ultimo_hash is None:
+            ultimo_hash = nuevas[0]["hash"]
+            marca = _altura_maxima(nuevas)
+
+        # Siguiente cursor: `altura mínima + 1`, para volver a pedir el último
+        # bloque por si tiene TX que no entraron en la página (las repetidas
+        # se descartan arriba).
+        alturas = [tx["block_height"] for tx in nuevas if tx.get("block_height", -1) > 0]
+        siguiente = min(alturas) + 1 if alturas else None
+
+        yield nuevas
+        entregadas += len(nuevas)
+
+        fin = not pagina["hasMore"] and not recortada
+        # La marca de agua solo avanza cuando lo nuevo quedó cubierto sin
+        # huecos: tras la primera página de una descarga desde la cima, o al
+        # llegar a la marca anterior en una sincronización incremental. Si
+        # la incremental se corta antes, el tramo pendiente queda como hueco.
+        if after is None:
+            avanzar_marca = desde_la_cima
+        else:
+            avanzar_marca = fin or siguiente is None
+        pendiente = None
+        if after is not None and not avanzar_marca:
+            pendiente = {"before": siguiente, "after": after, "altura_max": marca, "ultimo_hash": ultimo_hash}
+        await _guardar_progreso(
+            address,
+            before=siguiente if after is None else None,
+            completo=fin and after is None,
+            descargadas=len(nuevas),
+            altura_max=marca if avanzar_marca else None,
+            ultimo_hash=ultimo_hash if avanzar_marca else None,
+            hueco=pendiente,
+            cerrar_hueco=avanzar_marca and after is not None,
+        )
+        if fin or siguiente is None:
+            break
+        before = siguiente
 
 
 # ================================================================
 # 🔹 GUARDAR TRANSACCIONES EN MONGO
 # ================================================================
-async def fetch_and_save_transactions_by_address(address: str) -> List[TransaccionModel]:
-    raw_txs = await _fetch_raw_transactions_by_address(address)
-    
-    if not raw_txs:
-        print(f"⚠️ No se obtuvieron transacciones para {address}")
-        return []
-    
-    saved_transactions = []
+def _construir_doc_transaccion(tx_data: dict, direcciones: dict, bloques: dict) -> dict:
+    """Documento Mongo de una TX de BlockCypher con sus direcciones/bloque ya resueltos."""
+    bloque = bloques.get(tx_data.get("block_hash"))
+
+    # Valor (BTC) de cada input/output en paralelo a los ids; si un
+    # input/output tiene varias direcciones (multisig) se reparte en partes iguales
+    input_ids, input_valores = [], []
+    for vin in tx_data.get("inputs", []):
+        addrs = vin.get("addresses") or []
+        for addr in addrs:
+            if addr in direcciones:
+                input_ids.append(direcciones[addr].id)
+                input_valores.append(float(vin.get("output_value", 0)) / 100_000_000 / len(addrs))
+    output_ids, output_valores = [], []
+    for vout in tx_data.get("outputs", []):
+        addrs = vout.get("addresses") or []
+        for addr in addrs:
+            if addr in direcciones:
+                output_ids.append(direcciones[addr].id)
+                output_valores.append(float(vout.get("value", 0)) / 100_000_000 / len(addrs))
+
+    fecha_str = tx_data.get("confirmed")
+    fecha_obj = datetime.fromisoformat(fecha_str.replace("Z", "+00:00")) if fecha_str else datetime.now()
+
+    return {
+        "_id": ObjectId(),
+        "hash": tx_data["hash"],
+        "fecha": fecha_obj,
+        "inputs": input_ids,
+        "outputs": output_ids,
+        "inputs_valores": input_valores,
+        "outputs_valores": output_valores,
+        "monto_total": float(tx_data.get("total", 0)) / 100_000_000,
+        "estado": "confirmada" if tx_data.get("block_height", -1) > 0 else "pendiente",
+        "patrones_sospechosos": [],
+        "bloque": bloque.id if bloque else None,
+        "fees": float(tx_data.get("fees", 0)) / 100_000_000,
+        "confirmations": int(tx_data.get("confirmations", 0)),
+    }
 
-    for tx_data in raw_txs:
-        tx_hash = tx_data.get("hash")
-        if not tx_hash:
-            continue
 
-        # Verificar si ya existe
-        existing_tx = await get_transaccion_by_hash(tx_hash)
-        if existing_tx:
-            saved_transactions.append(existing_tx)
-            continue
+async def guardar_transacciones_bulk(docs: List[dict]) -> dict:
+    """
+    Inserta las transacciones con un único `bulk_write` (upsert por hash) y
+    devuelve {hash: TransaccionModel} construido desde los documentos en memoria.
+    """
+    if not docs:
+        return {}
+
+    resultado = await transaccion_collection.bulk_write(
+        [UpdateOne({"hash": d["hash"]}, {"$setOnInsert": d}, upsert=True) for d in docs],
+        ordered=False,
+    )
+    insertados = set(resultado.upserted_ids)
+    indice_grafo.agregar(d for i, d in enumerate(docs) if i in insertados)
+    await invalidar_rastreos(_direcciones_de(d for i, d in enumerate(docs) if i in insertados))
+    modelos = {d["hash"]: TransaccionModel(**d) for i, d in enumerate(docs) if i in insertados}
+
+    # Insertadas por otra corrutina entre la lectura y la escritura
+    faltantes = [d["hash"] for d in docs if d["hash"] not in modelos]
+    if faltantes:
+        async for doc in transaccion_collection.find({"hash": {"$in": faltantes}}):
+            modelos[doc["hash"]] = TransaccionModel(**doc)
+    return modelos
+
+
+async def fetch_and_save_transactions_by_address(
+    address: str,
+    concurrencia: Optional[int] = None,
+    max_txs: Optional[int] = None,
+    reanudar: bool = False,
+    incremental: bool = True,
+) -> List[TransaccionModel]:
+    """
+    Descarga el historial de `address` página a página (hasta `max_txs`
+    TX; 0 = completo) y lo guarda en Mongo. Con `reanudar=True` continúa
+    una descarga anterior desde el último cursor persistido.
+
+    Por defecto la sincronización es incremental: si la dirección ya se
+    sincronizó, solo se piden (y devuelven) las TX posteriores a su marca
+    de agua, normalmente con una sola consulta pequeña.
+    """
+    semaforo = asyncio.Semaphore(concurrencia or INGESTA_CONCURRENCIA)
+    saved_transactions = []
+    paginas = paginar_transacciones(
+        address, max_txs=max_txs, reanudar=reanudar, incremental=incremental
+    )
+    try:
+        # El progreso de una página se persiste al pedir la siguiente, o sea
+        # solo después de guardarla: si `_guardar_pagina` falla no avanza
+        async for raw_txs in paginas:
+            saved_transactions.extend(await _guardar_pagina(address, raw_txs, semaforo))
+    finally:
+        await paginas.aclose()
+
+    if not saved_transactions:
+        print(f"ℹ️ Sin transacciones nuevas para {address}")
+    else:
+        print(f"💾 Guardadas {len(saved_transactions)} transacciones para {address[:8]}...")
+    return saved_transactions
+
 
-        # Bloque asociado
-        block_id = None
+async def _guardar_pagina(
+    address: str,
+    raw_txs: List[dict],
+    semaforo: asyncio.Semaphore,
+) -> List[TransaccionModel]:
+    """
+    Guarda una página de TX crudas.
+    Todas las direcciones y bloques distintos de la página se resuelven en
+    paralelo (acotados por `semaforo`; el rate limiter global sigue acotando
+    las que salen a BlockCypher) y luego se escriben las transacciones. Los
+    accesos a Mongo por página son O(1): una lectura `$in` y un `bulk_write`
+    por colección.
+    """
+    # 1️⃣ Separar las que ya existen de las nuevas (una sola consulta)
+    hashes = list(dict.fromkeys(tx.get("hash") for tx in raw_txs if tx.get("hash")))
+    existentes = {
+        doc["hash"]: TransaccionModel(**doc)
+        async for doc in transaccion_collection.find({"hash": {"$in": hashes}})
+    }
+    nuevas = list({
+        tx["hash"]: tx for tx in raw_txs if tx.get("hash") and tx["hash"] not in existentes
+    }.values())
+
+    # 2️⃣ Direcciones y bloques distintos de toda la página
+    direcciones_pagina = {}  # dict ordenado como conjunto
+    bloques_pagina = {}
+    for tx_data in nuevas:
+        for io in tx_data.get("inputs", []) + tx_data.get("outputs", []):
+            for addr in io.get("addresses") or []:
+                if addr:
+                    direcciones_pagina[addr] = None
         block_hash = tx_data.get("block_hash")
         if block_hash:
-            try:
-                bloque = await fetch_and_save_bloque(block_hash)
-                if bloque:
-                    block_id = bloque.id
-            except Exception as e:
-                print(f"⚠️ Error guardando bloque {block_hash[:8]}: {e}")
-
-        # Inputs
-        input_ids = []
-        for vin in tx_data.get("inputs", []):
-            for addr in vin.get("addresses", []):
-                if addr:
-                    try:
-                        direccion = await fetch_and_save_direccion(addr)
-                        input_ids.append(direccion.id)
-                    except Exception as e:
-                        print(f"⚠️ Error guardando dirección input {addr[:8]}: {e}")
-
-        # Outputs
-        output_ids = []
-        for vout in tx_data.get("outputs", []):
-            for addr in vout.get("addresses", []):
-                if addr:
-                    try:
-                        direccion = await fetch_and_save_direccion(addr)
-                        output_ids.append(direccion.id)
-                    except Exception as e:
-                        print(f"⚠️ Error guardando dirección output {addr[:8]}: {e}")
-
-        # Fecha
-        fecha_str = tx_data.get("confirmed")
-        fecha_obj = datetime.fromisoformat(fecha_str.replace("Z", "+00:00")) if fecha_str else datetime.now()
-
-        # Crear documento de transacción
-        transaccion_doc = {
-            "hash": tx_hash,
-            "fecha": fecha_obj,
-            "inputs": input_ids,
-            "outputs": output_ids,
-            "monto_total": float(tx_data.get("total", 0)) / 100_000_000,
-            "estado": "confirmada" if tx_data.get("block_height", -1) > 0 else "pendiente",
-            "patrones_sospechosos": [],
-            "bloque": block_id,
-            "fees": float(tx_data.get("fees", 0)) / 100_000_000,
-            "confirmations": int(tx_data.get("confirmations", 0)),
-        }
-
-        try:
-            result = await transaccion_collection.insert_one(transaccion_doc)
-            created = await transaccion_collection.find_one({"_id": result.inserted_id})
-            if created:
-                saved_transactions.append(TransaccionModel(**created))
-        except Exception as e:
-            print(f"⚠️ Error guardando TX {tx_hash[:8]}: {e}")
-
-    print(f"💾 Guardadas {len(saved_transactions)} transacciones para {address[:8]}...")
-    return saved_transactions
+            confirmaciones = tx_data.get("confirmations")
+            previas = bloques_pagina.get(block_hash)
+            bloques_pagina[block_hash] = max(c for c in (previas, confirmaciones, 0) if c is not None) or None
+
+    # 3️⃣ Resolverlos en paralelo con fan-out acotado
+    direcciones, bloques = await asyncio.gather(
+        resolver_direcciones(list(direcciones_pagina), semaforo=semaforo),
+        resolver_bloques(bloques_pagina, semaforo=semaforo),
+    )
+    print(f"🧩 {len(direcciones)}/{len(direcciones_pagina)} direcciones y {len(bloques)}/{len(bloques_pagina)} bloques resueltos para {address[:8]}...")
+
+    # 4️⃣ Escribir las transacciones nuevas en un solo bulk_write. Un error
+    # se propaga: el progreso de la página no se guarda y se vuelve a pedir.
+    try:
+        guardadas = await guardar_transacciones_bulk(
+            [_construir_doc_transaccion(tx_data, direcciones, bloques) for tx_data in nuevas]
+        )
+    except Exception as e:
+        print(f"⚠️ Error guardando transacciones de {address[:8]}: {e}")
+        raise
+
+    # Mantener el orden devuelto por la API
+    return [
+        existentes.get(tx_hash) or guardadas[tx_hash]
+        for tx_hash in hashes
+        if tx_hash in existentes or tx_hash in guardadas
+    ]
 
 
 # ================================================================
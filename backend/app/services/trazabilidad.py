@@ -7,90 +7,111 @@ from app.services.reporte import fetch_reportes_by_address
 from app.services.transaccion import fetch_and_save_transactions_by_address
 from datetime import datetime
 
+def _bloque_info(bloque_doc: Optional[dict]) -> dict:
+    if not bloque_doc:
+        return {
+            "id": None,
+            "numero_bloque": None,
+            "hash": "No disponible",
+            "fecha": None,
+            "recompensa_total": None,
+            "volumen_total": None,
+        }
+    return {
+        "id": str(bloque_doc["_id"]),
+        "numero_bloque": bloque_doc.get("numero_bloque"),
+        "hash": bloque_doc.get("hash"),
+        "fecha": bloque_doc.get("fecha").isoformat() if bloque_doc.get("fecha") else None,
+        "recompensa_total": bloque_doc.get("recompensa_total"),
+        "volumen_total": bloque_doc.get("volumen_total"),
+    }
+
+
+def _pipeline_trazas(limit: int) -> List[dict]:
+    """
+    Transacciones con su dirección de referencia (primer input, o primer
+    output si no tiene inputs), su bloque y los reportes guardados de esa
+    dirección, todo con `$lookup` en una sola agregación.
+    """
+    return [
+        {"$limit": limit},
+        {"$addFields": {"_ref": {"$ifNull": [
+            {"$arrayElemAt": ["$inputs", 0]},
+            {"$arrayElemAt": ["$outputs", 0]},
+        ]}}},
+        {"$lookup": {
+            "from": direccion_collection.name,
+            "localField": "_ref",
+            "foreignField": "_id",
+            "as": "_direccion",
+        }},
+        {"$lookup": {
+            "from": bloque_collection.name,
+            "localField": "bloque",
+            "foreignField": "_id",
+            "as": "_bloque",
+        }},
+        {"$addFields": {"_ref_direccion": {"$arrayElemAt": ["$_direccion.direccion", 0]}}},
+        {"$lookup": {
+            "from": reporte_collection.name,
+            "localField": "_ref_direccion",
+            "foreignField": "id_direccion",
+            "as": "_reportes",
+        }},
+        {"$project": {
+            "hash": 1,
+            "monto_total": 1,
+            "estado": 1,
+            "patrones_sospechosos": 1,
+            "bloque": 1,
+            "inputs": 1,
+            "outputs": 1,
+            "_direccion.perfil_riesgo": 1,
+            "_direccion.ultimo_update_riesgo": 1,
+            "_bloque": 1,
+            "_reportes.scamCategory": 1,
+            "_reportes.trusted": 1,
+            "_reportes.domains": 1,
+        }},
+    ]
+
+
 async def obtener_todas_las_trazas(limit: int = 30):
-    transacciones = await transaccion_collection.find({}).limit(limit).to_list(limit)
+    """
+    Listado de trazas servido con una sola agregación: sin consultas por
+    transacción ni llamadas a ChainAbuse (solo los reportes ya guardados).
+    """
     trazas = []
-
-    for tx in transacciones:
+    async for tx in transaccion_collection.aggregate(_pipeline_trazas(limit)):
         # --- Direcciones origen y destino ---
         # 🔥 CORRECCIÓN: Convertir ObjectIds a strings
-        origen_ids = tx.get("inputs", [])
-        destino_ids = tx.get("outputs", [])
-        origen = [str(oid) for oid in origen_ids]
-        destino = [str(oid) for oid in destino_ids]
-        direccion_ref = origen[0] if origen else (destino[0] if destino else None)
+        origen = [str(oid) for oid in tx.get("inputs", [])]
+        destino = [str(oid) for oid in tx.get("outputs", [])]
 
         # --- Información de dirección ---
-        direccion_doc = None
-        if direccion_ref:
-            # si viene como string y es un ObjectId válido, convertir
-            if PyObjectId.is_valid(direccion_ref):
-                direccion_ref = PyObjectId(direccion_ref)
-            direccion_doc = await direccion_collection.find_one({"_id": direccion_ref})
-        
-        # 🔥 CORRECCIÓN: Manejar el caso donde direccion_doc es None
+        direccion_doc = (tx.get("_direccion") or [None])[0]
         perfil_riesgo = "desconocido"
         ultimo_update_riesgo = None
         if direccion_doc:
             perfil_riesgo = direccion_doc.get("perfil_riesgo", "desconocido")
             ultimo_update_riesgo = direccion_doc.get("ultimo_update_riesgo")
 
-        # --- Reportes (ChainAbuse + DB fallback) ---
-        try:
-            reportes = await fetch_reportes_by_address(direccion_ref) if direccion_ref else []
-        except Exception as e:
-            print(f"⚠️ Error al obtener reportes para {direccion_ref}: {e}")
-
-            # 🔍 Buscar dirección real si direccion_ref es ObjectId
-            direccion_str = None
-            if isinstance(direccion_ref, PyObjectId):
-                direccion_doc_ref = await direccion_collection.find_one({"_id": direccion_ref})
-                if direccion_doc_ref:
-                    direccion_str = direccion_doc_ref.get("direccion")
-
-            # ✅ Fallback: buscar en Mongo por dirección (string)
-            query_id = direccion_str or direccion_ref
-            reportes = await reporte_collection.find({"id_direccion": query_id}).to_list(50)
-            print(f"✅ TRAIGO DESDE BD para la dirección {query_id}, reportes={len(reportes)}")
-
+        # --- Reportes guardados de la dirección ---
+        reportes = tx.get("_reportes") or []
         categorias_chainabuse = list({
-            r.scamCategory.upper() for r in reportes if hasattr(r, "scamCategory")
+            r["scamCategory"].upper() for r in reportes if r.get("scamCategory")
         })
         dominios = list({
-            d for r in reportes for d in getattr(r, "domains", []) if d
+            d for r in reportes for d in (r.get("domains") or []) if d
         })
         cantidad_reportes = len(reportes)
-        reportes_verificados = len([r for r in reportes if getattr(r, "trusted", False)])
+        reportes_verificados = len([r for r in reportes if r.get("trusted")])
         reportes_no_verificados = cantidad_reportes - reportes_verificados
 
         # --- Información del bloque asociado ---
         bloque_info = None
-        bloque_ref = tx.get("bloque")
-
-        if bloque_ref:
-            # si el bloque es string, convertir a ObjectId
-            if isinstance(bloque_ref, str) and PyObjectId.is_valid(bloque_ref):
-                bloque_ref = PyObjectId(bloque_ref)
-
-            bloque_doc = await bloque_collection.find_one({"_id": bloque_ref})
-            if bloque_doc:
-                bloque_info = {
-                    "id": str(bloque_doc["_id"]),
-                    "numero_bloque": bloque_doc.get("numero_bloque"),
-                    "hash": bloque_doc.get("hash"),
-                    "fecha": bloque_doc.get("fecha").isoformat() if bloque_doc.get("fecha") else None,
-                    "recompensa_total": bloque_doc.get("recompensa_total"),
-                    "volumen_total": bloque_doc.get("volumen_total"),
-                }
-            else:
-                bloque_info = {
-                    "id": None,
-                    "numero_bloque": None,
-                    "hash": "No disponible",
-                    "fecha": None,
-                    "recompensa_total": None,
-                    "volumen_total": None,
-                }
+        if tx.get("bloque"):
+            bloque_info = _bloque_info((tx.get("_bloque") or [None])[0])
 
         # --- Construir la traza final ---
         trazas.append({
@@ -0,0 +1,64 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+# -----------------------------
+# Coalescencia de consultas (single-flight)
+# -----------------------------
+# Si varias corrutinas piden la misma clave (endpoint, dirección/hash)
+# mientras hay una consulta en vuelo, todas esperan el mismo resultado
+# en lugar de disparar peticiones idénticas al upstream.
+
+
+class SingleFlight:
+    def __init__(self):
+        self._en_vuelo: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+        self._estadisticas: Dict[str, Dict[str, int]] = defaultdict(
+            lambda: {"llamadas": 0, "ejecutadas": 0, "coalescidas": 0}
+        )
+
+    async def ejecutar(
+        self,
+        endpoint: str,
+        clave: Hashable,
+        fn: Callable[..., Awaitable[Any]],
+        *args,
+        **kwargs,
+    ) -> Any:
+        stats = self._estadisticas[endpoint]
+        stats["llamadas"] += 1
+
+        llave = (endpoint, clave)
+        en_vuelo = self._en_vuelo.get(llave)
+        if en_vuelo is not None:
+            stats["coalescidas"] += 1
+            # shield: si este llamador se cancela, no cancela a los demás
+            return await asyncio.shield(en_vuelo)
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._en_vuelo[llave] = futuro
+        stats["ejecutadas"] += 1
+        try:
+            resultado = await fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            futuro.cancel()
+            raise
+        except BaseException as e:
+            futuro.set_exception(e)
+            futuro.exception()  # marcar como leída si nadie más esperaba
+            raise
+        else:
+            futuro.set_result(resultado)
+            return resultado
+        finally:
+            self._en_vuelo.pop(llave, None)
+
+    def resumen(self) -> dict:
+        return {
+            "en_vuelo": len(self._en_vuelo),
+            "endpoints": {k: dict(v) for k, v in self._estadisticas.items()},
+        }
+
+
+# Instancia compartida por todos los servicios que consultan APIs externas
+singleflight_upstream = SingleFlight()
@@ -0,0 +1,32 @@
+import json
+from typing import AsyncIterator, Tuple
+from fastapi.responses import StreamingResponse
+
+# -----------------------------
+# Server-Sent Events
+# -----------------------------
+# Los streams de la API (rastreos, jobs) producen tuplas (evento, datos);
+# acá se traducen al formato text/event-stream.
+
+
+def evento_sse(evento: str, datos: dict) -> str:
+    return f"event: {evento}\ndata: {json.dumps(datos, default=str)}\n\n"
+
+
+async def _stream_sse(eventos: AsyncIterator[Tuple[str, dict]]) -> AsyncIterator[str]:
+    try:
+        async for evento, datos in eventos:
+            yield evento_sse(evento, datos)
+    except Exception as e:
+        print(f"❌ Error en stream SSE: {e}")
+        yield evento_sse("error", {"detail": str(e)})
+
+
+def respuesta_sse(eventos: AsyncIterator[Tuple[str, dict]]) -> StreamingResponse:
+    """StreamingResponse SSE; un error del generador se emite como evento `error`."""
+    return StreamingResponse(
+        _stream_sse(eventos),
+        media_type="text/event-stream",
+        # Sin cache ni buffering del proxy para que cada evento llegue al instante
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
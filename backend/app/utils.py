@@ -36,6 +36,50 @@ def transaccion_helper(transaccion) -> dict:
     }
 
 
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def a_datetime_utc(valor) -> Optional[datetime]:
+    """Normaliza strings ISO (con o sin 'Z') y datetimes naive/aware a datetime UTC."""
+    if not valor:
+        return None
+    try:
+        if isinstance(valor, str):
+            valor = datetime.fromisoformat(valor.replace("Z", "+00:00"))
+        if not isinstance(valor, datetime):
+            return None
+        if valor.tzinfo is None:
+            return valor.replace(tzinfo=timezone.utc)
+        return valor.astimezone(timezone.utc)
+    except ValueError:
+        return None
+
+
+import asyncio
+
+
+async def gather_acotado(claves, fn, semaforo: asyncio.Semaphore):
+    """
+    Ejecuta `fn(clave)` para cada clave con concurrencia acotada por `semaforo`.
+    Devuelve (resultados, errores) como diccionarios por clave.
+    """
+    async def _uno(clave):
+        async with semaforo:
+            try:
+                return clave, await fn(clave), None
+            except Exception as e:
+                return clave, None, e
+
+    resultados, errores = {}, {}
+    for clave, valor, error in await asyncio.gather(*(_uno(c) for c in claves)):
+        if error is not None:
+            errores[clave] = error
+        else:
+            resultados[clave] = valor
+    return resultados, errores
+
+
 from typing import List, Dict, Any, Tuple
 
 def get_permission_maps(routes: List[Any]) -> Tuple[Dict[Tuple[str, str], Tuple[str, str]], List[Dict[str, Any]]]: